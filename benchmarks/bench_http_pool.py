@@ -0,0 +1,104 @@
+"""
+对比智谱AI翻译器使用连接池前后的单次请求耗时
+
+在本机启动一个模拟智谱AI接口的 HTTP 服务，分别用
+1. 每次调用 requests.post（旧实现，每次新建连接）
+2. ZhipuAITranslator 的长连接池
+发送相同的请求，输出平均值和分位数以及服务端收到的新建连接数。
+
+用法: python benchmarks/bench_http_pool.py --requests 200 --concurrency 8
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from translator import ZhipuAITranslator  # noqa: E402
+
+# 本地测试不能经过代理
+for name in ('HTTPS_PROXY', 'HTTP_PROXY', 'https_proxy', 'http_proxy'):
+    os.environ.pop(name, None)
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 头部和正文分两次写出，关闭 Nagle 以免长连接下出现延迟确认等待
+    disable_nagle_algorithm = True
+    connections = 0
+    lock = threading.Lock()
+    latency = 0.0
+
+    def setup(self):
+        super().setup()
+        with StubHandler.lock:
+            StubHandler.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.latency:
+            time.sleep(self.latency)
+        body = json.dumps({'choices': [{'message': {'content': '译文'}}]}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def run(label, call, total, concurrency):
+    StubHandler.connections = 0
+    latencies = []
+
+    def timed(_):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    ms = [x * 1000 for x in latencies]
+    print(f"{label:<10} 平均 {statistics.mean(ms):7.2f}ms  p50 {ms[len(ms) // 2]:7.2f}ms  "
+          f"p95 {ms[int(len(ms) * 0.95) - 1]:7.2f}ms  总耗时 {elapsed:6.2f}s  新建连接 {StubHandler.connections}")
+
+def main():
+    parser = argparse.ArgumentParser(description='连接池微基准测试')
+    parser.add_argument('--requests', type=int, default=200, help='每种模式发送的请求数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发线程数')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟服务端处理耗时（毫秒）')
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/api/paas/v4/chat/completions'
+
+    translator = ZhipuAITranslator('bench-key', pool_size=args.concurrency)
+    translator.url = url
+    headers = {'Content-Type': 'application/json', 'Authorization': 'Bearer bench-key'}
+    data = {'model': translator.model_name, 'messages': [{'role': 'user', 'content': 'Hello'}], 'stream': False}
+
+    # 先各预热一次
+    requests.post(url, headers=headers, json=data).raise_for_status()
+    translator.translate('Hello', True)
+
+    run('无连接池', lambda: requests.post(url, headers=headers, json=data).raise_for_status(),
+        args.requests, args.concurrency)
+    run('连接池', lambda: translator.translate('Hello', True), args.requests, args.concurrency)
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
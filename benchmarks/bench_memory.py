@@ -0,0 +1,98 @@
+"""
+翻译记忆查询速度基准测试
+
+生成随机段落写入临时的记忆库，然后分别测量完全匹配、改动几个词后的相似匹配
+以及无关段落的查询耗时，并统计相似匹配的召回率和无关段落的误匹配数。
+改动过的段落（包括长段落只改一个词）一旦被当作完全命中返回旧译文，基准测试以失败退出。
+
+用法: python benchmarks/bench_memory.py --segments 200000 --queries 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from memory import TranslationMemory  # noqa: E402
+
+WORDS = [f'word{i}' for i in range(5000)]
+
+def make_paragraph(rng: random.Random, words: int = 80) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def mutate(rng: random.Random, text: str, changes: int) -> str:
+    """改动 changes 个不同位置的词，保证结果与原文不同"""
+    words = text.split()
+    for position in rng.sample(range(len(words)), changes):
+        original = words[position]
+        while words[position] == original:
+            words[position] = rng.choice(WORDS)
+    return ' '.join(words)
+
+def measure(memory: TranslationMemory, texts: list) -> tuple:
+    """返回 (每次查询耗时毫秒列表, 查询结果列表)"""
+    timings, results = [], []
+    for text in texts:
+        start = time.perf_counter()
+        results.append(memory.lookup(text, True))
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, results
+
+def report(name: str, timings: list) -> None:
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{name:<10} 中位数 {statistics.median(timings):6.3f}ms  p99 {p99:6.3f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='翻译记忆查询速度基准测试')
+    parser.add_argument('--segments', type=int, default=200000, help='记忆库中的段落数')
+    parser.add_argument('--queries', type=int, default=500, help='每类查询的次数')
+    parser.add_argument('--changes', type=int, default=3, help='相似查询中每段改动的词数')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as work_dir:
+        memory = TranslationMemory(os.path.join(work_dir, 'memory.sqlite3'))
+        samples = []
+        start = time.perf_counter()
+        batch = []
+        for index in range(args.segments):
+            text = make_paragraph(rng)
+            if index < args.queries:
+                samples.append(text)
+            batch.append((text, True, '译文'))
+            if len(batch) >= 10000:
+                memory.add_many(batch)
+                batch = []
+        memory.add_many(batch)
+        print(f"写入 {args.segments} 段，用时 {time.perf_counter() - start:.1f} 秒")
+
+        timings, _ = measure(memory, samples)
+        report('完全匹配', timings)
+
+        timings, results = measure(memory, [mutate(rng, text, args.changes) for text in samples])
+        recalled = sum(1 for result, text in zip(results, samples) if result is not None and result[1] == text)
+        report('相似匹配', timings)
+        print(f"相似匹配召回率 {recalled / len(samples):.1%}")
+        false_exact = sum(1 for result in results if result is not None and result[3])
+
+        # 长段落只改一个词时签名常常完全相同，仍不能当作完全命中
+        long_samples = [make_paragraph(rng, 300) for _ in range(args.queries)]
+        memory.add_many((text, True, '译文') for text in long_samples)
+        _, results = measure(memory, [mutate(rng, text, 1) for text in long_samples])
+        false_exact += sum(1 for result in results if result is not None and result[3])
+        print(f"改动过的段落被当作完全命中 {false_exact} 次")
+
+        timings, results = measure(memory, [make_paragraph(rng) for _ in range(args.queries)])
+        report('无关段落', timings)
+        print(f"无关段落误匹配 {sum(1 for result in results if result is not None)} 次")
+        memory.close()
+    if false_exact:
+        sys.exit("改动过的段落返回了旧译文")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+测量程序启动耗时：导入主模块的时间和主窗口显示出来的时间
+
+每次在新的子进程中启动，使用临时目录中的测试密钥（连接测试在后台进行，不影响计时），
+并检查窗口构造完成前是否提前导入了 PyMuPDF 和 Gemini SDK。
+
+用法: python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+CHILD_SCRIPT = r'''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, SRC_DIR)
+import main
+imported = time.perf_counter()
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+window = main.TranslatorApp()
+# 连接测试会在事件循环开始后于后台线程导入 SDK，这里记录窗口构造完成时的状态
+heavy_modules = [name for name in ('fitz', 'pymupdf', 'google.generativeai', 'httpx') if name in sys.modules]
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'window_ms': (shown - start) * 1000,
+    'heavy_modules': heavy_modules,
+}))
+sys.stdout.flush()
+import os
+os._exit(0)
+'''
+
+def run_once(work_dir: str) -> dict:
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    script = f'SRC_DIR = {os.path.abspath(SRC_DIR)!r}\n' + CHILD_SCRIPT
+    output = subprocess.run([sys.executable, '-c', script], cwd=work_dir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--runs', type=int, default=5, help='启动次数')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        with open(os.path.join(work_dir, 'translator_config.json'), 'w', encoding='utf-8') as f:
+            json.dump({'gemini_key': 'bench-key', 'zhipu_key': 'bench-key', 'settings': {'cache_enabled': False}}, f)
+        results = [run_once(work_dir) for _ in range(args.runs)]
+
+    import_ms = [r['import_ms'] for r in results]
+    window_ms = [r['window_ms'] for r in results]
+    print(f"导入主模块  中位数 {statistics.median(import_ms):7.1f}ms  最大 {max(import_ms):7.1f}ms")
+    print(f"窗口显示    中位数 {statistics.median(window_ms):7.1f}ms  最大 {max(window_ms):7.1f}ms")
+    heavy = sorted({name for r in results for name in r['heavy_modules']})
+    print(f"启动时已导入的重量级模块: {', '.join(heavy) if heavy else '无'}")
+
+if __name__ == '__main__':
+    main()
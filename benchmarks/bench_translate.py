@@ -0,0 +1,377 @@
+"""
+离线翻译基准测试：用本地模拟接口驱动完整的翻译路径，不消耗 API 配额
+
+对每个提供商依次运行三个场景：
+    text    多段文本并发调用 translate，统计每段耗时的 p50/p95/p99
+    stream  多段文本并发调用 translate_stream，统计首个输出耗时（TTFT）和总耗时
+    async   在一个事件循环中用 translate_many 并发翻译多段文本，统计吞吐量
+    pdf     用生成的示例论文（或 --corpus 指定的 PDF）走命令行批量翻译的完整流程，统计每分钟页数和峰值内存
+翻译器由 factory.create_translator 创建（与程序中相同的限流、重试和分块层），缓存、翻译记忆和术语表关闭，
+接口地址指向 stub_providers.py 启动的模拟服务。
+
+结果写入 JSON 文件，指定 --baseline 时与之前的结果对比，耗时变长或吞吐下降超过 10% 的指标会标出。
+
+用法: python benchmarks/bench_translate.py --papers 3 --pages 10 --output bench_results.json
+     python benchmarks/bench_translate.py --error-rate 0.05 --baseline bench_results.json
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+sys.path.insert(0, BENCH_DIR)
+from stub_providers import StubServer, add_profile_arguments, profile_from_args  # noqa: E402
+
+# 本地测试不能经过代理
+for name in ('HTTPS_PROXY', 'HTTP_PROXY', 'https_proxy', 'http_proxy'):
+    os.environ.pop(name, None)
+
+PROVIDERS = ('gemini', 'zhipu')
+
+# 生成示例论文用的词表
+WORDS = ('model', 'training', 'attention', 'layer', 'network', 'gradient', 'dataset', 'baseline', 'accuracy',
+         'transformer', 'embedding', 'optimization', 'results', 'method', 'approach', 'performance', 'sequence',
+         'representation', 'evaluation', 'parameters', 'loss', 'inference', 'benchmark', 'experiments', 'task')
+GLUE = ('the', 'of', 'and', 'we', 'in', 'to', 'with', 'for', 'our', 'is', 'on', 'that', 'this', 'a')
+
+def make_sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS if rng.random() < 0.5 else GLUE) for _ in range(rng.randint(10, 24))]
+    return ' '.join(words).capitalize() + '.'
+
+def make_paragraph(rng: random.Random) -> str:
+    return ' '.join(make_sentence(rng) for _ in range(rng.randint(3, 6)))
+
+def make_sample_paper(path: str, pages: int, rng: random.Random, captions: bool = False) -> None:
+    """
+    生成一篇每页有标题和若干段落的示例论文
+    captions 为 True 时每页改为大量短段落（图注、表格单元格、参考文献条目）
+    """
+    import fitz  # PyMuPDF
+    document = fitz.open()
+    for page_index in range(pages):
+        page = document.new_page(width=595, height=842)
+        page.insert_textbox(fitz.Rect(60, 50, 535, 80), f'{page_index + 1} {make_sentence(rng)[:60]}',
+                            fontname='helv', fontsize=14)
+        top = 95
+        while top < 740:
+            if captions:
+                # 文本块之间留出足够间距，提取时每行是一个独立段落
+                label = rng.choice(('Figure', 'Table', '[{}]'.format(rng.randint(1, 60))))
+                page.insert_textbox(fitz.Rect(60, top, 535, top + 14), f'{label} {make_sentence(rng)[:80]}',
+                                    fontname='helv', fontsize=8)
+                top += 26
+                continue
+            height = rng.randint(90, 130)
+            page.insert_textbox(fitz.Rect(60, top, 535, top + height), make_paragraph(rng),
+                                fontname='helv', fontsize=9)
+            top += height + 14
+    document.save(path)
+    document.close()
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))]
+
+def summarize(values: list) -> dict:
+    """耗时列表（秒）转为毫秒的分位数"""
+    return {
+        'count': len(values),
+        'mean_ms': sum(values) / len(values) * 1000 if values else None,
+        **{f'p{int(q * 100)}_ms': percentile(values, q) * 1000 if values else None for q in (0.5, 0.95, 0.99)},
+    }
+
+def format_ms(value) -> str:
+    return '-' if value is None else f'{value:.0f}ms'
+
+class PeakRss:
+    """在后台线程中采样进程的常驻内存，记录峰值（MB）；只支持 Linux，其他系统结果为 None"""
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current_mb():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    def _sample(self) -> None:
+        value = self.current_mb()
+        if value is not None:
+            self.peak_mb = value if self.peak_mb is None else max(self.peak_mb, value)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+def run_text(translator, texts: list, concurrency: int) -> dict:
+    latencies, errors = [], 0
+
+    def call(text):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            translator.translate(text, True)
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, texts))
+    elapsed = time.perf_counter() - start
+    return {'segments_per_minute': len(latencies) / elapsed * 60, 'errors': errors, 'latency': summarize(latencies)}
+
+def run_stream(translator, texts: list, concurrency: int) -> dict:
+    first_outputs, latencies, errors = [], [], 0
+
+    def call(text):
+        nonlocal errors
+        start = time.perf_counter()
+        first = None
+        try:
+            for _ in translator.translate_stream(text, True):
+                if first is None:
+                    first = time.perf_counter() - start
+            latencies.append(time.perf_counter() - start)
+            if first is not None:
+                first_outputs.append(first)
+        except Exception:
+            errors += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, texts))
+    return {'errors': errors, 'ttft': summarize(first_outputs), 'latency': summarize(latencies)}
+
+def run_async(translator, texts: list, concurrency: int) -> dict:
+    async def call():
+        return await translator.translate_many(texts, True, concurrency)
+
+    errors = 0
+    start = time.perf_counter()
+    try:
+        asyncio.run(call())
+    except Exception as e:
+        # translate_many 中任一段失败时整批失败
+        print(f"  async  translate_many 失败: {e}")
+        errors = len(texts)
+    elapsed = time.perf_counter() - start
+    return {'segments_per_minute': (len(texts) - errors) / elapsed * 60, 'errors': errors, 'seconds': elapsed}
+
+def run_pdf(translator, papers: list, output_dir: str, concurrency: int, extract_workers: int) -> dict:
+    from cli import BatchStats, translate_pdf
+    os.makedirs(output_dir, exist_ok=True)
+    stats = BatchStats()
+    start = time.perf_counter()
+    with PeakRss() as rss:
+        for path in papers:
+            translate_pdf(path, output_dir, translator, True, concurrency, ['jsonl'], stats, extract_workers)
+    elapsed = time.perf_counter() - start
+    return {
+        'pages': stats.pages,
+        'seconds': elapsed,
+        'pages_per_minute': stats.pages / elapsed * 60 if elapsed > 0 else 0.0,
+        'peak_rss_mb': rss.peak_mb,
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# 对比基准时检查的指标：(路径, 数值越大越好)
+COMPARED_METRICS = (
+    (('text', 'segments_per_minute'), True),
+    (('text', 'latency', 'p50_ms'), False),
+    (('text', 'latency', 'p95_ms'), False),
+    (('text', 'latency', 'p99_ms'), False),
+    (('stream', 'ttft', 'p50_ms'), False),
+    (('stream', 'ttft', 'p95_ms'), False),
+    (('async', 'segments_per_minute'), True),
+    (('pdf', 'pages_per_minute'), True),
+    (('pdf', 'peak_rss_mb'), False),
+)
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.1) -> list:
+    """返回与基准结果相比变差超过 tolerance 的指标说明"""
+    regressions = []
+    for provider, current in results.items():
+        previous = baseline.get('results', {}).get(provider)
+        if not previous:
+            continue
+        for path, higher_is_better in COMPARED_METRICS:
+            old, new = previous, current
+            for key in path:
+                old = old.get(key) if isinstance(old, dict) else None
+                new = new.get(key) if isinstance(new, dict) else None
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            label = f"{provider}.{'.'.join(path)}"
+            print(f"  {label:<40} {old:10.1f} -> {new:10.1f} ({change:+.1%})")
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(f'{label}: {old:.1f} -> {new:.1f} ({change:+.1%})')
+    return regressions
+
+def run_benchmarks(args, server: StubServer, workdir: str) -> tuple:
+    """在 workdir 中运行所有场景，返回 (论文列表, 各提供商的结果)"""
+    rng = random.Random(args.seed)
+    # 配置文件和缓存等数据文件都放在临时目录中，不影响正常使用的配置
+    os.chdir(workdir)
+    with open('translator_config.json', 'w', encoding='utf-8') as f:
+        json.dump({'settings': {
+            'gemini_base_url': server.base_url,
+            'zhipu_base_url': server.zhipu_base_url,
+            'cache_enabled': False,
+            'memory_enabled': False,
+            'glossary_enabled': False,
+            'concurrency': {provider: args.concurrency for provider in PROVIDERS},
+            'http_pool_size': max(16, args.concurrency),
+            'packing_enabled': args.packing,
+        }}, f)
+
+    if args.corpus:
+        papers = sorted(glob.glob(os.path.join(args.corpus, '**', '*.pdf'), recursive=True))
+    else:
+        papers = []
+        for index in range(args.papers):
+            path = os.path.join(workdir, f'paper{index + 1}.pdf')
+            make_sample_paper(path, args.pages, rng, args.captions)
+            papers.append(path)
+    texts = [make_paragraph(rng) for _ in range(args.segments)]
+
+    from factory import create_translator
+    from metrics import registry as metrics_registry
+    results = {}
+    for provider in PROVIDERS:
+        if provider not in args.providers:
+            continue
+        print(f"{provider}: 运行中...")
+        metrics_registry.reset()
+        throttled = server.stats['throttled']
+        packed, misaligned = server.stats['packed'], server.stats['misaligned']
+        translator = create_translator(provider, 'bench-key')
+        result = {
+            'text': run_text(translator, texts, args.concurrency),
+            'stream': run_stream(translator, texts, args.concurrency),
+            'async': run_async(translator, texts, args.concurrency),
+            'pdf': run_pdf(translator, papers, os.path.join(workdir, provider), args.concurrency,
+                           args.extract_workers),
+        }
+        result['throttled_responses'] = server.stats['throttled'] - throttled
+        # 错位的打包请求都会改为逐段重新翻译，其开销已计入各场景的耗时
+        result['packed_requests'] = server.stats['packed'] - packed
+        result['misaligned_packs'] = server.stats['misaligned'] - misaligned
+        result['calls'] = metrics_registry.snapshot()
+        results[provider] = result
+        text, stream, pdf = result['text'], result['stream'], result['pdf']
+        concurrent = result['async']
+        print(f"  text   {text['segments_per_minute']:8.1f} 段/分钟  p50 {format_ms(text['latency']['p50_ms'])}  "
+              f"p95 {format_ms(text['latency']['p95_ms'])}  p99 {format_ms(text['latency']['p99_ms'])}  "
+              f"失败 {text['errors']}")
+        print(f"  stream TTFT p50 {format_ms(stream['ttft']['p50_ms'])}  p95 {format_ms(stream['ttft']['p95_ms'])}  "
+              f"总耗时 p50 {format_ms(stream['latency']['p50_ms'])}  失败 {stream['errors']}")
+        print(f"  async  {concurrent['segments_per_minute']:8.1f} 段/分钟  失败 {concurrent['errors']}")
+        rss = f"{pdf['peak_rss_mb']:.0f}MB" if pdf['peak_rss_mb'] is not None else '-'
+        print(f"  pdf    {pdf['pages']} 页  {pdf['pages_per_minute']:.1f} 页/分钟  峰值内存 {rss}  "
+              f"收到 429 {result['throttled_responses']} 次")
+        print(f"  packing 打包请求 {result['packed_requests']} 个  错位后逐段重译 {result['misaligned_packs']} 个")
+    return papers, results
+
+def main():
+    parser = argparse.ArgumentParser(description='离线翻译基准测试')
+    parser.add_argument('--providers', nargs='+', choices=PROVIDERS, default=list(PROVIDERS))
+    parser.add_argument('--papers', type=int, default=3, help='生成的示例论文数')
+    parser.add_argument('--pages', type=int, default=10, help='每篇示例论文的页数')
+    parser.add_argument('--corpus', default=None, help='使用该目录中的 PDF 代替生成的示例论文')
+    parser.add_argument('--captions', action='store_true', help='生成以图注、参考文献等短段落为主的示例论文')
+    parser.add_argument('--packing', action=argparse.BooleanOptionalAction, default=True,
+                        help='是否打包翻译短段落（对比时用 --no-packing）')
+    parser.add_argument('--segments', type=int, default=100, help='text、stream 和 async 场景翻译的段落数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发请求数')
+    parser.add_argument('--extract-workers', type=int, default=1, help='提取 PDF 文本的进程数')
+    parser.add_argument('--output', default='bench_results.json', help='结果 JSON 文件')
+    parser.add_argument('--baseline', default=None, help='之前的结果 JSON 文件，用于对比')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    if args.corpus:
+        args.corpus = os.path.abspath(args.corpus)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    server = StubServer(profile_from_args(args)).start()
+    workdir = tempfile.mkdtemp(prefix='bench_translate_')
+    cwd = os.getcwd()
+    try:
+        papers, results = run_benchmarks(args, server, workdir)
+    finally:
+        server.shutdown()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'timestamp': time.time(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'stub': server.profile.to_dict(),
+        'workload': {
+            'papers': len(papers),
+            'segments': args.segments,
+            'concurrency': args.concurrency,
+            'corpus': args.corpus,
+            'captions': args.captions,
+            'packing': args.packing,
+        },
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {output}")
+
+    if baseline is not None:
+        print(f"与基准 {args.baseline}（版本 {baseline.get('revision')}）对比：")
+        regressions = compare(results, baseline)
+        if regressions:
+            print("以下指标变差超过 10%：")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+模拟 Gemini 和智谱AI 接口的本地 HTTP 服务，用于离线基准测试
+
+两个接口的请求和响应格式与官方一致（Gemini 为 SDK 的 REST 传输格式），译文为原文加前缀，
+token 用量按 chunker.estimate_tokens 估算。可以配置：
+    首个 token 的延迟分布（对数正态，按中位数和 sigma 设置）
+    输出速度（每秒 token 数），流式响应按此速度分段发送
+    每秒请求数上限，超出时返回 429 和 Retry-After
+    随机注入 429 的比例
+    打包请求返回错位结果的比例（相邻两段合并成一段，条数少一），用于测量逐段重新翻译的开销
+
+把 gemini_base_url / zhipu_base_url 设置为本服务的地址即可让翻译器访问它。
+
+用法: python benchmarks/stub_providers.py --port 8900 --latency-ms 800 --max-rps 20
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from chunker import estimate_tokens  # noqa: E402
+from translator import (GEMINI_PACKING_PROMPT_TO_CHINESE, GEMINI_PACKING_PROMPT_TO_ENGLISH,  # noqa: E402
+                        GEMINI_PROMPT_TO_CHINESE, GEMINI_PROMPT_TO_ENGLISH, PACKING_PROMPT,
+                        ZHIPU_PACKING_PROMPT_TO_CHINESE, ZHIPU_PACKING_PROMPT_TO_ENGLISH,
+                        ZHIPU_PROMPT_TO_CHINESE, ZHIPU_PROMPT_TO_ENGLISH)
+
+# 流式响应每段包含的 token 数
+STREAM_CHUNK_TOKENS = 8
+
+# (模板, 是否译为中文, 是否为打包请求)，打包模板排在前面，以免被普通模板的前缀误匹配
+_TEMPLATES = (
+    (GEMINI_PACKING_PROMPT_TO_CHINESE, True, True), (GEMINI_PACKING_PROMPT_TO_ENGLISH, False, True),
+    (ZHIPU_PACKING_PROMPT_TO_CHINESE, True, True), (ZHIPU_PACKING_PROMPT_TO_ENGLISH, False, True),
+    (PACKING_PROMPT, True, True),
+    (GEMINI_PROMPT_TO_CHINESE, True, False), (GEMINI_PROMPT_TO_ENGLISH, False, False),
+    (ZHIPU_PROMPT_TO_CHINESE, True, False), (ZHIPU_PROMPT_TO_ENGLISH, False, False),
+)
+
+def _template_pattern(template: str):
+    # 参考信息在模板之前，{count} 为数字
+    pattern = re.escape(template).replace(re.escape('{count}'), r'\d+').replace(re.escape('{text}'), '(.*)')
+    return re.compile(pattern + r'\Z', re.DOTALL)
+
+_PATTERNS = [(_template_pattern(template), to_chinese, packed) for template, to_chinese, packed in _TEMPLATES]
+
+def extract_source(prompt: str) -> tuple:
+    """从完整提示词中取出待翻译文本，返回 (文本, 是否译为中文, 是否为打包请求)"""
+    for pattern, to_chinese, packed in _PATTERNS:
+        match = pattern.search(prompt)
+        if match:
+            return match.group(1), to_chinese, packed
+    return prompt, True, False
+
+def fake_translation(text: str, to_chinese: bool, packed: bool = False, misalign: bool = False) -> str:
+    prefix = '【译文】' if to_chinese else '[translated] '
+    # 打包请求的原文是 JSON 字符串数组，按同样的格式逐项返回
+    if packed:
+        try:
+            items = json.loads(text)
+        except ValueError:
+            items = None
+        if isinstance(items, list) and all(isinstance(item, str) for item in items):
+            items = [prefix + item for item in items]
+            if misalign and len(items) > 1:
+                # 模拟模型把最后两段合并成一段
+                items[-2:] = [items[-2] + ' ' + items[-1]]
+            return json.dumps(items, ensure_ascii=False)
+    return prefix + text
+
+def split_chunks(text: str, tokens: int) -> list:
+    """按输出 token 数把文本切成大致均匀的若干段"""
+    count = max(1, math.ceil(tokens / STREAM_CHUNK_TOKENS))
+    size = max(1, math.ceil(len(text) / count))
+    return [text[i:i + size] for i in range(0, len(text), size)] or ['']
+
+class StubProfile:
+    """模拟服务的延迟、速度和限流设置"""
+    def __init__(self, latency_ms: float = 800, latency_sigma: float = 0.5, tokens_per_second: float = 150,
+                 max_rps: float = 0, error_rate: float = 0.0, retry_after: float = 1.0, seed: int = None,
+                 misalign_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.max_rps = max_rps
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.misalign_rate = misalign_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._allowance = max_rps
+        self._updated = time.monotonic()
+
+    def first_token_delay(self) -> float:
+        if self.latency_ms <= 0:
+            return 0.0
+        with self._lock:
+            return self._rng.lognormvariate(math.log(self.latency_ms / 1000), self.latency_sigma)
+
+    def output_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def should_misalign(self) -> bool:
+        """打包请求是否返回错位的结果"""
+        if not self.misalign_rate:
+            return False
+        with self._lock:
+            return self._rng.random() < self.misalign_rate
+
+    def should_throttle(self) -> bool:
+        """每秒请求数超出上限或命中随机注入时返回 True"""
+        with self._lock:
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return True
+            if not self.max_rps:
+                return False
+            now = time.monotonic()
+            self._allowance = min(self.max_rps, self._allowance + (now - self._updated) * self.max_rps)
+            self._updated = now
+            if self._allowance < 1:
+                return True
+            self._allowance -= 1
+            return False
+
+    def to_dict(self) -> dict:
+        return {
+            'latency_ms': self.latency_ms,
+            'latency_sigma': self.latency_sigma,
+            'tokens_per_second': self.tokens_per_second,
+            'max_rps': self.max_rps,
+            'error_rate': self.error_rate,
+            'retry_after': self.retry_after,
+            'misalign_rate': self.misalign_rate,
+        }
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_chunked(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        self.server.count('requests')
+        profile = self.server.profile
+        if profile.should_throttle():
+            self.server.count('throttled')
+            self._send_json(429, {'error': {'code': 429, 'message': 'Resource has been exhausted',
+                                            'status': 'RESOURCE_EXHAUSTED'}},
+                            {'Retry-After': f'{profile.retry_after:g}'})
+            return
+        path = self.path.split('?', 1)[0]
+        if path.endswith('/chat/completions'):
+            self._zhipu(request)
+        elif ':generateContent' in path or ':streamGenerateContent' in path:
+            self._gemini(request, ':streamGenerateContent' in path)
+        else:
+            self._send_json(404, {'error': {'code': 404, 'message': 'not found'}})
+
+    def _respond(self, prompt: str):
+        """等待首个 token 的延迟，返回 (译文, 输入 token 数, 输出 token 数)"""
+        text, to_chinese, packed = extract_source(prompt)
+        misalign = packed and self.server.profile.should_misalign()
+        if packed:
+            self.server.count('packed')
+        if misalign:
+            self.server.count('misaligned')
+        translation = fake_translation(text, to_chinese, packed, misalign)
+        time.sleep(self.server.profile.first_token_delay())
+        return translation, estimate_tokens(prompt), estimate_tokens(translation)
+
+    def _zhipu(self, request: dict) -> None:
+        prompt = request['messages'][-1]['content']
+        translation, input_tokens, output_tokens = self._respond(prompt)
+        usage = {'prompt_tokens': input_tokens, 'completion_tokens': output_tokens,
+                 'total_tokens': input_tokens + output_tokens}
+        if not request.get('stream'):
+            time.sleep(self.server.profile.output_time(output_tokens))
+            self._send_json(200, {
+                'model': request.get('model'),
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': translation}}],
+                'usage': usage,
+            })
+            return
+        self._start_chunked('text/event-stream')
+        chunks = split_chunks(translation, output_tokens)
+        for index, piece in enumerate(chunks):
+            if index:
+                time.sleep(self.server.profile.output_time(STREAM_CHUNK_TOKENS))
+            choice = {'index': 0, 'delta': {'role': 'assistant', 'content': piece}}
+            chunk = {'model': request.get('model'), 'choices': [choice]}
+            if index == len(chunks) - 1:
+                choice['finish_reason'] = 'stop'
+                chunk['usage'] = usage
+            self._write_chunk(f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'.encode('utf-8'))
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _gemini(self, request: dict, stream: bool) -> None:
+        prompt = ''.join(part.get('text', '') for part in request['contents'][-1]['parts'])
+        translation, input_tokens, output_tokens = self._respond(prompt)
+        usage = {'promptTokenCount': input_tokens, 'candidatesTokenCount': output_tokens,
+                 'totalTokenCount': input_tokens + output_tokens}
+
+        def candidate(text, finished):
+            result = {'index': 0, 'content': {'role': 'model', 'parts': [{'text': text}]}}
+            if finished:
+                # 请求参数为 enum-encoding=int，1 表示 STOP
+                result['finishReason'] = 1
+            return result
+
+        if not stream:
+            time.sleep(self.server.profile.output_time(output_tokens))
+            self._send_json(200, {'candidates': [candidate(translation, True)], 'usageMetadata': usage})
+            return
+        # REST 传输的流式响应是逐步发送的 JSON 数组
+        self._start_chunked('application/json')
+        chunks = split_chunks(translation, output_tokens)
+        for index, piece in enumerate(chunks):
+            if index:
+                time.sleep(self.server.profile.output_time(STREAM_CHUNK_TOKENS))
+            finished = index == len(chunks) - 1
+            chunk = {'candidates': [candidate(piece, finished)]}
+            if finished:
+                chunk['usageMetadata'] = usage
+            prefix = '[' if index == 0 else ',\r\n'
+            self._write_chunk((prefix + json.dumps(chunk, ensure_ascii=False)).encode('utf-8'))
+        self._write_chunk(b']')
+        self._write_chunk(b'')
+
+class StubServer(ThreadingHTTPServer):
+    """同一个服务同时提供两个接口，按请求路径区分"""
+    daemon_threads = True
+
+    def __init__(self, profile: StubProfile, host: str = '127.0.0.1', port: int = 0):
+        super().__init__((host, port), StubHandler)
+        self.profile = profile
+        self.stats = {'requests': 0, 'throttled': 0, 'packed': 0, 'misaligned': 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def zhipu_base_url(self) -> str:
+        return f'{self.base_url}/api/paas/v4'
+
+    def count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def start(self) -> 'StubServer':
+        threading.Thread(target=self.serve_forever, name='stub-providers', daemon=True).start()
+        return self
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--latency-ms', type=float, default=800, help='首个 token 延迟的中位数（毫秒）')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='延迟对数正态分布的 sigma，越大长尾越明显')
+    parser.add_argument('--tokens-per-second', type=float, default=150, help='输出速度，0 表示立即返回全部输出')
+    parser.add_argument('--max-rps', type=float, default=0, help='每秒请求数上限，超出返回 429，0 表示不限制')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='随机返回 429 的比例')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429 响应中的 Retry-After 秒数')
+    parser.add_argument('--misalign-rate', type=float, default=0.05,
+                        help='打包请求返回错位结果（条数不一致）的比例，0 表示总是对齐')
+    parser.add_argument('--seed', type=int, default=None, help='随机数种子')
+
+def profile_from_args(args) -> StubProfile:
+    return StubProfile(args.latency_ms, args.latency_sigma, args.tokens_per_second,
+                       args.max_rps, args.error_rate, args.retry_after, args.seed, args.misalign_rate)
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟 Gemini 和智谱AI 接口的本地服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubServer(profile_from_args(args), args.host, args.port)
+    print(f"gemini_base_url: {server.base_url}")
+    print(f"zhipu_base_url:  {server.zhipu_base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Iterator
+from translator import BaseTranslator, TranslatorWrapper
+
+# 命中时的访问时间先记在内存中，积累到这么多条或下一次写入时再批量更新
+TOUCH_FLUSH_SIZE = 256
+
+def normalize_text(text: str) -> str:
+    """规范化文本：统一字符形式，合并行内多余空白，去掉首尾空行"""
+    text = unicodedata.normalize('NFKC', text)
+    lines = [re.sub(r'[ \t　]+', ' ', line).strip() for line in text.splitlines()]
+    return '\n'.join(lines).strip()
+
+def make_cache_key(translator: BaseTranslator, text: str, to_chinese: bool, context: str = '') -> str:
+    """根据提供商、模型、方向、提示词模板、参考信息和规范化文本计算缓存键"""
+    parts = [
+        getattr(translator, 'provider_name', type(translator).__name__),
+        getattr(translator, 'model_name', ''),
+        'en2zh' if to_chinese else 'zh2en',
+        translator.prompt_template(to_chinese) if hasattr(translator, 'prompt_template') else '',
+        normalize_text(context),
+        normalize_text(text),
+    ]
+    raw = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+class TranslationCache:
+    """基于 SQLite 的持久化翻译缓存，按条目数和占用空间做 LRU 淘汰"""
+    def __init__(self, path: str, max_entries: int = 20000, max_bytes: int = 200 * 1024 * 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS translations ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'size INTEGER NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_access ON translations(last_access)')
+        self._conn.commit()
+        # 条目数和占用空间只在打开时统计一次，之后随写入和淘汰增减
+        self._count, self._bytes = self._conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations'
+        ).fetchone()
+        # 命中但尚未写回的访问时间：键 -> 时间
+        self._touched = {}
+
+    def get(self, key: str):
+        """查找缓存，命中时记下访问时间，随下一次写入一起提交"""
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM translations WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_FLUSH_SIZE:
+                self._flush_touched()
+                self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """写入缓存并在超出上限时淘汰最久未使用的条目"""
+        size = len(key) + len(value.encode('utf-8'))
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM translations WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO translations (key, value, size, last_access) VALUES (?, ?, ?, ?)',
+                (key, value, size, time.time())
+            )
+            if old is None:
+                self._count += 1
+            else:
+                self._bytes -= old[0]
+            self._bytes += size
+            self._touched.pop(key, None)
+            # 先写回访问时间，最近命中的条目不会被淘汰
+            self._flush_touched()
+            self._evict()
+            self._conn.commit()
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                'UPDATE translations SET last_access = ? WHERE key = ?',
+                [(accessed, key) for key, accessed in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def _evict(self) -> None:
+        evicted = 0
+        while self._count > self.max_entries or self._bytes > self.max_bytes:
+            # 按平均条目大小估算需要淘汰的条数，通常一次删除即可回到上限以内
+            limit = max(self._count - self.max_entries, 1)
+            if self._bytes > self.max_bytes:
+                limit = max(limit, math.ceil((self._bytes - self.max_bytes) * self._count / self._bytes))
+            count, total = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM '
+                '(SELECT size FROM translations ORDER BY last_access ASC LIMIT ?)', (limit,)
+            ).fetchone()
+            if not count:
+                break
+            self._conn.execute(
+                'DELETE FROM translations WHERE key IN '
+                '(SELECT key FROM translations ORDER BY last_access ASC LIMIT ?)', (limit,)
+            )
+            self._count -= count
+            self._bytes -= total
+            evicted += count
+        if evicted:
+            self.evictions += evicted
+            logging.info(f"翻译缓存淘汰 {evicted} 条记录")
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute('DELETE FROM translations')
+            self._conn.commit()
+            self._count = self._bytes = 0
+            self._touched.clear()
+
+    def stats(self) -> dict:
+        """返回命中、未命中、淘汰计数以及当前占用"""
+        with self._lock:
+            count, total = self._count, self._bytes
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': count,
+            'bytes': total,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+class CachedTranslator(TranslatorWrapper):
+    """在任意翻译器前加一层缓存，命中时不再发起网络请求"""
+    def __init__(self, inner: BaseTranslator, cache: TranslationCache):
+        super().__init__(inner)
+        self.cache = cache
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        key = make_cache_key(self.inner, text, to_chinese, context)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logging.info("翻译缓存命中")
+            return cached
+        result = self.inner.translate(text, to_chinese, context)
+        self.cache.put(key, result)
+        return result
+
+    async def translate_async(self, text: str, to_chinese: bool, context: str = '') -> str:
+        key = make_cache_key(self.inner, text, to_chinese, context)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        result = await self.inner.translate_async(text, to_chinese, context)
+        self.cache.put(key, result)
+        return result
+
+    def translate_batch(self, texts: list, to_chinese: bool, contexts: list = None) -> list:
+        contexts = contexts or [''] * len(texts)
+        keys = [make_cache_key(self.inner, text, to_chinese, context) for text, context in zip(texts, contexts)]
+        results = [self.cache.get(key) for key in keys]
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            translations = self.inner.translate_batch(
+                [texts[index] for index in missing], to_chinese, [contexts[index] for index in missing]
+            )
+            for index, translation in zip(missing, translations):
+                results[index] = translation
+                self.cache.put(keys[index], translation)
+        return results
+
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        key = make_cache_key(self.inner, text, to_chinese, context)
+        cached = self.cache.get(key)
+        if cached is not None:
+            logging.info("翻译缓存命中")
+            yield cached
+            return
+        parts = []
+        for delta in self.inner.translate_stream(text, to_chinese, context):
+            parts.append(delta)
+            yield delta
+        # 只缓存完整接收的结果
+        self.cache.put(key, ''.join(parts).strip())
@@ -0,0 +1,164 @@
+import asyncio
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
+from translator import BaseTranslator, TranslatorWrapper
+
+_CJK_PATTERN = re.compile(r'[　-〿㐀-䶿一-鿿＀-￯]')
+_SENTENCE_PATTERN = re.compile(r'(?<=[.!?。！？；;])\s+|(?<=[。！？；])')
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符约一字一个 token，其余约四个字符一个 token"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def _split_long(text: str, max_tokens: int) -> list:
+    """把超出预算的段落按句子拆开，单句仍然过长时按字符硬切"""
+    pieces = []
+    for sentence in _SENTENCE_PATTERN.split(text):
+        if not sentence:
+            continue
+        while estimate_tokens(sentence) > max_tokens:
+            # 按比例估算能放下的字符数
+            cut = max(1, len(sentence) * max_tokens // estimate_tokens(sentence))
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:]
+        if sentence:
+            pieces.append(sentence)
+    return pieces
+
+def split_into_chunks(text: str, max_tokens: int) -> list:
+    """
+    在段落和句子边界上把文本切成不超过 max_tokens 的块
+    返回 (块文本, 与前一块之间的分隔方式) 列表，分隔方式为 'paragraph' 或 'sentence'
+    """
+    units = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append((paragraph, 'paragraph'))
+        else:
+            for index, piece in enumerate(_split_long(paragraph, max_tokens)):
+                units.append((piece, 'paragraph' if index == 0 else 'sentence'))
+
+    chunks = []
+    for unit, separator in units:
+        if chunks:
+            last_text, last_separator = chunks[-1]
+            joiner = '\n\n' if separator == 'paragraph' else ' '
+            merged = last_text + joiner + unit
+            if estimate_tokens(merged) <= max_tokens:
+                chunks[-1] = (merged, last_separator)
+                continue
+        chunks.append((unit, separator))
+    return chunks
+
+def _tail(text: str, max_chars: int) -> str:
+    """取块末尾的若干字符作为下一块的参考上下文，尽量从句子开头截取"""
+    if max_chars <= 0:
+        return ''
+    if len(text) <= max_chars:
+        return text
+    tail = text[-max_chars:]
+    match = re.search(r'[.!?。！？]\s*', tail)
+    if match and match.end() < len(tail):
+        return tail[match.end():]
+    return tail
+
+class ChunkedTranslator(TranslatorWrapper):
+    """超过单次请求预算的文本先分块并发翻译，再按顺序拼接"""
+    def __init__(self, inner: BaseTranslator, max_tokens: int, overlap_chars: int = 300, max_workers: int = 4):
+        super().__init__(inner)
+        self.max_tokens = max_tokens
+        self.overlap_chars = overlap_chars
+        self.max_workers = max_workers
+
+    def _plan(self, text: str, context: str) -> list:
+        """返回 (块文本, 分隔方式, 参考上下文) 列表；无需分块时返回 None"""
+        if estimate_tokens(text) <= self.max_tokens:
+            return None
+        chunks = split_into_chunks(text, self.max_tokens)
+        plan = []
+        previous = ''
+        for chunk, separator in chunks:
+            # 每块带上前一块的结尾作为参考，保证跨块术语和语气一致
+            chunk_context = '\n\n'.join(part for part in (context, _tail(previous, self.overlap_chars)) if part)
+            plan.append((chunk, separator, chunk_context))
+            previous = chunk
+        return plan
+
+    @staticmethod
+    def _join(plan: list, results: list, to_chinese: bool) -> str:
+        parts = []
+        for (_, separator, _), result in zip(plan, results):
+            if parts:
+                if separator == 'paragraph':
+                    parts.append('\n\n')
+                elif not to_chinese:
+                    parts.append(' ')
+            parts.append(result.strip())
+        return ''.join(parts)
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        plan = self._plan(text, context)
+        if plan is None:
+            return self.inner.translate(text, to_chinese, context)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(
+                lambda item: self.inner.translate(item[0], to_chinese, item[2]), plan
+            ))
+        return self._join(plan, results, to_chinese)
+
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        plan = self._plan(text, context)
+        if plan is None:
+            yield from self.inner.translate_stream(text, to_chinese, context)
+            return
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            # 第一块流式输出保证首字延迟，其余块同时在后台翻译
+            futures = [
+                executor.submit(self.inner.translate, chunk, to_chinese, chunk_context)
+                for chunk, _, chunk_context in plan[1:]
+            ]
+            chunk, _, chunk_context = plan[0]
+            yield from self.inner.translate_stream(chunk, to_chinese, chunk_context)
+            for (_, separator, _), future in zip(plan[1:], futures):
+                if separator == 'paragraph':
+                    yield '\n\n'
+                elif not to_chinese:
+                    yield ' '
+                yield future.result().strip()
+        finally:
+            # 调用方提前关闭生成器（如取消翻译）时不等待后台分块，排队中的分块直接丢弃
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def translate_batch(self, texts: list, to_chinese: bool, contexts: list = None) -> list:
+        contexts = contexts or [''] * len(texts)
+        # 超出预算的段落按原方式分块翻译，其余交给下层一起翻译
+        long = {index for index, text in enumerate(texts) if estimate_tokens(text) > self.max_tokens}
+        short = [index for index in range(len(texts)) if index not in long]
+        results = [None] * len(texts)
+        translations = self.inner.translate_batch(
+            [texts[index] for index in short], to_chinese, [contexts[index] for index in short]
+        ) if short else []
+        for index, translation in zip(short, translations):
+            results[index] = translation
+        for index in long:
+            results[index] = self.translate(texts[index], to_chinese, contexts[index])
+        return results
+
+    async def translate_async(self, text: str, to_chinese: bool, context: str = '') -> str:
+        plan = self._plan(text, context)
+        if plan is None:
+            return await self.inner.translate_async(text, to_chinese, context)
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run(chunk, chunk_context):
+            async with semaphore:
+                return await self.inner.translate_async(chunk, to_chinese, chunk_context)
+
+        results = await asyncio.gather(*(run(chunk, chunk_context) for chunk, _, chunk_context in plan))
+        return self._join(plan, results, to_chinese)
@@ -0,0 +1,267 @@
+"""
+命令行批量翻译：不依赖 PyQt，可在服务器或定时任务中预先翻译 PDF
+
+用法:
+    python src/cli.py paper.pdf papers/ -o output --provider gemini --workers 8
+
+每个 PDF 生成 <文件名>.jsonl（每行一页，逐页写入），中断后重新运行会跳过已完成的页面；
+全部完成后再生成 <文件名>.md 双语对照文本；指定 --pdf 时同时边翻译边导出 <文件名>_translated.pdf。
+目录中的 PDF 按其相对于该目录的路径在输出目录下建立相同的子目录，输出文件重名时拒绝运行。
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from chunker import estimate_tokens
+from config import Config
+from exporter import EXPORT_MODES, PdfExporter, with_stored_pages
+from extractor import extract_document, get_page_count
+from factory import create_failover_translator, create_translator, get_shared_glossary, memory_stats
+from glossary import with_document_glossary
+from metrics import registry as metrics_registry
+from pipeline import DocumentTranslator, get_concurrency
+
+def collect_pdfs(inputs: list) -> list:
+    """
+    展开输入中的目录，返回 (PDF 路径, 输出文件名) 列表
+    输出文件名不含扩展名：目录中的文件为相对于该目录的路径，直接给出的文件为文件名；
+    同一个文件重复给出时只保留一次，不同文件的输出文件名相同时抛出 ValueError
+    """
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                for name in sorted(names):
+                    if name.lower().endswith('.pdf'):
+                        file_path = os.path.join(root, name)
+                        files.append((file_path, os.path.splitext(os.path.relpath(file_path, path))[0]))
+        elif path.lower().endswith('.pdf') and os.path.isfile(path):
+            files.append((path, os.path.splitext(os.path.basename(path))[0]))
+        else:
+            logging.warning(f"跳过非PDF文件: {path}")
+
+    result, seen, owners = [], set(), {}
+    for path, name in files:
+        real_path = os.path.realpath(path)
+        if real_path in seen:
+            continue
+        seen.add(real_path)
+        # 大小写不敏感的文件系统上只差大小写的文件名也会互相覆盖
+        owners.setdefault(os.path.normcase(name).lower(), []).append(path)
+        result.append((path, name))
+    collisions = [paths for paths in owners.values() if len(paths) > 1]
+    if collisions:
+        details = '；'.join(' 与 '.join(paths) for paths in collisions)
+        raise ValueError(f"以下文件的输出文件名相同，会互相覆盖翻译结果，请分开运行或调整目录：{details}")
+    return result
+
+def load_done_pages(jsonl_path: str) -> dict:
+    """
+    返回已完成页面在 jsonl 文件中的偏移（页码 -> 字节偏移），只记录位置不加载内容
+    文件末尾因中断而写了一半的行会被截掉，避免下次追加的记录与其连在一起
+    """
+    done = {}
+    if not os.path.exists(jsonl_path):
+        return done
+    valid_end = 0
+    with open(jsonl_path, 'rb') as f:
+        offset = 0
+        for line in f:
+            if line.endswith(b'\n'):
+                try:
+                    done[json.loads(line)['page']] = offset
+                    valid_end = offset + len(line)
+                except (json.JSONDecodeError, UnicodeDecodeError, KeyError):
+                    pass
+            offset += len(line)
+    if valid_end < offset:
+        with open(jsonl_path, 'r+b') as f:
+            f.truncate(valid_end)
+    return done
+
+def read_record(jsonl_path: str, offset: int) -> dict:
+    with open(jsonl_path, 'rb') as f:
+        f.seek(offset)
+        return json.loads(f.readline())
+
+def write_markdown(markdown_path: str, title: str, jsonl_path: str, done: dict) -> None:
+    """按页序逐条读取 jsonl 记录写出双语对照文本，不把整篇译文读入内存"""
+    with open(jsonl_path, 'rb') as source, open(markdown_path, 'w', encoding='utf-8') as f:
+        f.write(f'# {title}\n')
+        for page in sorted(done):
+            source.seek(done[page])
+            record = json.loads(source.readline())
+            f.write(f"\n## 第 {record['page'] + 1} 页\n")
+            for segment in record['segments']:
+                f.write(f"\n{segment['source']}\n\n> {segment['translation']}\n")
+
+class BatchStats:
+    def __init__(self):
+        self.pages = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def add_page(self, sources: list, translations: list) -> None:
+        with self._lock:
+            self.pages += 1
+            self.input_tokens += sum(estimate_tokens(text) for text in sources)
+            self.output_tokens += sum(estimate_tokens(text) for text in translations)
+
+def translate_pdf(path: str, output_dir: str, translator, to_chinese: bool, workers: int,
+                  formats: list, stats: BatchStats, extract_workers: int = None, pdf_layout: str = None,
+                  extract_terms: bool = False, name: str = None) -> None:
+    """翻译一个 PDF，输出文件为 output_dir 下的 <name>.*，name 默认为文件名，可以包含子目录"""
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    jsonl_path = os.path.join(output_dir, f'{name}.jsonl')
+    os.makedirs(os.path.dirname(jsonl_path), exist_ok=True)
+    done = load_done_pages(jsonl_path)
+
+    page_count = get_page_count(path)
+    pending = [index for index in range(page_count) if index not in done]
+    logging.info(f"{path}: 共 {page_count} 页，已完成 {len(done)} 页，待翻译 {len(pending)} 页")
+
+    exporter = None
+    if pdf_layout:
+        exporter = PdfExporter(path, os.path.join(output_dir, f'{name}_translated.pdf'), pdf_layout)
+
+    def export_stored_page(page_index):
+        record = read_record(jsonl_path, done[page_index])
+        exporter.add_page(page_index, [segment['translation'] for segment in record['segments']])
+
+    try:
+        # 页面边提取边翻译，完成一页写入一页，内存中只保留处理窗口内的页面
+        pages = ((blocks.page_index, blocks.texts) for blocks in extract_document(path, extract_workers, pages=pending))
+        glossary = get_shared_glossary()
+        if extract_terms and glossary is not None and pending:
+            # 从最先提取的若干页中提取术语并统一翻译，不为此把文档再读一遍
+            settings = Config.load_settings()
+            pages = with_document_glossary(
+                pages, glossary, translator, to_chinese, settings['glossary_min_count'],
+                settings['glossary_max_auto_terms'], settings['glossary_sample_pages']
+            )
+        if exporter:
+            # 导出与翻译同时进行，之前已完成的页面按页序穿插着交给导出器
+            pages = with_stored_pages(pages, list(done), export_stored_page)
+        write_lock = threading.Lock()
+        with open(jsonl_path, 'ab') as f:
+            def on_page_done(page_index, sources, translations):
+                record = {
+                    'page': page_index,
+                    'segments': [
+                        {'source': source, 'translation': translation}
+                        for source, translation in zip(sources, translations)
+                    ],
+                }
+                with write_lock:
+                    done[page_index] = f.tell()
+                    f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+                    f.flush()
+                if exporter:
+                    exporter.add_page(page_index, translations)
+                stats.add_page(sources, translations)
+
+            DocumentTranslator(translator, workers).translate_page_stream(
+                pages, to_chinese, on_page_done,
+                on_progress=lambda count, _, __: logging.info(f"{name}: {count}/{len(pending)} 页")
+            )
+        if exporter:
+            exporter.close()
+    except Exception:
+        if exporter:
+            exporter.abort()
+        raise
+
+    if 'markdown' in formats:
+        title = os.path.splitext(os.path.basename(path))[0]
+        write_markdown(os.path.join(output_dir, f'{name}.md'), title, jsonl_path, done)
+    if 'jsonl' not in formats:
+        os.remove(jsonl_path)
+
+def build_translator(provider: str):
+    gemini_key, zhipu_key = Config.load_api_keys()
+    gemini_key = os.environ.get('GEMINI_API_KEY', gemini_key)
+    zhipu_key = os.environ.get('ZHIPU_API_KEY', zhipu_key)
+    keys = {'gemini': gemini_key, 'zhipu': zhipu_key}
+    if provider == 'auto':
+        translators = [create_translator(name, key) for name, key in keys.items() if key]
+        if not translators:
+            raise SystemExit("未配置任何API密钥")
+        return create_failover_translator(translators) if len(translators) > 1 else translators[0]
+    if not keys[provider]:
+        raise SystemExit(f"未配置 {provider} 的API密钥")
+    return create_translator(provider, keys[provider])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量翻译PDF文件')
+    parser.add_argument('inputs', nargs='+', help='PDF 文件或包含 PDF 的目录')
+    parser.add_argument('-o', '--output-dir', default='translations', help='输出目录')
+    parser.add_argument('--provider', choices=['gemini', 'zhipu', 'auto'], default='auto', help='翻译提供商')
+    parser.add_argument('--to-english', action='store_true', help='中译英（默认英译中）')
+    parser.add_argument('--workers', type=int, default=None, help='并发请求数，默认使用提供商的并发设置')
+    parser.add_argument('--extract-workers', type=int, default=None,
+                        help='提取PDF文本的进程数，默认使用 extract_workers 设置或 CPU 核数')
+    parser.add_argument('--pdf', choices=EXPORT_MODES, default=None,
+                        help='同时导出翻译后的PDF：overlay 在原位置替换为译文，side_by_side 为左右双语对照')
+    parser.add_argument('--extract-terms', action=argparse.BooleanOptionalAction, default=None,
+                        help='翻译前从文档中提取术语加入术语表，默认使用 glossary_auto_extract 设置')
+    parser.add_argument('--format', choices=['jsonl', 'markdown', 'both'], default='both', help='输出格式')
+    parser.add_argument('--metrics-json', default=None, help='结束时把每次接口调用的统计写入该 JSON 文件')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        files = collect_pdfs(args.inputs)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if not files:
+        raise SystemExit("没有找到PDF文件")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    translator = build_translator(args.provider)
+    workers = args.workers or get_concurrency(translator)
+    settings = Config.load_settings()
+    extract_workers = args.extract_workers or settings['extract_workers'] or None
+    extract_terms = settings['glossary_auto_extract'] if args.extract_terms is None else args.extract_terms
+    formats = ['jsonl', 'markdown'] if args.format == 'both' else [args.format]
+    stats = BatchStats()
+    start = time.perf_counter()
+    failed = []
+    for path, name in files:
+        try:
+            translate_pdf(path, args.output_dir, translator, not args.to_english, workers, formats, stats,
+                          extract_workers, args.pdf, extract_terms, name)
+        except Exception as e:
+            # 已完成的页面已经写入，下次运行会从中断处继续
+            logging.error(f"{path} 翻译失败: {str(e)}")
+            failed.append(path)
+
+    elapsed = time.perf_counter() - start
+    pages_per_minute = stats.pages / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"本次翻译 {stats.pages} 页，用时 {elapsed:.1f} 秒，{pages_per_minute:.1f} 页/分钟")
+    print(f"估算 token 用量：输入 {stats.input_tokens}，输出 {stats.output_tokens}（缓存命中的段落也计入）")
+    if memory_stats.lookups:
+        memory = memory_stats.to_dict()
+        print(f"翻译记忆：完全匹配 {memory['exact_hits']} 段，相似匹配 {memory['fuzzy_hits']} 段，"
+              f"匹配率 {memory['match_rate']:.1%}，节省约 {memory['tokens_saved']} token")
+    for series in metrics_registry.snapshot():
+        latency = series['latency_seconds']
+        print(f"{series['provider']}/{series['model']}：调用 {series['calls']} 次，失败 {series['errors']} 次，"
+              f"重试 {series['retries']} 次，token 输入 {series['input_tokens']} / 输出 {series['output_tokens']}，"
+              f"费用约 ${series['cost']:.4f}，耗时 p50 {latency['p50']:.2f}s / p95 {latency['p95']:.2f}s")
+    if args.metrics_json:
+        with open(args.metrics_json, 'w', encoding='utf-8') as f:
+            f.write(metrics_registry.to_json())
+    if failed:
+        print(f"以下文件未完成，可重新运行继续：{', '.join(failed)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -3,6 +3,80 @@ import os
 import sys
 from pathlib import Path
 
+# 可在配置文件的 "settings" 字段中覆盖的默认设置
+DEFAULT_SETTINGS = {
+    # 翻译缓存：最多保留的条目数和磁盘占用上限（MB），超出后按最近最少使用淘汰
+    'cache_enabled': True,
+    'cache_max_entries': 20000,
+    'cache_max_mb': 200,
+    # 全文翻译时每个提供商允许同时进行的请求数
+    'concurrency': {'gemini': 4, 'zhipu': 8, 'auto': 8, 'remote': 8},
+    # 阅读PDF时在后台预先翻译的后续页数，0 表示关闭预取
+    'prefetch_pages': 2,
+    'prefetch_workers': 2,
+    # 界面的翻译任务调度：scheduler_workers 个线程按优先级（当前页 > 预取 > 全文翻译）执行任务，
+    # 另有 scheduler_interactive_workers 个线程只翻译当前页，全文翻译占满线程时当前页也不用排队
+    'scheduler_workers': 8,
+    'scheduler_interactive_workers': 2,
+    # 实时翻译：输入停顿 live_translate_delay_ms 毫秒后只翻译新增或改动的段落；live_translate 为启动时是否开启
+    'live_translate': False,
+    'live_translate_delay_ms': 800,
+    # 全文提取 PDF 文本时使用的进程数，0 表示按 CPU 核数自动选择
+    'extract_workers': 0,
+    # HTTP 连接池大小以及连接/读取超时（秒）
+    'http_pool_size': 16,
+    'http_connect_timeout': 10,
+    'http_read_timeout': 120,
+    # Gemini 生成参数，如 temperature、max_output_tokens，留空使用接口默认值
+    'gemini_generation_config': {'temperature': 0.2, 'max_output_tokens': 8192},
+    # 接口地址，留空使用官方地址；可指向兼容的代理或 benchmarks/stub_providers.py 启动的模拟服务
+    'gemini_base_url': '',
+    'zhipu_base_url': '',
+    # 单次请求的输入 token 预算，超出时按段落/句子分块并发翻译；分块时带上前一块结尾的字符数作为参考
+    'chunk_tokens': {'gemini': 4000, 'zhipu': 2000},
+    'chunk_overlap_chars': 300,
+    # 短段落打包：不超过 packing_segment_tokens 的段落（图注、标题、参考文献等）合并成一个请求，
+    # 每个请求合计不超过 packing_max_tokens、最多 packing_max_segments 段
+    'packing_enabled': True,
+    'packing_segment_tokens': 80,
+    'packing_max_tokens': 1500,
+    'packing_max_segments': 40,
+    # 每个提供商每分钟的请求数和 token 数上限，0 表示不限制
+    'rate_limits': {
+        'gemini': {'requests_per_minute': 300, 'tokens_per_minute': 1000000},
+        'zhipu': {'requests_per_minute': 300, 'tokens_per_minute': 1000000},
+    },
+    # 限流和临时性错误的重试次数及退避时间（秒）
+    'max_retries': 4,
+    'retry_base_delay': 1.0,
+    'retry_max_delay': 30.0,
+    # 自动模式：主提供商超过其 p95 耗时（不低于 hedge_min_delay 秒）仍未返回时向备用提供商发出对冲请求
+    # 连续失败 breaker_failures 次的提供商熔断 breaker_reset_seconds 秒
+    'hedge_percentile': 0.95,
+    'hedge_min_delay': 2.0,
+    'hedge_default_delay': 8.0,
+    'breaker_failures': 3,
+    'breaker_reset_seconds': 30,
+    # 本地翻译服务地址（如 http://127.0.0.1:8765），设置后界面中可切换到"远程"翻译器
+    'remote_url': '',
+    'remote_provider': '',
+    # 翻译记忆：完全相同的段落直接复用旧译文，相似度不低于 memory_threshold 的旧段落作为参考传给模型
+    'memory_enabled': True,
+    'memory_threshold': 0.7,
+    # 术语表：翻译全文前自动提取出现至少 glossary_min_count 次的术语（最多 glossary_max_auto_terms 个）并统一翻译
+    'glossary_enabled': True,
+    'glossary_auto_extract': True,
+    'glossary_min_count': 3,
+    'glossary_max_auto_terms': 40,
+    # 自动提取只统计全文翻译时最先提取的这么多页，其余页面不必等待整篇文档扫描完
+    'glossary_sample_pages': 20,
+    # 统计中估算费用用的价格：每百万 token 的美元价格，按实际计费修改
+    'token_prices': {
+        'gemini': {'input': 0.10, 'output': 0.40},
+        'zhipu': {'input': 0.0, 'output': 0.0},
+    },
+}
+
 class Config:
     @staticmethod
     def get_config_path():
@@ -13,6 +87,24 @@ class Config:
         else:
             # 如果是开发环境
             return 'translator_config.json'
+
+    @staticmethod
+    def get_data_path(file_name: str) -> str:
+        """获取与配置文件同目录的数据文件路径"""
+        return os.path.join(os.path.dirname(os.path.abspath(Config.get_config_path())), file_name)
+
+    @staticmethod
+    def load_settings() -> dict:
+        """加载设置，缺失的项使用默认值"""
+        settings = dict(DEFAULT_SETTINGS)
+        try:
+            config_path = Config.get_config_path()
+            if os.path.exists(config_path):
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    settings.update(json.load(f).get('settings', {}))
+        except Exception as e:
+            print(f"加载设置失败: {e}")
+        return settings
     
     @staticmethod
     def save_api_keys(gemini_key: str = None, zhipu_key: str = None) -> None:
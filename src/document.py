@@ -0,0 +1,174 @@
+"""
+大文档的流式处理
+
+PdfDocument 只在内存中保留当前页附近的若干页段落，ResultStore 把全文翻译的结果逐页写入磁盘，
+打开上千页的文档时内存占用与页数无关。
+"""
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from extractor import extract_document, extract_page_blocks
+
+class ResultStore:
+    """全文翻译结果的磁盘存储：每页完成后立即写入 SQLite，不在内存中保留整篇译文"""
+    def __init__(self, path: str = None):
+        # 未指定路径时使用临时文件，关闭时删除
+        self._temporary = path is None
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='translate_paper_', suffix='.sqlite3')
+            os.close(fd)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'page INTEGER NOT NULL, to_chinese INTEGER NOT NULL, '
+            'segments TEXT NOT NULL, translations TEXT NOT NULL, '
+            'PRIMARY KEY (page, to_chinese))'
+        )
+        self._conn.commit()
+
+    def put_page(self, page_index: int, to_chinese: bool, segments: list, translations: list) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pages (page, to_chinese, segments, translations) VALUES (?, ?, ?, ?)',
+                (page_index, int(to_chinese), json.dumps(segments, ensure_ascii=False),
+                 json.dumps(translations, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def get_page(self, page_index: int, to_chinese: bool, segments: list = None):
+        """返回该页的译文段落列表；没有结果，或给出的 segments 与翻译时的原文不一致时返回 None"""
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                'SELECT segments, translations FROM pages WHERE page = ? AND to_chinese = ?',
+                (page_index, int(to_chinese))
+            ).fetchone()
+        if row is None:
+            return None
+        if segments is not None and json.loads(row[0]) != segments:
+            return None
+        return json.loads(row[1])
+
+    def get_pages(self, start: int, stop: int, to_chinese: bool) -> dict:
+        """一次读出 [start, stop) 范围内已完成的页面，返回 {页码: (原文段落, 译文段落)}"""
+        with self._lock:
+            if self._conn is None:
+                return {}
+            rows = self._conn.execute(
+                'SELECT page, segments, translations FROM pages '
+                'WHERE to_chinese = ? AND page >= ? AND page < ? ORDER BY page',
+                (int(to_chinese), start, stop)
+            ).fetchall()
+        return {page: (json.loads(segments), json.loads(translations)) for page, segments, translations in rows}
+
+    def completed_pages(self, to_chinese: bool) -> set:
+        with self._lock:
+            if self._conn is None:
+                return set()
+            rows = self._conn.execute('SELECT page FROM pages WHERE to_chinese = ?', (int(to_chinese),))
+            return {row[0] for row in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is None:
+                return
+            self._conn.close()
+            self._conn = None
+        if self._temporary:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logging.warning(f"删除临时译文文件失败: {str(e)}")
+
+class PdfDocument:
+    """
+    惰性读取的 PDF 文档：页面在需要时才提取，内存中只保留最近访问的 window 页
+    提取在锁外进行，每个正在提取的线程各用一个文档句柄，锁只保护页面窗口和句柄池，
+    翻页时不会等待后台预取或对照窗口的提取
+    """
+    def __init__(self, path: str, window: int = 8, store: ResultStore = None):
+        import fitz  # PyMuPDF
+        self._fitz = fitz
+        self.path = path
+        self.window = max(1, window)
+        doc = fitz.open(path)
+        self.page_count = doc.page_count
+        self.results = store or ResultStore()
+        self._segments = OrderedDict()
+        # 空闲的文档句柄，用完后放回；同时提取的线程多于空闲句柄时打开新的句柄
+        self._handles = [doc]
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _extract(self, page_index: int) -> list:
+        # 与全文提取使用同一套规则，保证单页翻译和全文翻译的段落一致
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("文档已关闭")
+            doc = self._handles.pop() if self._handles else None
+        if doc is None:
+            doc = self._fitz.open(self.path)
+        try:
+            return extract_page_blocks(doc[page_index], page_index).texts
+        finally:
+            with self._lock:
+                if self._closed:
+                    doc.close()
+                else:
+                    self._handles.append(doc)
+
+    def cached_segments(self, page_index: int):
+        """页面在窗口中时返回其段落并标记为最近访问，否则返回 None，不会提取页面"""
+        with self._lock:
+            if page_index not in self._segments:
+                return None
+            self._segments.move_to_end(page_index)
+            return self._segments[page_index]
+
+    def segments(self, page_index: int) -> list:
+        """返回一页的段落列表，超出窗口的旧页面会被丢弃"""
+        segments = self.cached_segments(page_index)
+        if segments is not None:
+            return segments
+        segments = self._extract(page_index)
+        with self._lock:
+            self._segments[page_index] = segments
+            self._segments.move_to_end(page_index)
+            while len(self._segments) > self.window:
+                self._segments.popitem(last=False)
+        return segments
+
+    def peek_segments(self, page_index: int) -> list:
+        """返回一页的段落，不放入页面窗口也不改变其顺序，供后台读取使用，不会挤掉当前页附近的页面"""
+        with self._lock:
+            if page_index in self._segments:
+                return self._segments[page_index]
+        return self._extract(page_index)
+
+    def iter_pages(self, pages: list = None, workers: int = None):
+        """
+        逐页产出 (页码, 段落列表)，用于全文翻译
+        在独立的进程或文档句柄中提取，不经过也不占用页面窗口
+        """
+        pages = list(range(self.page_count)) if pages is None else pages
+        for blocks in extract_document(self.path, workers, pages=pages):
+            yield blocks.page_index, blocks.texts
+
+    def close(self) -> None:
+        """关闭文档；正在提取的句柄在提取结束后关闭"""
+        with self._lock:
+            self._closed = True
+            self._segments.clear()
+            handles, self._handles = self._handles, []
+        for doc in handles:
+            doc.close()
+        self.results.close()
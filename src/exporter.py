@@ -0,0 +1,200 @@
+"""
+导出翻译后的 PDF
+
+两种版式：
+    overlay       用白色覆盖原文文本块，在原位置写入译文
+    side_by_side  左边为原页面，右边在相同位置写入译文
+
+译文按页交给导出器后由后台线程按页序写入，每写完若干页保存为一个临时分段文件并释放内存，
+导出与翻译同时进行；所有页面写完后把各分段合并后完整保存一次，再替换到目标路径。
+取消或出错时删除已写入的分段，目标路径上原有的文件保持不变。
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from extractor import extract_page_blocks
+
+EXPORT_MODES = ('overlay', 'side_by_side')
+
+# 每写入多少页保存一个分段
+FLUSH_PAGES = 8
+
+# 最小字号，仍放不下时按此字号写入并截断
+MIN_FONT_SIZE = 4.0
+
+def _font_for(text: str) -> str:
+    """选择 PyMuPDF 内置字体：含中日韩文字时用 china-s，内置字体不嵌入文件，导出的 PDF 体积小"""
+    return 'helv' if text.isascii() else 'china-s'
+
+def insert_fitted_text(page, rect, text: str, font_size: float) -> float:
+    """在 rect 中写入文本，放不下时逐步缩小字号，返回实际使用的字号"""
+    fontname = _font_for(text)
+    size = font_size
+    while size > MIN_FONT_SIZE:
+        # 放不下时 insert_textbox 返回负数且不写入任何内容
+        if page.insert_textbox(rect, text, fontname=fontname, fontsize=size) >= 0:
+            return size
+        size *= 0.85
+    page.insert_textbox(rect, text, fontname=fontname, fontsize=MIN_FONT_SIZE)
+    return MIN_FONT_SIZE
+
+def with_stored_pages(pages, stored_pages, export_page):
+    """
+    包装逐页产出 (页码, 段落列表) 的待翻译页面迭代器：按页序在其间调用 export_page(页码)
+    把之前已翻译的页面交给导出器，不必一次性读出所有已完成页面
+    """
+    stored_pages = sorted(stored_pages)
+    position = 0
+    for page_index, segments in pages:
+        while position < len(stored_pages) and stored_pages[position] < page_index:
+            export_page(stored_pages[position])
+            position += 1
+        yield page_index, segments
+    for page_index in stored_pages[position:]:
+        export_page(page_index)
+
+class PdfExporter:
+    """接收乱序完成的页面译文，在后台线程中按页序写入新的 PDF"""
+    def __init__(self, source_path: str, output_path: str, mode: str = 'overlay', flush_pages: int = FLUSH_PAGES):
+        if mode not in EXPORT_MODES:
+            raise ValueError(f"不支持的导出版式: {mode}")
+        import fitz  # PyMuPDF
+        self._fitz = fitz
+        self.source_path = source_path
+        self.output_path = output_path
+        self.mode = mode
+        self.flush_pages = max(1, flush_pages)
+        self._source = fitz.open(source_path)
+        self.page_count = self._source.page_count
+        self.pages_written = 0
+        # 已完成但还没轮到写入的页面：页码 -> 译文段落列表
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._closed = False
+        self._aborted = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='pdf-export', daemon=True)
+        self._thread.start()
+
+    def add_page(self, page_index: int, translations: list) -> None:
+        """提交一页译文，可以在任意线程中以任意顺序调用"""
+        with self._condition:
+            if self._error is not None:
+                raise self._error
+            self._pending[page_index] = translations
+            self._condition.notify()
+
+    def close(self, wait: bool = True) -> int:
+        """
+        结束导出：wait 为 True 时等待所有页面写完，返回写入的页数
+        缺少译文的页面在结束时按原样写入
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if wait:
+            self._thread.join()
+            if self._error is not None:
+                raise self._error
+        return self.pages_written
+
+    def abort(self) -> None:
+        """放弃导出：剩余页面不再写入，已写入的分段删除，不改动目标文件"""
+        with self._condition:
+            self._closed = True
+            self._aborted = True
+            self._condition.notify()
+
+    def _next_translations(self, page_index: int):
+        """等待第 page_index 页的译文；导出已结束而该页仍未提交时返回 None"""
+        with self._condition:
+            while page_index not in self._pending and not self._closed:
+                self._condition.wait()
+            return self._pending.pop(page_index, None)
+
+    def _run(self) -> None:
+        output = None
+        parts = []
+        workdir = tempfile.mkdtemp(prefix='translate_paper_export_')
+        try:
+            output = self._fitz.open()
+            for page_index in range(self.page_count):
+                translations = self._next_translations(page_index)
+                if self._aborted:
+                    break
+                self._render_page(output, page_index, translations)
+                self.pages_written += 1
+                if output.page_count >= self.flush_pages:
+                    parts.append(self._save_part(output, workdir, len(parts)))
+                    output.close()
+                    output = self._fitz.open()
+            if not self._aborted and output.page_count:
+                parts.append(self._save_part(output, workdir, len(parts)))
+            merged = self._merge(parts, workdir) if parts and not self._aborted else None
+            # 合并期间也可能被取消，只有完整导出的文件才替换目标文件
+            if self._aborted:
+                logging.info(f"PDF 导出已取消，已写入 {self.pages_written} 页，未改动 {self.output_path}")
+                return
+            if merged:
+                shutil.move(merged, self.output_path)
+            logging.info(f"PDF 导出完成: {self.output_path}，共 {self.pages_written} 页")
+        except Exception as e:
+            logging.error(f"PDF 导出错误: {str(e)}")
+            with self._condition:
+                self._error = e
+        finally:
+            if output is not None:
+                output.close()
+            self._source.close()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    @staticmethod
+    def _save_part(output, workdir: str, index: int) -> str:
+        path = os.path.join(workdir, f'part_{index:05d}.pdf')
+        output.save(path, garbage=1)
+        return path
+
+    def _merge(self, parts: list, workdir: str) -> str:
+        """按顺序合并各分段并完整保存到临时文件，返回其路径；确认完成后才替换目标文件，中途出错不会留下损坏的输出"""
+        merged = self._fitz.open()
+        try:
+            for path in parts:
+                with self._fitz.open(path) as part:
+                    merged.insert_pdf(part)
+            temporary = os.path.join(workdir, 'merged.pdf')
+            merged.save(temporary, garbage=3, deflate=True)
+        finally:
+            merged.close()
+        return temporary
+
+    def _render_page(self, output, page_index: int, translations) -> None:
+        source_page = self._source[page_index]
+        blocks = extract_page_blocks(source_page, page_index)
+        if translations is not None and len(translations) != len(blocks):
+            logging.warning(f"第 {page_index + 1} 页译文段落数与文本块数不一致，按原页面导出")
+            translations = None
+
+        width, height = source_page.rect.width, source_page.rect.height
+        if self.mode == 'side_by_side':
+            page = output.new_page(width=width * 2, height=height)
+            page.show_pdf_page(self._fitz.Rect(0, 0, width, height), self._source, page_index)
+            offset = width
+        else:
+            output.insert_pdf(self._source, from_page=page_index, to_page=page_index)
+            page = output[-1]
+            offset = 0
+        if not translations:
+            return
+
+        if self.mode == 'overlay':
+            # 去掉原文文本，保留图片和矢量图形
+            for index in range(len(blocks)):
+                page.add_redact_annot(self._fitz.Rect(blocks.bbox(index)), fill=(1, 1, 1))
+            page.apply_redactions(images=self._fitz.PDF_REDACT_IMAGE_NONE)
+
+        for index, translation in enumerate(translations):
+            x0, y0, x1, y1 = blocks.bbox(index)
+            rect = self._fitz.Rect(x0 + offset, y0, x1 + offset, y1)
+            insert_fitted_text(page, rect, translation, blocks.font_sizes[index] or 10)
@@ -0,0 +1,137 @@
+"""
+多进程 PDF 文本提取
+
+每个工作进程自己打开文档并提取一段连续页面，返回紧凑的 PageBlocks：
+文本放在列表中，坐标、字号和所在栏放在 array 中，便于跨进程传输。
+"""
+import itertools
+import logging
+import multiprocessing
+import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from segmenter import join_block_lines
+
+# 横跨两栏的块（标题、通栏图表说明等）
+SPANNING_COLUMN = -1
+
+class PageBlocks:
+    """一页中的文本块：texts[i] 的外框为 bboxes[4*i:4*i+4]，字号为 font_sizes[i]，所在栏为 columns[i]"""
+    __slots__ = ('page_index', 'width', 'height', 'texts', 'bboxes', 'font_sizes', 'columns')
+
+    def __init__(self, page_index: int, width: float, height: float):
+        self.page_index = page_index
+        self.width = width
+        self.height = height
+        self.texts = []
+        self.bboxes = array('f')
+        self.font_sizes = array('f')
+        self.columns = array('b')
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def add(self, text: str, bbox: tuple, font_size: float, column: int) -> None:
+        self.texts.append(text)
+        self.bboxes.extend(bbox)
+        self.font_sizes.append(font_size)
+        self.columns.append(column)
+
+    def bbox(self, index: int) -> tuple:
+        return tuple(self.bboxes[4 * index:4 * index + 4])
+
+    def block(self, index: int) -> tuple:
+        """返回 (文本, 外框, 字号, 栏)"""
+        return self.texts[index], self.bbox(index), self.font_sizes[index], self.columns[index]
+
+def _detect_column(x0: float, x1: float, width: float) -> int:
+    """按页面中线判断块所在的栏，留出少量容差"""
+    middle = width / 2
+    tolerance = width * 0.02
+    if x1 <= middle + tolerance:
+        return 0
+    if x0 >= middle - tolerance:
+        return 1
+    return SPANNING_COLUMN
+
+def extract_page_blocks(page, page_index: int = None) -> PageBlocks:
+    """从 PyMuPDF 页面对象提取文本块、外框、主要字号和所在栏"""
+    rect = page.rect
+    result = PageBlocks(page.number if page_index is None else page_index, rect.width, rect.height)
+    for block in page.get_text('dict')['blocks']:
+        # type 1 为图片块
+        if block.get('type', 0) != 0:
+            continue
+        lines = []
+        size_weights = {}
+        for line in block['lines']:
+            lines.append(''.join(span['text'] for span in line['spans']))
+            for span in line['spans']:
+                size = round(span['size'], 1)
+                size_weights[size] = size_weights.get(size, 0) + len(span['text'])
+        text = join_block_lines('\n'.join(lines))
+        if not text:
+            continue
+        # 取覆盖字符最多的字号作为块的字号
+        font_size = max(size_weights, key=size_weights.get) if size_weights else 0.0
+        x0, y0, x1, y1 = block['bbox']
+        result.add(text, (x0, y0, x1, y1), font_size, _detect_column(x0, x1, rect.width))
+    return result
+
+def _extract_range(path: str, start: int, stop: int) -> list:
+    """工作进程入口：打开文档并提取 [start, stop) 页"""
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        return [extract_page_blocks(doc[index], index) for index in range(start, min(stop, doc.page_count))]
+
+def get_page_count(path: str) -> int:
+    import fitz  # PyMuPDF
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+def extract_document(path: str, workers: int = None, pages_per_task: int = 16, pages: list = None):
+    """
+    并行提取整个文档（或 pages 指定的页面），按 pages 的顺序逐页产出 PageBlocks
+    页数较少时直接在当前进程中提取，省去启动进程的开销
+    """
+    if pages is None:
+        pages = list(range(get_page_count(path)))
+    if not pages:
+        return
+    workers = workers or os.cpu_count() or 1
+
+    # 把要提取的页面划分成连续区间，每个区间作为一个任务
+    ranges = []
+    for index in pages:
+        if ranges and index == ranges[-1][1] and ranges[-1][1] - ranges[-1][0] < pages_per_task:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+
+    if workers <= 1 or len(pages) <= pages_per_task:
+        for start, stop in ranges:
+            yield from _extract_range(path, start, stop)
+        return
+
+    logging.info(f"使用 {workers} 个进程提取 {len(pages)} 页")
+    # 使用 spawn 避免在带有 Qt 线程的进程中 fork
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        # 最多提前提交 2 倍进程数的任务，调用方消费得慢时不会把整篇文档堆积在内存中
+        futures = deque()
+        ranges = iter(ranges)
+        for start, stop in itertools.islice(ranges, workers * 2):
+            futures.append(executor.submit(_extract_range, path, start, stop))
+        while futures:
+            blocks = futures.popleft().result()
+            for start, stop in itertools.islice(ranges, 1):
+                futures.append(executor.submit(_extract_range, path, start, stop))
+            yield from blocks
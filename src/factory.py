@@ -0,0 +1,132 @@
+from cache import CachedTranslator, TranslationCache
+from chunker import ChunkedTranslator
+from config import Config
+from failover import FailoverTranslator
+from glossary import Glossary, GlossaryTranslator
+from memory import MemoryStats, MemoryTranslator, TranslationMemory
+from metrics import InstrumentedTranslator, registry as metrics_registry
+from packing import PackingTranslator
+from ratelimit import RateLimitedTranslator, RetryPolicy, get_rate_limiter
+from translator import BaseTranslator, GeminiTranslator, RemoteTranslator, ZhipuAITranslator
+
+_shared_cache = None
+_shared_memory = None
+_shared_glossary = None
+# 所有翻译器共用一份翻译记忆命中统计
+memory_stats = MemoryStats()
+
+def get_shared_cache():
+    """获取全局共享的翻译缓存，未启用时返回 None"""
+    global _shared_cache
+    settings = Config.load_settings()
+    if not settings['cache_enabled']:
+        return None
+    if _shared_cache is None:
+        _shared_cache = TranslationCache(
+            Config.get_data_path('translation_cache.sqlite3'),
+            max_entries=settings['cache_max_entries'],
+            max_bytes=settings['cache_max_mb'] * 1024 * 1024
+        )
+    return _shared_cache
+
+def get_shared_memory():
+    """获取全局共享的翻译记忆，未启用时返回 None"""
+    global _shared_memory
+    settings = Config.load_settings()
+    if not settings['memory_enabled']:
+        return None
+    if _shared_memory is None:
+        _shared_memory = TranslationMemory(
+            Config.get_data_path('translation_memory.sqlite3'),
+            threshold=settings['memory_threshold']
+        )
+    return _shared_memory
+
+def get_shared_glossary():
+    """获取全局共享的术语表，未启用时返回 None"""
+    global _shared_glossary
+    if not Config.load_settings()['glossary_enabled']:
+        return None
+    if _shared_glossary is None:
+        _shared_glossary = Glossary(Config.get_data_path('glossary.json'))
+    return _shared_glossary
+
+def create_translator(provider: str, api_key: str) -> BaseTranslator:
+    """创建指定提供商的翻译器，并按设置套上缓存层"""
+    settings = Config.load_settings()
+    if provider == 'gemini':
+        translator = GeminiTranslator(
+            api_key,
+            generation_config=settings['gemini_generation_config'],
+            base_url=settings['gemini_base_url']
+        )
+    elif provider == 'zhipu':
+        translator = ZhipuAITranslator(
+            api_key,
+            pool_size=settings['http_pool_size'],
+            connect_timeout=settings['http_connect_timeout'],
+            read_timeout=settings['http_read_timeout'],
+            base_url=settings['zhipu_base_url']
+        )
+    else:
+        raise ValueError(f"未知的翻译提供商: {provider}")
+
+    # 限流和重试在缓存之内，缓存命中不占用配额
+    limits = settings['rate_limits'].get(provider, {})
+    translator = RateLimitedTranslator(
+        translator,
+        get_rate_limiter(provider, limits.get('requests_per_minute', 0), limits.get('tokens_per_minute', 0)),
+        RetryPolicy(settings['max_retries'], settings['retry_base_delay'], settings['retry_max_delay'])
+    )
+    # 统计在限流之外，一次调用的耗时包含排队和重试
+    metrics_registry.prices = settings['token_prices']
+    translator = InstrumentedTranslator(translator, metrics_registry)
+    # 打包在缓存之内，各段仍单独缓存
+    translator = PackingTranslator(translator, settings['packing_max_tokens'], settings['packing_max_segments'])
+
+    cache = get_shared_cache()
+    if cache is not None:
+        translator = CachedTranslator(translator, cache)
+
+    # 术语按分块匹配，只把本块中出现的术语写进提示词；术语表修改后缓存键随之变化
+    glossary = get_shared_glossary()
+    if glossary is not None:
+        translator = GlossaryTranslator(translator, glossary)
+
+    # 分块层在缓存之外，每个分块单独缓存
+    translator = ChunkedTranslator(
+        translator,
+        max_tokens=int(settings['chunk_tokens'].get(provider, 2000)),
+        overlap_chars=settings['chunk_overlap_chars'],
+        max_workers=max(1, int(settings['concurrency'].get(provider, 1)))
+    )
+
+    # 翻译记忆在最外层，按完整段落和其中出现的术语条目查找
+    memory = get_shared_memory()
+    if memory is not None:
+        translator = MemoryTranslator(translator, memory, memory_stats, glossary)
+    return translator
+
+def create_remote_translator(url: str, upstream: str = '') -> BaseTranslator:
+    """创建连接本地翻译服务的翻译器，限流、重试和分块都由服务端负责"""
+    translator = InstrumentedTranslator(RemoteTranslator(url, upstream or None), metrics_registry)
+    cache = get_shared_cache()
+    if cache is not None:
+        translator = CachedTranslator(translator, cache)
+    # 本地术语表作为参考信息随请求发给服务端
+    glossary = get_shared_glossary()
+    if glossary is not None:
+        translator = GlossaryTranslator(translator, glossary)
+    return translator
+
+def create_failover_translator(translators: list) -> BaseTranslator:
+    """把多个已创建的翻译器组合成带对冲请求和熔断的自动模式，列表中靠前的优先"""
+    settings = Config.load_settings()
+    return FailoverTranslator(
+        translators,
+        hedge_percentile=settings['hedge_percentile'],
+        min_hedge_delay=settings['hedge_min_delay'],
+        default_hedge_delay=settings['hedge_default_delay'],
+        failure_threshold=settings['breaker_failures'],
+        reset_timeout=settings['breaker_reset_seconds']
+    )
@@ -0,0 +1,218 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator
+from translator import BaseTranslator
+
+class LatencyTracker:
+    """记录最近若干次请求的耗时，用于估算分位数"""
+    def __init__(self, window: int = 50):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float):
+        """样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < 5:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+class CircuitBreaker:
+    """连续失败达到阈值后熔断，冷却时间过后放行一次试探请求"""
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                # 半开状态：放行一次，失败后重新计时
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+class _Backend:
+    def __init__(self, translator: BaseTranslator, failure_threshold: int, reset_timeout: float):
+        self.translator = translator
+        self.name = getattr(translator, 'provider_name', type(translator).__name__)
+        self.latency = LatencyTracker()
+        self.first_token = LatencyTracker()
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+class FailoverTranslator(BaseTranslator):
+    """
+    组合多个翻译器：按顺序优先使用第一个可用的提供商
+    主提供商超过其 p95 耗时仍未返回时，向下一个提供商发出对冲请求，取先返回的结果
+    连续失败的提供商会被熔断，一段时间内不再使用
+    """
+    provider_name = 'auto'
+
+    def __init__(self, translators: list, hedge_percentile: float = 0.95, min_hedge_delay: float = 2.0,
+                 default_hedge_delay: float = 8.0, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.backends = [_Backend(t, failure_threshold, reset_timeout) for t in translators]
+        self.model_name = '+'.join(backend.name for backend in self.backends)
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self._executor = ThreadPoolExecutor(max_workers=8 * len(self.backends), thread_name_prefix='failover')
+
+    def _candidates(self) -> list:
+        available = [backend for backend in self.backends if backend.breaker.allow()]
+        # 全部熔断时仍然尝试，避免完全不可用
+        return available or list(self.backends)
+
+    def _hedge_delay(self, tracker: LatencyTracker) -> float:
+        value = tracker.percentile(self.hedge_percentile)
+        if value is None:
+            return self.default_hedge_delay
+        return max(self.min_hedge_delay, value)
+
+    def _call(self, backend: _Backend, text: str, to_chinese: bool, context: str) -> str:
+        start = time.perf_counter()
+        try:
+            result = backend.translator.translate(text, to_chinese, context)
+        except Exception:
+            backend.breaker.record_failure()
+            raise
+        backend.latency.record(time.perf_counter() - start)
+        backend.breaker.record_success()
+        return result
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        candidates = self._candidates()
+        pending = {}
+        last_error = None
+
+        def launch():
+            backend = candidates.pop(0)
+            pending[self._executor.submit(self._call, backend, text, to_chinese, context)] = backend
+
+        launch()
+        while pending:
+            # 还有备用提供商时，只等待到对冲时间点
+            timeout = self._hedge_delay(next(iter(pending.values())).latency) if candidates else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                logging.info(f"{pending[next(iter(pending))].name} 响应过慢，向 {candidates[0].name} 发出对冲请求")
+                launch()
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as e:
+                    logging.warning(f"{backend.name} 翻译失败: {str(e)}")
+                    last_error = e
+            if not pending and candidates:
+                launch()
+        raise last_error
+
+    def translate_batch(self, texts: list, to_chinese: bool, contexts: list = None) -> list:
+        """打包请求耗时与单段不同，不参与对冲和耗时统计，只按顺序在可用的提供商之间切换"""
+        last_error = None
+        for backend in self._candidates():
+            try:
+                results = backend.translator.translate_batch(texts, to_chinese, contexts)
+            except Exception as e:
+                backend.breaker.record_failure()
+                logging.warning(f"{backend.name} 批量翻译失败: {str(e)}")
+                last_error = e
+                continue
+            backend.breaker.record_success()
+            return results
+        raise last_error
+
+    def _stream_worker(self, backend: _Backend, text: str, to_chinese: bool, context: str,
+                       output: queue.Queue, stop: threading.Event) -> None:
+        start = time.perf_counter()
+        started = False
+        try:
+            for delta in backend.translator.translate_stream(text, to_chinese, context):
+                if stop.is_set():
+                    return
+                if not started:
+                    backend.first_token.record(time.perf_counter() - start)
+                    started = True
+                output.put((backend, 'delta', delta))
+            backend.breaker.record_success()
+            output.put((backend, 'done', None))
+        except Exception as e:
+            backend.breaker.record_failure()
+            output.put((backend, 'error', e))
+
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        candidates = self._candidates()
+        output = queue.Queue()
+        stops = {}
+        winner = None
+        last_error = None
+
+        def launch():
+            backend = candidates.pop(0)
+            stops[backend] = threading.Event()
+            self._executor.submit(self._stream_worker, backend, text, to_chinese, context, output, stops[backend])
+
+        launch()
+        try:
+            while stops:
+                timeout = None
+                if winner is None and candidates:
+                    timeout = self._hedge_delay(next(iter(stops)).first_token)
+                try:
+                    backend, kind, value = output.get(timeout=timeout)
+                except queue.Empty:
+                    logging.info(f"首个输出过慢，向 {candidates[0].name} 发出对冲请求")
+                    launch()
+                    continue
+                if winner is not None and backend is not winner:
+                    continue
+                if kind == 'delta':
+                    if winner is None:
+                        # 先产生输出的提供商胜出，其余请求停止读取
+                        winner = backend
+                        for other, stop in stops.items():
+                            if other is not backend:
+                                stop.set()
+                        stops = {backend: stops[backend]}
+                    yield value
+                elif kind == 'done':
+                    if winner is None:
+                        winner = backend
+                    return
+                else:
+                    logging.warning(f"{backend.name} 流式翻译失败: {str(value)}")
+                    last_error = value
+                    stops.pop(backend, None)
+                    if winner is not None:
+                        # 已输出部分内容，无法切换提供商
+                        raise value
+                    if not stops and candidates:
+                        launch()
+            raise last_error
+        finally:
+            for stop in stops.values():
+                stop.set()
@@ -0,0 +1,358 @@
+"""
+术语表：保证同一术语在全文中的译法一致
+
+术语来自两部分：用户维护的术语（优先）和从文档中自动提取并统一翻译的术语。
+翻译每段文本前用 Aho-Corasick 自动机一次扫描找出其中出现的术语，只把这些条目写进提示词，
+没有术语的段落提示词不变，不额外增加 token。
+
+术语表文件 glossary.json 与配置文件放在同一目录：
+    {"terms": {"attention mechanism": "注意力机制"}, "auto_terms": {"LSTM": "长短期记忆网络"}}
+"""
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+from collections import Counter, deque
+from typing import Iterator
+from chunker import estimate_tokens
+from translator import BaseTranslator, TranslatorWrapper
+
+GLOSSARY_PROMPT = """Use these fixed translations for the terms that appear in the text:
+{entries}"""
+
+# 每段最多写入提示词的术语条数，避免术语密集的段落提示词过长
+MAX_TERMS_PER_SEGMENT = 20
+
+class AhoCorasick:
+    """多模式字符串匹配：一次扫描文本找出所有出现的模式，耗时与文本长度成正比，与模式数量无关"""
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for pattern in patterns:
+            self._add(pattern)
+        self._build()
+
+    def _add(self, pattern: str) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> Iterator[tuple]:
+        """逐个产出 (结束位置, 模式)，结束位置为模式最后一个字符之后的下标"""
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern in self._output[state]:
+                yield index + 1, pattern
+
+def _is_word_char(char: str) -> bool:
+    return char.isascii() and char.isalnum()
+
+class Glossary:
+    """术语表，英文术语不区分大小写并按整词匹配，中文术语直接匹配"""
+    def __init__(self, path: str = None):
+        self.path = path
+        self.terms = {}
+        self.auto_terms = {}
+        self._lock = threading.Lock()
+        self._matchers = {}
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"加载术语表失败: {str(e)}")
+            return
+        with self._lock:
+            self.terms = dict(data.get('terms', {}))
+            self.auto_terms = dict(data.get('auto_terms', {}))
+            self._matchers = {}
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            data = {'terms': self.terms, 'auto_terms': self.auto_terms}
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logging.error(f"保存术语表失败: {str(e)}")
+            raise
+
+    def set_terms(self, terms: dict) -> None:
+        """替换用户术语"""
+        with self._lock:
+            self.terms = {source.strip(): target.strip() for source, target in terms.items() if source.strip() and target.strip()}
+            self._matchers = {}
+
+    def add_auto_terms(self, terms: dict) -> None:
+        """加入自动提取的术语，已有的条目不覆盖"""
+        with self._lock:
+            for source, target in terms.items():
+                if source and target and source not in self.auto_terms:
+                    self.auto_terms[source] = target
+            self._matchers = {}
+
+    def clear_auto_terms(self) -> None:
+        with self._lock:
+            self.auto_terms = {}
+            self._matchers = {}
+
+    def entries(self) -> dict:
+        """合并后的术语（英文 -> 中文），用户术语优先"""
+        with self._lock:
+            return {**self.auto_terms, **self.terms}
+
+    def __len__(self) -> int:
+        return len(self.entries())
+
+    def _get_matcher(self, to_chinese: bool):
+        """返回 (自动机, 匹配键 -> (原文术语, 译文术语))，术语表修改后重新构建"""
+        with self._lock:
+            matcher = self._matchers.get(to_chinese)
+            if matcher is not None:
+                return matcher
+            lookup = {}
+            for source, target in {**self.auto_terms, **self.terms}.items():
+                # 中译英时反过来用中文术语匹配
+                key, value = (source, (source, target)) if to_chinese else (target, (target, source))
+                lookup[key.lower()] = value
+            matcher = (AhoCorasick(lookup), lookup) if lookup else (None, lookup)
+            self._matchers[to_chinese] = matcher
+            return matcher
+
+    def match(self, text: str, to_chinese: bool) -> list:
+        """返回文本中出现的术语 [(原文术语, 译文术语)]，按首次出现的顺序，较长的术语优先"""
+        automaton, lookup = self._get_matcher(to_chinese)
+        if automaton is None:
+            return []
+        lowered = text.lower()
+        found = {}
+        for end, key in automaton.find(lowered):
+            start = end - len(key)
+            # 英文术语按整词匹配，避免 "GAN" 匹配到 "organ" 这样的单词内部
+            if _is_word_char(key[0]) and start > 0 and _is_word_char(lowered[start - 1]):
+                continue
+            after = lowered[end:end + 2]
+            if _is_word_char(key[-1]) and after and _is_word_char(after[0]):
+                # 允许英文复数形式，如 "transformer" 匹配 "transformers"
+                if not (after[0] == 's' and (len(after) == 1 or not _is_word_char(after[1]))):
+                    continue
+            if key not in found:
+                found[key] = start
+        # 被更长术语包含的短术语不再单独列出
+        keys = sorted(found, key=len, reverse=True)
+        selected = [key for index, key in enumerate(keys) if not any(key in longer for longer in keys[:index])]
+        selected.sort(key=found.get)
+        return [lookup[key] for key in selected[:MAX_TERMS_PER_SEGMENT]]
+
+    def fingerprint(self, text: str, to_chinese: bool) -> str:
+        """文本中出现的术语条目的摘要，没有术语时为空字符串；条目的译法修改后摘要随之变化"""
+        matches = self.match(text, to_chinese)
+        if not matches:
+            return ''
+        data = '\n'.join(f'{source}\t{target}' for source, target in sorted(matches))
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+    def build_context(self, text: str, to_chinese: bool) -> str:
+        matches = self.match(text, to_chinese)
+        if not matches:
+            return ''
+        return GLOSSARY_PROMPT.format(entries='\n'.join(f'- {source} -> {target}' for source, target in matches))
+
+_STOPWORDS = set("""
+a an and are as at be been by can for from has have in into is it its may more not of on or our such
+than that the their these this those to was we were which while with within without also however using
+based used use via each other between both all any one two new
+""".split())
+_CAPITALIZED_PHRASE = re.compile(r'\b(?:[A-Z][a-z]+(?:-[A-Z]?[a-z]+)*\s+){1,3}[A-Z][a-z]+(?:-[A-Z]?[a-z]+)*\b')
+_ACRONYM = re.compile(r'\b[A-Z][A-Za-z]*[A-Z][A-Za-z0-9]*s?\b')
+_DEFINITION = re.compile(r'((?:[A-Za-z][\w-]*\s+){1,5}[A-Za-z][\w-]*)\s*\(([A-Z][A-Za-z0-9]*[A-Z][A-Za-z0-9]*)s?\)')
+_WORD = re.compile(r"[A-Za-z][A-Za-z-]*[A-Za-z]")
+_CLAUSE_SPLIT = re.compile(r'[.,;:!?()\[\]"]')
+
+# 术语提取时最多保留的候选词组数
+MAX_CANDIDATES = 200000
+
+def _expand_acronym(words: list, acronym: str) -> str:
+    """从缩写前面的词中向前取出全称：各词（连字符分开的部分）首字母依次对应缩写中的大写字母"""
+    letters = re.sub(r'[^A-Z]', '', acronym).lower()
+    taken = []
+    for word in reversed(words):
+        if not letters:
+            break
+        initials = ''.join(part[:1].lower() for part in word.split('-') if part)
+        if not letters.endswith(initials):
+            return ''
+        letters = letters[:-len(initials)]
+        taken.append(word)
+    return ' '.join(reversed(taken)) if not letters else ''
+
+class TermExtractor:
+    """
+    从英文文档中统计候选术语：带缩写定义的短语（如 "Long Short-Term Memory (LSTM)"）、
+    缩写词、首字母大写的多词短语，以及反复出现且不含停用词的二元、三元词组
+    逐页调用 feed，内存中只保留计数
+    """
+    def __init__(self):
+        self.counts = Counter()
+        self.definitions = {}
+
+    def feed(self, text: str) -> None:
+        for phrase, acronym in _DEFINITION.findall(text):
+            expansion = _expand_acronym(phrase.split(), acronym)
+            if expansion:
+                self.definitions.setdefault(acronym, expansion)
+        for acronym in _ACRONYM.findall(text):
+            self.counts[acronym.rstrip('s') if acronym[-2:-1].isupper() else acronym] += 1
+        for phrase in _CAPITALIZED_PHRASE.findall(text):
+            phrase = re.sub(r'\s+', ' ', phrase)
+            # 句首的 "The Transformer"、"In Section" 之类不是术语
+            if phrase.split(' ', 1)[0].lower() not in _STOPWORDS:
+                self.counts[phrase] += 1
+        # 词组不跨越标点，不含停用词和缩写
+        for clause in _CLAUSE_SPLIT.split(text):
+            words = _WORD.findall(clause)
+            for size in (2, 3):
+                for index in range(len(words) - size + 1):
+                    gram = words[index:index + size]
+                    if any(len(word) < 3 or word.isupper() or word.lower() in _STOPWORDS for word in gram):
+                        continue
+                    self.counts[' '.join(gram).lower()] += 1
+        # 长文档的候选词组很多，超过上限时丢掉只出现过一次的
+        if len(self.counts) > MAX_CANDIDATES:
+            self.counts = Counter({term: count for term, count in self.counts.items() if count > 1})
+
+    def terms(self, min_count: int = 3, max_terms: int = 50) -> list:
+        """按出现次数返回术语，文中给出过定义的缩写连同全称一起返回"""
+        candidates = {term: count for term, count in self.counts.items() if count >= min_count}
+        for acronym, expansion in self.definitions.items():
+            count = max(self.counts.get(acronym, 1), candidates.get(acronym, 0))
+            candidates[acronym] = count
+            candidates[expansion] = max(count, candidates.get(expansion, 0))
+        candidates = list(candidates.items())
+        # 次数相同时长的优先，如 "long short-term memory" 先于 "short-term memory"
+        candidates.sort(key=lambda item: (-item[1], -len(item[0]), item[0]))
+        result = []
+        for term, _ in candidates:
+            # 与已入选术语互相包含的词组跳过：更短的是其一部分，更长的出现次数更少
+            padded = f' {term.lower()} '
+            if any(f' {chosen.lower()} ' in padded or padded in f' {chosen.lower()} ' for chosen in result):
+                continue
+            result.append(term)
+            if len(result) >= max_terms:
+                break
+        return result
+
+def translate_terms(translator: BaseTranslator, terms: list, to_chinese: bool) -> dict:
+    """把术语列表作为一段文本一次翻译，每行一个；行数对不上时放弃，避免错位的译法进入术语表"""
+    if not terms:
+        return {}
+    try:
+        result = translator.translate('\n'.join(terms), to_chinese)
+    except Exception as e:
+        logging.error(f"术语翻译失败: {str(e)}")
+        return {}
+    lines = [line.strip().lstrip('-•*').strip() for line in result.splitlines() if line.strip()]
+    if len(lines) != len(terms):
+        logging.warning(f"术语翻译结果行数不一致（{len(lines)}/{len(terms)}），未加入术语表")
+        return {}
+    if to_chinese:
+        return dict(zip(terms, lines))
+    # 中译英时术语表仍按 英文 -> 中文 保存
+    return dict(zip(lines, terms))
+
+def build_document_glossary(glossary: Glossary, translator: BaseTranslator, texts, to_chinese: bool,
+                            min_count: int = 3, max_terms: int = 40) -> dict:
+    """
+    从文档文本（可逐页产出的迭代器）中提取术语，一次翻译后加入术语表的自动部分并保存
+    只处理英文原文；已在术语表中的术语不再重复翻译。返回新加入的术语
+    """
+    if not to_chinese:
+        return {}
+    extractor = TermExtractor()
+    for text in texts:
+        extractor.feed(text)
+    known = {term.lower() for term in glossary.entries()}
+    terms = [term for term in extractor.terms(min_count, max_terms) if term.lower() not in known]
+    if not terms:
+        return {}
+    logging.info(f"从文档中提取到 {len(terms)} 个新术语")
+    translated = translate_terms(translator, terms, to_chinese)
+    if translated:
+        glossary.add_auto_terms(translated)
+        glossary.save()
+    return translated
+
+def with_document_glossary(pages, glossary: Glossary, translator: BaseTranslator, to_chinese: bool,
+                           min_count: int = 3, max_terms: int = 40, sample_pages: int = 20):
+    """
+    包装逐页产出 (页码, 段落列表) 的待翻译页面迭代器：先读入前 sample_pages 页提取术语并统一翻译，
+    再依次产出这些页面和其余页面
+    术语只从翻译流程本来就要提取的页面中统计，不为此把文档再读一遍，大文档也只需等前几页提取完就开始翻译
+    """
+    pages = iter(pages)
+    sample = list(itertools.islice(pages, max(1, sample_pages)))
+    build_document_glossary(
+        glossary, translator, ('\n'.join(segments) for _, segments in sample), to_chinese, min_count, max_terms
+    )
+    yield from sample
+    yield from pages
+
+class GlossaryTranslator(TranslatorWrapper):
+    """把当前文本中出现的术语作为参考信息传给下层翻译器"""
+    def __init__(self, inner: BaseTranslator, glossary: Glossary):
+        super().__init__(inner)
+        self.glossary = glossary
+
+    def _with_terms(self, text: str, to_chinese: bool, context: str) -> str:
+        terms = self.glossary.build_context(text, to_chinese)
+        if not terms:
+            return context
+        logging.debug(f"术语表注入约 {estimate_tokens(terms)} token")
+        return '\n\n'.join(part for part in (context, terms) if part)
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        return self.inner.translate(text, to_chinese, self._with_terms(text, to_chinese, context))
+
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        yield from self.inner.translate_stream(text, to_chinese, self._with_terms(text, to_chinese, context))
+
+    async def translate_async(self, text: str, to_chinese: bool, context: str = '') -> str:
+        return await self.inner.translate_async(text, to_chinese, self._with_terms(text, to_chinese, context))
+
+    def translate_batch(self, texts: list, to_chinese: bool, contexts: list = None) -> list:
+        contexts = contexts or [''] * len(texts)
+        return self.inner.translate_batch(
+            texts, to_chinese, [self._with_terms(text, to_chinese, context) for text, context in zip(texts, contexts)]
+        )
@@ -0,0 +1,227 @@
+"""
+边输入边翻译
+
+输入停顿 live_translate_delay_ms 毫秒后，把当前文本按空行拆成段落，与上一次翻译的版本逐段比较：
+未改动的段落沿用已有译文，只有新增或改动的段落作为交互优先级的任务提交给调度器；
+已不存在的段落对应的请求立即取消。译文框按段落原地替换，不重新设置整个文本。
+"""
+import difflib
+import re
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+from PyQt6.QtGui import QTextCursor
+from scheduler import INTERACTIVE, JobCancelled, Scheduler
+from segmenter import SEGMENT_SEPARATOR, join_segments
+
+# 新段落的译文返回之前显示的占位符
+PENDING_MARK = '…'
+
+def split_paragraphs(text: str) -> list:
+    """按空行拆分段落，忽略首尾空白"""
+    return [paragraph.strip() for paragraph in re.split(r'\n\s*\n', text) if paragraph.strip()]
+
+def diff_paragraphs(old: list, new: list) -> list:
+    """返回把 old 变为 new 的操作列表 (tag, i1, i2, j1, j2)，与 difflib.SequenceMatcher.get_opcodes 相同"""
+    return difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes()
+
+def _length(text: str) -> int:
+    # QTextDocument 的位置按 UTF-16 编码单元计算
+    return len(text.encode('utf-16-le')) // 2
+
+def patch_document(document, old: list, new: list) -> None:
+    """
+    document 的内容为 old 段落按 SEGMENT_SEPARATOR 拼接的结果，原地修改为 new 对应的文本
+    只替换有变化的段落，从后往前修改，前面段落的位置不受影响
+    """
+    separator = _length(SEGMENT_SEPARATOR)
+    offsets = []
+    position = 0
+    for item in old:
+        offsets.append(position)
+        position += _length(item) + separator
+
+    def end_of(index):
+        return offsets[index] + _length(old[index])
+
+    cursor = QTextCursor(document)
+    cursor.beginEditBlock()
+    for tag, i1, i2, j1, j2 in reversed(diff_paragraphs(old, new)):
+        if tag == 'equal':
+            continue
+        text = join_segments(new[j1:j2])
+        if i1 < i2 and j1 < j2:
+            start, end = offsets[i1], end_of(i2 - 1)
+        elif i1 < i2:
+            # 删除段落时连同一侧的分隔符一起删除
+            if i2 < len(old):
+                start, end = offsets[i1], offsets[i2]
+            elif i1 > 0:
+                start, end = end_of(i1 - 1), end_of(i2 - 1)
+            else:
+                start, end = 0, end_of(i2 - 1)
+        elif i1 < len(old):
+            start = end = offsets[i1]
+            text += SEGMENT_SEPARATOR
+        elif old:
+            start = end = end_of(len(old) - 1)
+            text = SEGMENT_SEPARATOR + text
+        else:
+            start = end = 0
+        cursor.setPosition(start)
+        cursor.setPosition(end, QTextCursor.MoveMode.KeepAnchor)
+        cursor.insertText(text)
+    cursor.endEditBlock()
+
+class LiveTranslator(QObject):
+    """
+    实时翻译模式的控制器
+    get_translator() 返回 (翻译器, 是否译为中文)，翻译器或方向变化后所有段落重新翻译
+    """
+    status = pyqtSignal(str)
+    # 在调度器线程中发出，转到界面线程处理
+    _finished = pyqtSignal(object, str, str)
+    _failed = pyqtSignal(object, str, str)
+
+    def __init__(self, source_edit, target_edit, scheduler: Scheduler, get_translator, delay_ms: int = 800,
+                 parent=None):
+        super().__init__(parent)
+        self.source_edit = source_edit
+        self.target_edit = target_edit
+        self.scheduler = scheduler
+        self.get_translator = get_translator
+        self.enabled = False
+        self.sources = []
+        self.translations = []
+        self.resolved = []
+        self._translator_key = None
+        # 原文段落 -> 正在进行的任务
+        self._jobs = {}
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay_ms)
+        self.timer.timeout.connect(self.update)
+        source_edit.textChanged.connect(self._on_text_changed)
+        self._finished.connect(self._on_finished)
+        self._failed.connect(self._on_failed)
+
+    def set_enabled(self, enabled: bool) -> None:
+        self.enabled = enabled
+        if enabled:
+            self.reset()
+            self.timer.start(0)
+        else:
+            self.timer.stop()
+            self.cancel()
+
+    def cancel(self) -> None:
+        """取消所有进行中的请求"""
+        for job in self._jobs.values():
+            job.cancel()
+        self._jobs.clear()
+
+    def reset(self) -> None:
+        """丢弃已翻译的版本，下一次更新时所有段落重新翻译"""
+        self.cancel()
+        self.sources, self.translations, self.resolved = [], [], []
+        self._translator_key = None
+
+    def adopt(self, source: str, translation: str) -> None:
+        """译文框被整体设置为 source 的完整译文后调用，作为后续逐段比较的基准；段落数对不上时重新开始"""
+        self.cancel()
+        sources, translations = split_paragraphs(source), split_paragraphs(translation)
+        if len(sources) != len(translations):
+            self.reset()
+            return
+        self.sources, self.translations, self.resolved = sources, translations, [True] * len(sources)
+        self._translator_key = self.get_translator()
+
+    def _on_text_changed(self) -> None:
+        if self.enabled:
+            self.timer.start()
+
+    def update(self) -> None:
+        """比较当前文本与上一次的版本，只为新增或改动的段落提交请求"""
+        if not self.enabled:
+            return
+        translator, to_chinese = self.get_translator()
+        if translator is None:
+            return
+        if self._translator_key != (translator, to_chinese):
+            self.reset()
+            self._translator_key = (translator, to_chinese)
+        paragraphs = split_paragraphs(self.source_edit.toPlainText())
+        translations, resolved = [], []
+        for tag, i1, i2, j1, j2 in diff_paragraphs(self.sources, paragraphs):
+            if tag == 'equal':
+                translations += self.translations[i1:i2]
+                resolved += self.resolved[i1:i2]
+            elif tag == 'replace' and i2 - i1 == j2 - j1:
+                # 逐段改动时先保留旧译文，新译文返回后再替换，避免闪烁
+                translations += self.translations[i1:i2]
+                resolved += [False] * (j2 - j1)
+            elif tag in ('replace', 'insert'):
+                translations += [PENDING_MARK] * (j2 - j1)
+                resolved += [False] * (j2 - j1)
+        wanted = {paragraph for paragraph, done in zip(paragraphs, resolved) if not done}
+        for paragraph in list(self._jobs):
+            if paragraph not in wanted:
+                self._jobs.pop(paragraph).cancel()
+        for paragraph in wanted:
+            if paragraph not in self._jobs:
+                self._submit(translator, paragraph, to_chinese)
+        self._render(translations)
+        self.sources, self.resolved = paragraphs, resolved
+        if self._jobs:
+            self.status.emit(f'实时翻译中：{len(self._jobs)} 段')
+
+    def _submit(self, translator, paragraph: str, to_chinese: bool) -> None:
+        def run(token):
+            parts = []
+            # 流式请求在每个片段之间检查取消，被取代的请求尽早断开
+            for delta in translator.translate_stream(paragraph, to_chinese):
+                token.check()
+                parts.append(delta)
+            return ''.join(parts).strip()
+
+        key = ('live', getattr(translator, 'provider_name', ''), to_chinese, paragraph)
+        job = self.scheduler.submit(run, INTERACTIVE, key=key)
+        self._jobs[paragraph] = job
+        job.add_done_callback(lambda job: self._relay(job, paragraph))
+
+    def _relay(self, job, paragraph: str) -> None:
+        if job.future.cancelled():
+            return
+        error = job.future.exception()
+        if isinstance(error, JobCancelled):
+            return
+        if error is not None:
+            self._failed.emit(job, paragraph, str(error))
+        else:
+            self._finished.emit(job, paragraph, job.future.result())
+
+    def _render(self, translations: list) -> None:
+        """把译文框更新为 translations；译文框被外部改动过时整体重写"""
+        if self.target_edit.toPlainText() == join_segments(self.translations):
+            patch_document(self.target_edit.document(), self.translations, translations)
+        else:
+            self.target_edit.setPlainText(join_segments(translations))
+        self.translations = translations
+
+    def _on_finished(self, job, paragraph: str, translation: str) -> None:
+        if self._jobs.get(paragraph) is not job:
+            return
+        del self._jobs[paragraph]
+        translations = list(self.translations)
+        for index, source in enumerate(self.sources):
+            if source == paragraph and not self.resolved[index]:
+                translations[index] = translation
+                self.resolved[index] = True
+        self._render(translations)
+        if not self._jobs:
+            self.status.emit('实时翻译完成')
+
+    def _on_failed(self, job, paragraph: str, error_msg: str) -> None:
+        if self._jobs.get(paragraph) is not job:
+            return
+        # 该段保持未完成，下一次编辑时重新请求
+        del self._jobs[paragraph]
+        self.status.emit(f'实时翻译出错：{error_msg}')
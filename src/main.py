@@ -1,5 +1,8 @@
 import sys
 import os
+import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, wait
 # 修改代理设置为正确的端口
 os.environ['HTTPS_PROXY'] = 'http://127.0.0.1:7897'  # 改为你的Clash端口
 os.environ['HTTP_PROXY'] = 'http://127.0.0.1:7897'   # 改为你的Clash端口
@@ -10,15 +13,25 @@ os.environ['GRPC_ENABLE_FORK_SUPPORT'] = 'false'
 import logging
 logging.basicConfig(level=logging.INFO)  # 改为INFO级别以便查看更多信息
 
+# PyMuPDF 和各提供商的 SDK 导入较慢，推迟到第一次使用时再导入，保证窗口尽快显示
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QPushButton, QTextEdit, 
                             QVBoxLayout, QHBoxLayout, QWidget, QMessageBox,
-                            QLabel, QStatusBar, QFileDialog, QDialog, QLineEdit)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QPropertyAnimation, QEasingCurve, QPoint, QTimer
-import google.generativeai as genai
+                            QLabel, QFileDialog, QDialog, QLineEdit, QInputDialog,
+                            QTableWidget, QTableWidgetItem, QHeaderView)
+from PyQt6.QtCore import Qt, QObject, QThread, pyqtSignal, QPropertyAnimation, QEasingCurve, QTimer
 from config import Config
-import fitz  # PyMuPDF
-from PyQt6.QtGui import QIcon, QPalette, QColor, QFont
-from translator import GeminiTranslator, ZhipuAITranslator
+from document import PdfDocument
+from exporter import PdfExporter, with_stored_pages
+from glossary import with_document_glossary
+from live import LiveTranslator
+from metrics import registry as metrics_registry
+from PyQt6.QtGui import QPalette, QColor, QFont, QTextCursor
+from factory import create_failover_translator, create_remote_translator, create_translator, get_shared_glossary
+from pipeline import DocumentTranslator, get_concurrency, plan_page_requests, translate_group
+from prefetch import Prefetcher
+from scheduler import INTERACTIVE, PREFETCH, JobCancelled, Scheduler
+from segmenter import SEGMENT_SEPARATOR, join_segments
+from viewer import DocumentViewer, IncrementalTextStats
 
 def resource_path(relative_path):
     """获取资源的绝对路径"""
@@ -66,24 +79,264 @@ class APIKeyDialog(QDialog):
     def get_api_keys(self):
         return self.gemini_key_input.text().strip(), self.zhipu_key_input.text().strip()
 
-class TranslatorThread(QThread):
-    finished = pyqtSignal(str)
-    error = pyqtSignal(str)
+class GlossaryDialog(QDialog):
+    """编辑用户术语，每行一条：英文术语 = 中文译法"""
+    def __init__(self, glossary, parent=None):
+        super().__init__(parent)
+        self.glossary = glossary
+        self.auto_cleared = False
+        self.setWindowTitle('术语表')
+        self.resize(480, 420)
+        
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel('每行一条术语，格式为：英文术语 = 中文译法'))
+        
+        self.terms_input = QTextEdit()
+        self.terms_input.setPlainText('\n'.join(f'{source} = {target}' for source, target in glossary.terms.items()))
+        layout.addWidget(self.terms_input)
+        
+        # 自动提取的术语只显示数量，可一键清空
+        self.auto_label = QLabel()
+        self.update_auto_label()
+        layout.addWidget(self.auto_label)
+        
+        button_layout = QHBoxLayout()
+        clear_auto_button = QPushButton('清空自动术语')
+        ok_button = QPushButton('保存')
+        cancel_button = QPushButton('取消')
+        clear_auto_button.clicked.connect(self.clear_auto_terms)
+        ok_button.clicked.connect(self.accept)
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(clear_auto_button)
+        button_layout.addWidget(ok_button)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+        
+    def update_auto_label(self):
+        count = 0 if self.auto_cleared else len(self.glossary.auto_terms)
+        self.auto_label.setText(f'从文档中自动提取的术语：{count} 条')
+        
+    def clear_auto_terms(self):
+        # 点击保存后才生效
+        self.auto_cleared = True
+        self.update_auto_label()
+        
+    def get_terms(self):
+        terms = {}
+        for line in self.terms_input.toPlainText().splitlines():
+            source, separator, target = line.partition('=')
+            if separator and source.strip() and target.strip():
+                terms[source.strip()] = target.strip()
+        return terms
+
+class StatsDialog(QDialog):
+    """显示每个提供商/模型的调用统计，每秒刷新一次"""
+    COLUMNS = ('提供商', '模型', '调用', '失败', '重试', '输入token', '输出token', '费用($)',
+               '耗时p50', '耗时p95', '首字p50', '排队p95', '网络p95')
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('调用统计')
+        self.resize(900, 260)
+        
+        layout = QVBoxLayout(self)
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        layout.addWidget(self.table)
+        
+        button_layout = QHBoxLayout()
+        json_button = QPushButton('导出JSON')
+        prometheus_button = QPushButton('导出Prometheus')
+        reset_button = QPushButton('清零')
+        close_button = QPushButton('关闭')
+        json_button.clicked.connect(lambda: self.export('JSON 文件 (*.json)', metrics_registry.to_json))
+        prometheus_button.clicked.connect(lambda: self.export('文本文件 (*.prom *.txt)', metrics_registry.to_prometheus))
+        reset_button.clicked.connect(self.reset)
+        close_button.clicked.connect(self.accept)
+        for button in (json_button, prometheus_button, reset_button, close_button):
+            button_layout.addWidget(button)
+        layout.addLayout(button_layout)
+        
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+
+    @staticmethod
+    def format_seconds(value):
+        return '-' if value is None else f'{value:.2f}s'
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        snapshot = metrics_registry.snapshot()
+        self.table.setRowCount(len(snapshot))
+        for row, series in enumerate(snapshot):
+            values = (
+                series['provider'], series['model'], series['calls'], series['errors'], series['retries'],
+                series['input_tokens'], series['output_tokens'], f"{series['cost']:.4f}",
+                self.format_seconds(series['latency_seconds']['p50']),
+                self.format_seconds(series['latency_seconds']['p95']),
+                self.format_seconds(series['time_to_first_output_seconds']['p50']),
+                self.format_seconds(series['queue_wait_seconds']['p95']),
+                self.format_seconds(series['network_seconds']['p95']),
+            )
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(str(value)))
+
+    def reset(self):
+        metrics_registry.reset()
+        self.refresh()
+
+    def export(self, file_filter, render):
+        file_name, _ = QFileDialog.getSaveFileName(self, "导出统计", "", file_filter)
+        if not file_name:
+            return
+        try:
+            with open(file_name, 'w', encoding='utf-8') as f:
+                f.write(render())
+        except OSError as e:
+            QMessageBox.warning(self, "错误", f"无法导出统计：{str(e)}")
+
+def stream_translation(translator, segments, is_english_to_chinese, token, on_partial):
+    """
+    流式翻译当前页：第一段流式输出保证首字延迟，其余段落按打包计划同时在后台翻译，完成后按原顺序输出
+    收到的片段立即交给 on_partial；每个片段之间检查是否已被取消
+    """
+    if not segments:
+        return ''
+    # 流式请求本身占用一个并发名额
+    executor = ThreadPoolExecutor(max_workers=max(1, get_concurrency(translator) - 1))
+    try:
+        logging.info("开始翻译...")
+        start_time = time.perf_counter()
+        rest = segments[1:]
+        pending = {}
+        for group in plan_page_requests(rest):
+            future = executor.submit(translate_group, translator, [rest[index] for index in group], is_english_to_chinese)
+            for position, index in enumerate(group):
+                pending[index] = (future, position)
+
+        parts = []
+        for delta in translator.translate_stream(segments[0], is_english_to_chinese):
+            token.check()
+            if not parts:
+                logging.info(f"首个输出耗时: {time.perf_counter() - start_time:.2f}秒")
+            parts.append(delta)
+            on_partial(delta)
+        results = [''.join(parts).strip()]
+
+        for index in range(len(rest)):
+            future, position = pending[index]
+            # 等待期间定期检查取消
+            while not wait([future], timeout=0.2).done:
+                token.check()
+            token.check()
+            translation = future.result()[position].strip()
+            on_partial(SEGMENT_SEPARATOR)
+            on_partial(translation)
+            results.append(translation)
+        logging.info("翻译完成")
+        return join_segments(results)
+    except JobCancelled:
+        logging.info("翻译已取消")
+        raise
+    except Exception as e:
+        logging.error(f"翻译错误: {str(e)}")
+        raise
+    finally:
+        # 取消或出错时不等待后台请求，排队中的请求直接丢弃
+        executor.shutdown(wait=False, cancel_futures=True)
+
+class JobRelay(QObject):
+    """把调度器线程中的任务输出转发到界面线程，第一个参数为任务的 CancelToken，用于丢弃过期的结果"""
+    partial = pyqtSignal(object, str)
+    finished = pyqtSignal(object, str)
+    error = pyqtSignal(object, str)
+    # 当前页的原文提取完成：(CancelToken, 页码, 段落列表)
+    page_loaded = pyqtSignal(object, int, object)
+    page_failed = pyqtSignal(object, str)
 
-    def __init__(self, text, translator, is_english_to_chinese):
+class ConnectionTestThread(QThread):
+    succeeded = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, translator):
         super().__init__()
-        self.text = text
         self.translator = translator
+
+    def run(self):
+        try:
+            self.translator.check_connection()
+            self.succeeded.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+class DocumentTranslatorThread(QThread):
+    progress = pyqtSignal(int, int)
+    page_done = pyqtSignal(int)
+    finished = pyqtSignal(int)
+    error = pyqtSignal(str)
+
+    def __init__(self, document, translator, is_english_to_chinese, exporter=None, scheduler=None):
+        super().__init__()
+        self.document = document
+        # 请求以最低优先级交给调度器，当前页和预取的翻译不会排在全文翻译之后
+        self.document_translator = DocumentTranslator(translator, scheduler=scheduler)
         self.is_english_to_chinese = is_english_to_chinese
+        self.exporter = exporter
+
+    def cancel(self):
+        self.document_translator.cancel()
+        if self.exporter:
+            self.exporter.abort()
+
+    def on_page_done(self, page_index, segments, translations):
+        # 译文逐页写入磁盘，不在内存中累积整篇文档
+        self.document.results.put_page(page_index, self.is_english_to_chinese, segments, translations)
+        if self.exporter:
+            self.exporter.add_page(page_index, translations)
+        self.page_done.emit(page_index)
+
+    def export_stored_page(self, page_index):
+        self.exporter.add_page(page_index, self.document.results.get_page(page_index, self.is_english_to_chinese))
 
     def run(self):
         try:
-            logging.info("开始翻译...")
-            result = self.translator.translate(self.text, self.is_english_to_chinese)
-            logging.info("翻译完成")
-            self.finished.emit(result)
+            total = self.document.page_count
+            completed = self.document.results.completed_pages(self.is_english_to_chinese)
+            pending = [index for index in range(total) if index not in completed]
+            logging.info(f"开始全文翻译，共 {total} 页，待翻译 {len(pending)} 页，"
+                         f"并发数 {self.document_translator.max_workers}")
+            settings = Config.load_settings()
+            workers = settings['extract_workers'] or None
+            # 在后台线程中逐页提取文本（大文档使用多进程），提取和翻译流水进行
+            pages = self.document.iter_pages(pending, workers)
+            glossary = get_shared_glossary()
+            if glossary is not None and settings['glossary_auto_extract'] and pending:
+                # 从最先提取的若干页中提取术语并统一翻译，之后的页面使用一致的译法
+                pages = with_document_glossary(
+                    pages, glossary, self.document_translator.translator, self.is_english_to_chinese,
+                    settings['glossary_min_count'], settings['glossary_max_auto_terms'],
+                    settings['glossary_sample_pages']
+                )
+            if self.exporter:
+                pages = with_stored_pages(pages, completed, self.export_stored_page)
+            self.document_translator.translate_page_stream(
+                pages,
+                self.is_english_to_chinese,
+                self.on_page_done,
+                on_progress=lambda done, _, __: self.progress.emit(len(completed) + done, total)
+            )
+            if self.exporter:
+                # 导出与翻译同时进行，这里只需等待最后几页写入
+                self.exporter.close()
+            self.finished.emit(total)
         except Exception as e:
-            logging.error(f"翻译错误: {str(e)}")
+            logging.error(f"全文翻译错误: {str(e)}")
+            if self.exporter:
+                self.exporter.abort()
             self.error.emit(str(e))
 
 class TranslatorApp(QMainWindow):
@@ -95,28 +348,67 @@ class TranslatorApp(QMainWindow):
         # 初始化翻译器
         self.gemini_translator = None
         self.zhipu_translator = None
+        self.auto_translator = None
+        self.remote_translator = None
         self.current_translator = None
+        settings = Config.load_settings()
         
         if gemini_key:
-            self.gemini_translator = GeminiTranslator(gemini_key)
+            self.gemini_translator = create_translator('gemini', gemini_key)
             self.current_translator = self.gemini_translator
         
         if zhipu_key:
-            self.zhipu_translator = ZhipuAITranslator(zhipu_key)
+            self.zhipu_translator = create_translator('zhipu', zhipu_key)
             if not self.current_translator:
                 self.current_translator = self.zhipu_translator
         
+        # 配置了本地翻译服务时可以不填写API密钥
+        if settings['remote_url']:
+            self.remote_translator = create_remote_translator(settings['remote_url'], settings['remote_provider'])
+            if not self.current_translator:
+                self.current_translator = self.remote_translator
+        
         if not self.current_translator:
             self.get_api_keys_from_user()
             
         self.is_english_to_chinese = True
         self.pdf_doc = None
         self.current_page = 0
+        self.page_segments = []
+        self.document_thread = None
+        self.stats_dialog = None
+        self.document_viewer = None
+        self.prefetch_pages = settings['prefetch_pages']
+        # 当前页翻译、预取和全文翻译都由调度器执行
+        self.scheduler = Scheduler(
+            settings['scheduler_workers'], settings['scheduler_interactive_workers'],
+            limits={PREFETCH: settings['prefetch_workers']}
+        )
+        self.prefetcher = Prefetcher(self.scheduler)
+        self.translation_job = None
+        self.job_relay = JobRelay()
+        self.job_relay.partial.connect(self.on_job_partial)
+        self.job_relay.finished.connect(self.on_job_finished)
+        self.job_relay.error.connect(self.on_job_error)
+        self.job_relay.page_loaded.connect(self.on_page_loaded)
+        self.job_relay.page_failed.connect(self.on_page_failed)
+        # 正在后台提取的当前页
+        self.page_job = None
+        self.connection_thread = None
         self.initUI()
         self.add_animations()
         
-        # 测试网络连接
-        self.test_connection()
+        # 实时翻译：停止输入后只翻译改动过的段落
+        self.live_translator = LiveTranslator(
+            self.source_text, self.target_text, self.scheduler,
+            lambda: (self.current_translator, self.is_english_to_chinese),
+            settings['live_translate_delay_ms'], self
+        )
+        self.live_translator.status.connect(lambda message: self.statusBar().showMessage(message, 2000))
+        self.live_btn.setChecked(settings['live_translate'])
+        
+        # 窗口显示后在后台测试网络连接
+        QTimer.singleShot(0, self.test_connection)
 
     def get_api_keys_from_user(self):
         # 创建API密钥输入对话框
@@ -125,11 +417,11 @@ class TranslatorApp(QMainWindow):
             gemini_key, zhipu_key = dialog.get_api_keys()
             
             if gemini_key:
-                self.gemini_translator = GeminiTranslator(gemini_key)
+                self.gemini_translator = create_translator('gemini', gemini_key)
                 self.current_translator = self.gemini_translator
             
             if zhipu_key:
-                self.zhipu_translator = ZhipuAITranslator(zhipu_key)
+                self.zhipu_translator = create_translator('zhipu', zhipu_key)
                 if not self.current_translator:
                     self.current_translator = self.zhipu_translator
             
@@ -140,29 +432,32 @@ class TranslatorApp(QMainWindow):
             sys.exit(0)
 
     def test_connection(self):
-        try:
-            genai.configure(api_key=self.gemini_translator.api_key)
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            response = model.generate_content("Hello")
-            logging.info("API连接测试成功")
-        except Exception as e:
-            logging.error(f"API连接测试失败: {str(e)}")
-            reply = QMessageBox.warning(
-                self, 
-                "连接错误", 
-                f"无法连接到Gemini API，可能是密钥无效。\n错误信息：{str(e)}\n\n是否重新输入API密钥？",
-                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-            )
-            if reply == QMessageBox.StandardButton.Yes:
-                new_key = self.get_api_keys_from_user()
-                if new_key:
-                    self.gemini_translator = GeminiTranslator(new_key)
-                    self.current_translator = self.gemini_translator
-                    self.test_connection()
-                else:
-                    sys.exit(0)
-            else:
-                sys.exit(0)
+        """在后台线程测试当前API的连接，结果显示在状态栏"""
+        if self.connection_thread and self.connection_thread.isRunning():
+            return
+        self.statusBar().showMessage('正在测试API连接...')
+        self.connection_thread = ConnectionTestThread(self.current_translator)
+        self.connection_thread.succeeded.connect(self.on_connection_succeeded)
+        self.connection_thread.failed.connect(self.on_connection_failed)
+        self.connection_thread.start()
+
+    def on_connection_succeeded(self):
+        logging.info("API连接测试成功")
+        self.statusBar().showMessage('API连接正常', 3000)
+
+    def on_connection_failed(self, error_msg):
+        logging.error(f"API连接测试失败: {error_msg}")
+        self.statusBar().showMessage(f'API连接失败: {error_msg}')
+        reply = QMessageBox.warning(
+            self, 
+            "连接错误", 
+            f"无法连接到{self.api_label.text()}，可能是密钥无效。\n错误信息：{error_msg}\n\n是否重新输入API密钥？",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self.get_api_keys_from_user()
+            self.update_api_label()
+            self.test_connection()
 
     def initUI(self):
         # 设置窗口样式
@@ -277,6 +572,40 @@ class TranslatorApp(QMainWindow):
         toolbar_layout.addWidget(self.prev_btn)
         toolbar_layout.addWidget(self.next_btn)
         
+        # 添加全文翻译按钮
+        self.translate_doc_btn = QPushButton('翻译全文')
+        self.translate_doc_btn.clicked.connect(lambda: self.translate_document())
+        self.translate_doc_btn.setEnabled(False)
+        toolbar_layout.addWidget(self.translate_doc_btn)
+        
+        # 添加导出PDF按钮
+        self.export_pdf_btn = QPushButton('导出PDF')
+        self.export_pdf_btn.clicked.connect(self.export_pdf)
+        self.export_pdf_btn.setEnabled(False)
+        toolbar_layout.addWidget(self.export_pdf_btn)
+        
+        # 添加全文对照按钮
+        self.viewer_btn = QPushButton('全文对照')
+        self.viewer_btn.clicked.connect(self.show_document_viewer)
+        self.viewer_btn.setEnabled(False)
+        toolbar_layout.addWidget(self.viewer_btn)
+        
+        # 添加实时翻译开关
+        self.live_btn = QPushButton('实时翻译')
+        self.live_btn.setCheckable(True)
+        self.live_btn.toggled.connect(self.toggle_live_translate)
+        toolbar_layout.addWidget(self.live_btn)
+        
+        # 添加术语表按钮
+        self.glossary_btn = QPushButton('术语表')
+        self.glossary_btn.clicked.connect(self.edit_glossary)
+        toolbar_layout.addWidget(self.glossary_btn)
+        
+        # 添加调用统计按钮
+        self.stats_btn = QPushButton('统计')
+        self.stats_btn.clicked.connect(self.show_stats)
+        toolbar_layout.addWidget(self.stats_btn)
+        
         # 添加API切换按钮到工具栏
         self.api_switch_btn = QPushButton('切换API')
         self.api_switch_btn.clicked.connect(self.switch_api)
@@ -302,7 +631,9 @@ class TranslatorApp(QMainWindow):
         left_layout = QVBoxLayout()
         self.source_text = QTextEdit()
         self.update_source_placeholder()
-        self.source_text.textChanged.connect(self.update_word_count)
+        # 只重新统计改动所在的段落，长文本编辑时不必每次对全文分词
+        self.source_stats = IncrementalTextStats(self.source_text.document(), self)
+        self.source_stats.changed.connect(self.update_word_count)
         # 更新提示文本
         self.source_text.setPlaceholderText("在此输入文本...\n按Ctrl+Enter开始翻译")
         left_layout.addWidget(self.source_text)
@@ -358,14 +689,32 @@ class TranslatorApp(QMainWindow):
 
     def clear_text(self):
         """清空所有文本"""
+        self.cancel_translation()
         self.source_text.clear()
         self.target_text.clear()
         self.update_word_count()
+        if self.document_thread and self.document_thread.isRunning():
+            self.document_thread.cancel()
+        self.prefetcher.cancel_all()
         if self.pdf_doc:
-            self.pdf_doc.close()
-            self.pdf_doc = None
-            self.current_page = 0
+            self.close_pdf()
             self.update_pdf_buttons()
+        self.page_segments = []
+
+    def close_pdf(self):
+        """关闭当前文档并删除其临时译文文件"""
+        if self.document_thread and self.document_thread.isRunning():
+            self.document_thread.cancel()
+        self.prefetcher.cancel_all()
+        self.cancel_page_load()
+        if self.document_viewer:
+            self.document_viewer.shutdown()
+            self.document_viewer.close()
+            self.document_viewer.deleteLater()
+            self.document_viewer = None
+        self.pdf_doc.close()
+        self.pdf_doc = None
+        self.current_page = 0
         
     def copy_translation(self):
         """复制翻译结果到剪贴板"""
@@ -377,10 +726,7 @@ class TranslatorApp(QMainWindow):
             
     def update_word_count(self):
         """更新字数统计"""
-        text = self.source_text.toPlainText()
-        word_count = len(text.split())
-        char_count = len(text)
-        self.word_count_label.setText(f'单词数: {word_count} | 字符数: {char_count}')
+        self.word_count_label.setText(f'单词数: {self.source_stats.words} | 字符数: {self.source_stats.chars}')
         
     def update_source_placeholder(self):
         """更新源文本框的占位符"""
@@ -407,6 +753,7 @@ class TranslatorApp(QMainWindow):
         self.fade_out_animation.setEndValue(0.0)
         
         # 执行语言切换
+        self.cancel_translation()
         self.is_english_to_chinese = not self.is_english_to_chinese
         source = self.source_text.toPlainText()
         target = self.target_text.toPlainText()
@@ -432,18 +779,118 @@ class TranslatorApp(QMainWindow):
         source = self.source_text.toPlainText().strip()
         if not source:
             return
+        # 新的请求总是取代尚未完成的旧请求，旧请求的结果不再显示
+        self.cancel_translation()
+        self.live_translator.cancel()
             
         self.translate_btn.setEnabled(False)
         self.translate_btn.setText("翻译中...")
         
-        # 使用当前选择的翻译器
-        self.thread = TranslatorThread(source, self.current_translator, self.is_english_to_chinese)
-        self.thread.finished.connect(self.on_translation_finished)
-        self.thread.error.connect(self.on_translation_error)
-        self.thread.start()
+        # PDF页面未被修改时按段落翻译，只有新段落需要请求API
+        if self.pdf_doc and self.page_segments and source == join_segments(self.page_segments):
+            segments = self.page_segments
+            # 全文翻译或后台预取已有结果时直接使用
+            prefetched = self.pdf_doc.results.get_page(self.current_page, self.is_english_to_chinese, segments)
+            if prefetched is None:
+                prefetched = self.prefetcher.get(
+                    self.current_translator, self.pdf_doc, self.current_page, self.is_english_to_chinese, segments
+                )
+            if prefetched is not None:
+                logging.info("使用已有的译文")
+                self.on_translation_finished(join_segments(prefetched))
+                return
+            # 该页正在预取时提升为交互优先级并等待其结果，不重复请求
+            job = self.prefetcher.promote(
+                self.current_translator, self.pdf_doc, self.current_page, self.is_english_to_chinese
+            )
+            if job is not None:
+                logging.info("等待正在进行的预取")
+
+                def render(result):
+                    translations = Prefetcher.translations(result, segments)
+                    if translations is None:
+                        # 下一次翻译时不再使用该预取结果
+                        raise RuntimeError("预取时的原文与当前页不一致，请重新翻译")
+                    return join_segments(translations)
+
+                self.watch_job(job, render)
+                return
+        else:
+            segments = [source]
+        
+        # 使用当前选择的翻译器，以交互优先级流式翻译
+        translator, to_chinese = self.current_translator, self.is_english_to_chinese
+        relay = self.job_relay
+        job = self.scheduler.submit(
+            lambda token: stream_translation(
+                translator, segments, to_chinese, token, lambda delta: relay.partial.emit(token, delta)
+            ),
+            INTERACTIVE
+        )
+        self.target_text.clear()
+        self.watch_job(job)
+
+    def watch_job(self, job, render=None):
+        """把任务设为当前翻译，完成后把结果（经 render 转换）转发到界面线程"""
+        self.translation_job = job
+        relay = self.job_relay
+
+        def done(job):
+            if job.future.cancelled():
+                return
+            error = job.future.exception()
+            if isinstance(error, JobCancelled):
+                return
+            if error is not None:
+                relay.error.emit(job.token, str(error))
+                return
+            result = job.future.result()
+            try:
+                result = render(result) if render else result
+            except Exception as e:
+                relay.error.emit(job.token, str(e))
+                return
+            relay.finished.emit(job.token, result)
+
+        job.add_done_callback(done)
+
+    def is_current_job(self, token):
+        return self.translation_job is not None and self.translation_job.token is token
+
+    def cancel_translation(self):
+        """取消当前页尚未完成的翻译，界面恢复可翻译状态"""
+        if self.translation_job is None:
+            return
+        job, self.translation_job = self.translation_job, None
+        # 被提升的预取任务继续执行，结果留给预取缓存
+        if job.key is None:
+            job.cancel()
+        self.translate_btn.setEnabled(True)
+        self.translate_btn.setText("翻译 →")
+
+    def on_job_partial(self, token, delta):
+        if self.is_current_job(token):
+            self.on_translation_partial(delta)
+
+    def on_job_finished(self, token, result):
+        if self.is_current_job(token):
+            self.translation_job = None
+            self.on_translation_finished(result)
+
+    def on_job_error(self, token, error_msg):
+        if self.is_current_job(token):
+            self.translation_job = None
+            self.on_translation_error(error_msg)
+
+    def on_translation_partial(self, delta):
+        """把流式返回的片段追加到译文框末尾"""
+        cursor = self.target_text.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(delta)
 
     def on_translation_finished(self, result):
         self.target_text.setText(result)
+        self.live_translator.adopt(self.source_text.toPlainText(), result)
         self.translate_btn.setEnabled(True)
         self.translate_btn.setText("翻译 →")
         self.statusBar().showMessage('翻译完成', 2000)
@@ -454,6 +901,84 @@ class TranslatorApp(QMainWindow):
         self.translate_btn.setText("翻译 →")
         self.statusBar().showMessage('翻译失败', 2000)
 
+    def translate_document(self, exporter=None):
+        """并发翻译整篇PDF文档，给出 exporter 时同时导出翻译后的PDF"""
+        if not self.pdf_doc:
+            return
+        if self.document_thread and self.document_thread.isRunning():
+            return
+            
+        self.translate_doc_btn.setEnabled(False)
+        self.export_pdf_btn.setEnabled(False)
+        if exporter:
+            self.export_pdf_btn.setText("导出中...")
+        else:
+            self.translate_doc_btn.setText("全文翻译中...")
+        
+        self.document_thread = DocumentTranslatorThread(
+            self.pdf_doc, self.current_translator, self.is_english_to_chinese, exporter, self.scheduler
+        )
+        self.document_thread.progress.connect(self.on_document_progress)
+        self.document_thread.page_done.connect(self.on_document_page_done)
+        self.document_thread.finished.connect(self.on_document_finished)
+        self.document_thread.error.connect(self.on_document_error)
+        self.document_thread.start()
+
+    def export_pdf(self):
+        """翻译整篇文档并导出为新的PDF，已翻译的页面直接使用已有译文"""
+        if not self.pdf_doc:
+            return
+        if self.document_thread and self.document_thread.isRunning():
+            return
+        default_name = os.path.splitext(self.pdf_doc.path)[0] + '_translated.pdf'
+        file_name, _ = QFileDialog.getSaveFileName(self, "导出PDF", default_name, "PDF Files (*.pdf)")
+        if not file_name:
+            return
+        layouts = {'译文覆盖原文': 'overlay', '双语对照': 'side_by_side'}
+        layout, ok = QInputDialog.getItem(self, "导出PDF", "选择版式：", list(layouts), 0, False)
+        if not ok:
+            return
+        try:
+            exporter = PdfExporter(self.pdf_doc.path, file_name, layouts[layout])
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"无法导出PDF：{str(e)}")
+            return
+        self.translate_document(exporter)
+
+    def reset_document_buttons(self):
+        self.translate_doc_btn.setText("翻译全文")
+        self.export_pdf_btn.setText("导出PDF")
+        self.update_pdf_buttons()
+
+    def on_document_progress(self, done, total):
+        self.statusBar().showMessage(f'全文翻译进度: {done}/{total} 页')
+
+    def on_document_page_done(self, page_index):
+        """当前显示的页面翻译完成时立即显示译文"""
+        if self.pdf_doc and page_index == self.current_page:
+            self.show_stored_translation()
+        if self.document_viewer:
+            self.document_viewer.update_page(page_index)
+
+    def on_document_finished(self, page_count):
+        self.reset_document_buttons()
+        if not self.pdf_doc:
+            return
+        self.show_stored_translation()
+        exporter = self.document_thread.exporter
+        if exporter:
+            self.statusBar().showMessage(f'已导出PDF: {exporter.output_path}', 5000)
+        else:
+            self.statusBar().showMessage(f'全文翻译完成，共 {page_count} 页，翻页即可查看译文', 3000)
+
+    def on_document_error(self, error_msg):
+        self.reset_document_buttons()
+        if not self.pdf_doc:
+            # 文档已关闭，忽略取消导致的错误
+            return
+        self.target_text.setText(f"全文翻译出错：{error_msg}")
+        self.statusBar().showMessage('全文翻译失败', 2000)
+
     def upload_pdf(self):
         """上传并处理PDF文件"""
         file_name, _ = QFileDialog.getOpenFileName(
@@ -465,8 +990,10 @@ class TranslatorApp(QMainWindow):
         
         if file_name:
             try:
-                # 打开PDF文件
-                self.pdf_doc = fitz.open(file_name)
+                if self.pdf_doc:
+                    self.close_pdf()
+                # 打开PDF文件，页面按需提取，内存中只保留当前页附近的几页
+                self.pdf_doc = PdfDocument(file_name, window=self.prefetch_pages + 3)
                 self.current_page = 0
                 
                 # 更新UI状态
@@ -485,27 +1012,106 @@ class TranslatorApp(QMainWindow):
                 self.update_pdf_buttons()
 
     def load_pdf_page(self):
-        """加载当前页面的内容"""
+        """加载当前页面的内容；页面不在内存窗口中时在调度器线程中提取，完成后再显示"""
         if not self.pdf_doc:
             return
-            
-        try:
-            page = self.pdf_doc[self.current_page]
-            text = page.get_text()
-            self.source_text.setText(text)
-            self.page_label.setText(f'PDF页码: {self.current_page + 1}/{self.pdf_doc.page_count}')
-            self.update_pdf_buttons()
-        except Exception as e:
-            QMessageBox.warning(self, "错误", f"无法读取PDF页面：{str(e)}")
+
+        # 翻页后旧页面的翻译结果不再显示
+        self.cancel_translation()
+        self.cancel_page_load()
+        self.page_label.setText(f'PDF页码: {self.current_page + 1}/{self.pdf_doc.page_count}')
+        self.update_pdf_buttons()
+        segments = self.pdf_doc.cached_segments(self.current_page)
+        if segments is not None:
+            self.show_pdf_page(segments)
+        else:
+            self.page_segments = []
+            self.source_text.clear()
+            self.statusBar().showMessage(f'正在读取第 {self.current_page + 1} 页...')
+            self.page_job = self.submit_page_load(self.pdf_doc, self.current_page)
+        self.schedule_prefetch()
+
+    def submit_page_load(self, document, page_index):
+        """以交互优先级提取一页原文，结果转发到界面线程"""
+        relay = self.job_relay
+        job = self.scheduler.submit(lambda token: document.segments(page_index), INTERACTIVE)
+
+        def done(job):
+            if job.future.cancelled():
+                return
+            error = job.future.exception()
+            if error is not None:
+                relay.page_failed.emit(job.token, str(error))
+                return
+            relay.page_loaded.emit(job.token, page_index, job.future.result())
+
+        job.add_done_callback(done)
+        return job
+
+    def cancel_page_load(self):
+        if self.page_job is not None:
+            self.page_job.cancel()
+            self.page_job = None
+
+    def on_page_loaded(self, token, page_index, segments):
+        if self.page_job is None or self.page_job.token is not token:
+            return
+        self.page_job = None
+        if self.pdf_doc and page_index == self.current_page:
+            self.statusBar().clearMessage()
+            self.show_pdf_page(segments)
+
+    def on_page_failed(self, token, error_msg):
+        if self.page_job is None or self.page_job.token is not token:
+            return
+        self.page_job = None
+        self.statusBar().clearMessage()
+        QMessageBox.warning(self, "错误", f"无法读取PDF页面：{error_msg}")
+
+    def show_pdf_page(self, segments):
+        """显示当前页的原文，已有全文翻译的结果时一并显示"""
+        self.page_segments = segments
+        self.source_text.setText(join_segments(segments))
+        self.show_stored_translation()
+
+    def show_stored_translation(self):
+        """当前页已有全文翻译的结果时直接显示"""
+        translations = self.pdf_doc.results.get_page(
+            self.current_page, self.is_english_to_chinese, self.page_segments
+        )
+        if translations is None:
+            return False
+        self.target_text.setText(join_segments(translations))
+        self.live_translator.adopt(join_segments(self.page_segments), join_segments(translations))
+        self.update_word_count()
+        return True
+
+    def schedule_prefetch(self):
+        """在后台预取当前页之后的若干页译文"""
+        if not self.pdf_doc or self.prefetch_pages <= 0:
+            return
+        last_page = min(self.current_page + self.prefetch_pages, self.pdf_doc.page_count - 1)
+        # 原文在预取任务中提取，不在界面线程中解析后面的页面
+        self.prefetcher.schedule(
+            self.current_translator, self.pdf_doc, range(self.current_page + 1, last_page + 1),
+            self.is_english_to_chinese, current_page=self.current_page
+        )
 
     def update_pdf_buttons(self):
         """更新PDF导航按钮状态"""
         if not self.pdf_doc:
             self.prev_btn.setEnabled(False)
             self.next_btn.setEnabled(False)
+            self.translate_doc_btn.setEnabled(False)
+            self.export_pdf_btn.setEnabled(False)
+            self.viewer_btn.setEnabled(False)
             self.page_label.setText('PDF页码: -')
             return
             
+        document_busy = self.document_thread is not None and self.document_thread.isRunning()
+        self.translate_doc_btn.setEnabled(not document_busy)
+        self.export_pdf_btn.setEnabled(not document_busy)
+        self.viewer_btn.setEnabled(True)
         self.prev_btn.setEnabled(self.current_page > 0)
         self.next_btn.setEnabled(self.current_page < self.pdf_doc.page_count - 1)
 
@@ -536,20 +1142,95 @@ class TranslatorApp(QMainWindow):
         self.show_animation.setEasingCurve(QEasingCurve.Type.OutCubic)
         self.show_animation.start()
 
+    def edit_glossary(self):
+        """打开术语表编辑对话框"""
+        glossary = get_shared_glossary()
+        if glossary is None:
+            QMessageBox.information(self, "术语表", "术语表未启用，可在设置中将 glossary_enabled 设为 true")
+            return
+        dialog = GlossaryDialog(glossary, self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            if dialog.auto_cleared:
+                glossary.clear_auto_terms()
+            glossary.set_terms(dialog.get_terms())
+            try:
+                glossary.save()
+                self.statusBar().showMessage(f'术语表已保存，共 {len(glossary)} 条', 2000)
+            except OSError as e:
+                QMessageBox.warning(self, "错误", f"无法保存术语表：{str(e)}")
+
+    def show_stats(self):
+        """打开调用统计窗口，不阻塞翻译"""
+        if self.stats_dialog is None:
+            self.stats_dialog = StatsDialog(self)
+        self.stats_dialog.show()
+        self.stats_dialog.refresh()
+        self.stats_dialog.raise_()
+
+    def toggle_live_translate(self, checked):
+        """开启后停止输入片刻即自动翻译改动过的段落"""
+        self.live_translator.set_enabled(checked)
+        self.statusBar().showMessage('已开启实时翻译' if checked else '已关闭实时翻译', 2000)
+
+    def show_document_viewer(self):
+        """打开全文对照窗口，按当前翻译方向显示已完成的页面"""
+        if not self.pdf_doc:
+            return
+        viewer = self.document_viewer
+        if viewer is None or viewer.model.to_chinese != self.is_english_to_chinese:
+            if viewer:
+                viewer.shutdown()
+                viewer.deleteLater()
+            viewer = DocumentViewer(self.pdf_doc, self.is_english_to_chinese, self)
+            viewer.page_activated.connect(self.go_to_page)
+            self.document_viewer = viewer
+        viewer.show()
+        viewer.scroll_to_page(self.current_page)
+        viewer.raise_()
+
+    def go_to_page(self, page_index):
+        """在主窗口中显示指定页面"""
+        if self.pdf_doc and 0 <= page_index < self.pdf_doc.page_count and page_index != self.current_page:
+            self.current_page = page_index
+            self.load_pdf_page()
+
     def update_api_label(self):
         """更新API显示标签"""
-        api_name = "Gemini" if isinstance(self.current_translator, GeminiTranslator) else "智谱AI"
+        api_names = {'gemini': "Gemini", 'zhipu': "智谱AI", 'auto': "自动(Gemini优先)", 'remote': "远程服务"}
+        api_name = api_names.get(self.current_translator.provider_name, self.current_translator.provider_name)
         self.api_label.setText(f'当前API: {api_name}')
 
+    def get_auto_translator(self):
+        """两个API都可用时返回自动模式翻译器：Gemini 优先，慢或失败时转向智谱AI"""
+        if not (self.gemini_translator and self.zhipu_translator):
+            return None
+        backends = [self.gemini_translator, self.zhipu_translator]
+        if self.auto_translator is None or [b.translator for b in self.auto_translator.backends] != backends:
+            self.auto_translator = create_failover_translator(backends)
+        return self.auto_translator
+
     def switch_api(self):
-        """切换翻译API"""
-        if isinstance(self.current_translator, GeminiTranslator) and self.zhipu_translator:
-            self.current_translator = self.zhipu_translator
-        elif isinstance(self.current_translator, ZhipuAITranslator) and self.gemini_translator:
-            self.current_translator = self.gemini_translator
+        """在 Gemini、智谱AI、自动模式和远程服务之间切换翻译API"""
+        options = [
+            t for t in (self.gemini_translator, self.zhipu_translator, self.get_auto_translator(), self.remote_translator)
+            if t
+        ]
+        if self.current_translator in options:
+            index = options.index(self.current_translator)
+            self.current_translator = options[(index + 1) % len(options)]
+        else:
+            self.current_translator = options[0]
         self.update_api_label()
+        self.schedule_prefetch()
         self.statusBar().showMessage(f'已切换到{self.api_label.text()}', 2000)
 
+    def closeEvent(self, event):
+        """关闭窗口时停止后台任务"""
+        if self.pdf_doc:
+            self.close_pdf()
+        self.scheduler.shutdown()
+        super().closeEvent(event)
+
     def keyPressEvent(self, event):
         """处理键盘事件"""
         # 检查是否按下 Ctrl+Enter 且翻译按钮可用
@@ -563,6 +1244,8 @@ class TranslatorApp(QMainWindow):
             super().keyPressEvent(event)
 
 def main():
+    # 打包后的程序以 spawn 方式启动文本提取进程时需要
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     translator = TranslatorApp()
     translator.show()
@@ -0,0 +1,310 @@
+"""
+翻译记忆：记录翻译过的段落，在新文本与旧段落完全相同或非常相似时复用
+
+同一篇论文的不同版本（如 arXiv v1/v2）每段只改动几个词，完全相同的段落直接返回之前的译文，
+相似的段落把旧原文和旧译文作为参考交给模型，使改动处以外的译法保持一致。
+段落中出现的术语条目的摘要是完全匹配键的一部分，术语译法修改后相关段落不再复用旧译文。
+
+近似查找使用 MinHash + LSH：每段计算一次 64 维签名（单次哈希分桶的 MinHash），
+按 16 个分段写入 SQLite 索引，查询时只比较至少一个分段相同的候选段落，几十万段时仍可在毫秒内完成。
+"""
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import zlib
+from array import array
+from typing import Iterator
+from cache import normalize_text
+from chunker import estimate_tokens
+from glossary import Glossary
+from translator import BaseTranslator, TranslatorWrapper
+
+MEMORY_REFERENCE_PROMPT = """A very similar passage was translated before. Reuse its wording wherever the text is unchanged and only adjust the parts that differ.
+Previous source:
+{source}
+Previous translation:
+{translation}"""
+
+# 签名维数和 LSH 分段数：16 段 × 4 行，相似度约 0.5 以上的段落有较大概率成为候选
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+_MASK32 = 0xFFFFFFFF
+_EMPTY = _MASK32
+
+# 太短的文本（标题、编号等）相似度没有意义，只做完全匹配
+MIN_FUZZY_CHARS = 40
+
+# 签名完全相同的相似段落也可能有改动，相似度上限低于 1.0，完全命中只由原文的哈希键决定
+MAX_FUZZY_SIMILARITY = 0.999
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+|[^\sa-z0-9]')
+
+def shingles(text: str) -> set:
+    """按词（中文按字）切分后取连续 3 个的组合"""
+    tokens = _TOKEN_PATTERN.findall(text.lower())
+    if len(tokens) < 3:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + 3]) for i in range(len(tokens) - 2)}
+
+def minhash_signature(text: str) -> array:
+    """
+    单次哈希的 MinHash：每个片段只计算一次 crc32，按低位分到 64 个桶中各取最小值，
+    空桶借用后面最近的非空桶（加上偏移区分），计算量与片段数成正比
+    """
+    signature = array('I', [_EMPTY] * NUM_HASHES)
+    for shingle in shingles(text):
+        value = zlib.crc32(shingle.encode('utf-8'))
+        # 打散低位后分桶
+        value = (value * 0x9E3779B1) & _MASK32
+        bucket = value % NUM_HASHES
+        if value < signature[bucket]:
+            signature[bucket] = value
+    if all(value == _EMPTY for value in signature):
+        return signature
+    for bucket in range(NUM_HASHES):
+        if signature[bucket] != _EMPTY:
+            continue
+        offset = 1
+        while signature[(bucket + offset) % NUM_HASHES] == _EMPTY:
+            offset += 1
+        # 用借用距离扰动取值，避免不同文本借用相同桶时产生虚假的一致
+        borrowed = signature[(bucket + offset) % NUM_HASHES]
+        signature[bucket] = (borrowed + offset * 0x85EBCA6B) & _MASK32 | 0x1
+    return signature
+
+def band_keys(signature: array) -> list:
+    """把签名分成 BANDS 段，每段计算一个 63 位整数作为 LSH 索引键"""
+    keys = []
+    for band in range(BANDS):
+        key = band + 1
+        for value in signature[band * ROWS:(band + 1) * ROWS]:
+            key = ((key * 0x100000001B3) ^ value) & 0x7FFFFFFFFFFFFFFF
+        keys.append(key)
+    return keys
+
+def signature_similarity(first: array, second: array) -> float:
+    """签名中相同位置取值相同的比例，即 Jaccard 相似度的估计"""
+    return sum(1 for a, b in zip(first, second) if a == b) / NUM_HASHES
+
+class TranslationMemory:
+    """基于 SQLite 的翻译记忆库，与提供商无关，只区分翻译方向"""
+    def __init__(self, path: str, threshold: float = 0.7, max_candidates: int = 50):
+        self.path = path
+        self.threshold = threshold
+        self.max_candidates = max_candidates
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS segments ('
+            'id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, direction TEXT NOT NULL, '
+            'source TEXT NOT NULL, translation TEXT NOT NULL, signature BLOB)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS lsh (band_key INTEGER NOT NULL, segment_id INTEGER NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_lsh_band ON lsh(band_key)')
+        self._conn.commit()
+
+    @staticmethod
+    def _direction(to_chinese: bool) -> str:
+        return 'en2zh' if to_chinese else 'zh2en'
+
+    @staticmethod
+    def _exact_key(direction: str, normalized: str, glossary: str = '') -> str:
+        # 没有术语时与旧版本的键相同，已有的记录继续有效
+        key = f'{direction}\n{normalized}\n{glossary}' if glossary else f'{direction}\n{normalized}'
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def lookup(self, text: str, to_chinese: bool, glossary: str = ''):
+        """
+        返回 (相似度, 旧原文, 旧译文, 是否完全命中)；没有足够相似的记录时返回 None
+        只有规范化后的原文和术语指纹都相同时才是完全命中，相似度为 1.0，相似段落的相似度总是小于 1.0
+        glossary 为段落中出现的术语的指纹，原文相同但术语译法已修改的记录不算完全命中，也不作为参考
+        """
+        direction = self._direction(to_chinese)
+        normalized = normalize_text(text)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT source, translation FROM segments WHERE key = ?',
+                (self._exact_key(direction, normalized, glossary),)
+            ).fetchone()
+        if row is not None:
+            return 1.0, row[0], row[1], True
+        if len(normalized) < MIN_FUZZY_CHARS:
+            return None
+
+        signature = minhash_signature(normalized)
+        keys = band_keys(signature)
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT s.source, s.translation, s.signature FROM segments s WHERE s.id IN ('
+                f'SELECT DISTINCT l.segment_id FROM lsh l JOIN segments c ON c.id = l.segment_id '
+                f'WHERE l.band_key IN ({",".join("?" * len(keys))}) AND c.direction = ? AND c.source != ? LIMIT ?)',
+                # 候选名额只给同一方向的其他段落；原文相同的是同一段落在旧术语下的译文，不作为参考
+                (*keys, direction, normalized, self.max_candidates)
+            ).fetchall()
+        best = None
+        for source, translation, blob in rows:
+            candidate = array('I')
+            candidate.frombytes(blob)
+            similarity = min(signature_similarity(signature, candidate), MAX_FUZZY_SIMILARITY)
+            if similarity >= self.threshold and (best is None or similarity > best[0]):
+                best = (similarity, source, translation, False)
+        return best
+
+    def _insert(self, text: str, to_chinese: bool, translation: str, glossary: str = '') -> None:
+        if not translation or not translation.strip():
+            return
+        direction = self._direction(to_chinese)
+        normalized = normalize_text(text)
+        signature = minhash_signature(normalized) if len(normalized) >= MIN_FUZZY_CHARS else None
+        cursor = self._conn.execute(
+            'INSERT OR IGNORE INTO segments (key, direction, source, translation, signature) VALUES (?, ?, ?, ?, ?)',
+            (self._exact_key(direction, normalized, glossary), direction, normalized, translation,
+             signature.tobytes() if signature is not None else None)
+        )
+        if cursor.rowcount and signature is not None:
+            self._conn.executemany(
+                'INSERT INTO lsh (band_key, segment_id) VALUES (?, ?)',
+                [(key, cursor.lastrowid) for key in band_keys(signature)]
+            )
+
+    def add(self, text: str, to_chinese: bool, translation: str, glossary: str = '') -> None:
+        with self._lock:
+            self._insert(text, to_chinese, translation, glossary)
+            self._conn.commit()
+
+    def add_many(self, items) -> None:
+        """批量写入 (原文, 是否译为中文, 译文[, 术语指纹])，只提交一次，用于导入已有译文"""
+        with self._lock:
+            for item in items:
+                self._insert(*item)
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM segments').fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+class MemoryStats:
+    """翻译记忆的命中统计"""
+    def __init__(self):
+        self.lookups = 0
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, similarity, text: str = '', translation: str = '', exact: bool = False) -> None:
+        with self._lock:
+            self.lookups += 1
+            if similarity is None:
+                return
+            if exact:
+                self.exact_hits += 1
+                # 完全命中省去了整个请求：输入加输出
+                self.tokens_saved += estimate_tokens(text) + estimate_tokens(translation)
+            else:
+                self.fuzzy_hits += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            lookups = self.lookups
+            return {
+                'lookups': lookups,
+                'exact_hits': self.exact_hits,
+                'fuzzy_hits': self.fuzzy_hits,
+                'match_rate': (self.exact_hits + self.fuzzy_hits) / lookups if lookups else 0.0,
+                'tokens_saved': self.tokens_saved,
+            }
+
+class MemoryTranslator(TranslatorWrapper):
+    """
+    在翻译前查询翻译记忆：完全相同直接返回旧译文，相似时把旧译文作为参考传给模型
+    术语表在下层，记忆按段落中出现的术语条目区分，修改术语后相关段落重新翻译
+    """
+    def __init__(self, inner: BaseTranslator, memory: TranslationMemory, stats: MemoryStats = None,
+                 glossary: Glossary = None):
+        super().__init__(inner)
+        self.memory = memory
+        self.stats = stats or MemoryStats()
+        self.glossary = glossary
+
+    def _fingerprint(self, text: str, to_chinese: bool) -> str:
+        return self.glossary.fingerprint(text, to_chinese) if self.glossary is not None else ''
+
+    def _prepare(self, text: str, to_chinese: bool, context: str, fingerprint: str):
+        """返回 (完全命中的译文或 None, 传给下层的参考信息)"""
+        match = self.memory.lookup(text, to_chinese, fingerprint)
+        if match is None:
+            self.stats.record(None)
+            return None, context
+        similarity, source, translation, exact = match
+        self.stats.record(similarity, text, translation, exact)
+        if exact:
+            logging.info("翻译记忆完全命中")
+            return translation, context
+        logging.info(f"翻译记忆找到相似段落，相似度 {similarity:.2f}")
+        reference = MEMORY_REFERENCE_PROMPT.format(source=source, translation=translation)
+        return None, '\n\n'.join(part for part in (context, reference) if part)
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        fingerprint = self._fingerprint(text, to_chinese)
+        reused, context = self._prepare(text, to_chinese, context, fingerprint)
+        if reused is not None:
+            return reused
+        result = self.inner.translate(text, to_chinese, context)
+        self.memory.add(text, to_chinese, result, fingerprint)
+        return result
+
+    async def translate_async(self, text: str, to_chinese: bool, context: str = '') -> str:
+        fingerprint = self._fingerprint(text, to_chinese)
+        reused, context = self._prepare(text, to_chinese, context, fingerprint)
+        if reused is not None:
+            return reused
+        result = await self.inner.translate_async(text, to_chinese, context)
+        self.memory.add(text, to_chinese, result, fingerprint)
+        return result
+
+    def translate_batch(self, texts: list, to_chinese: bool, contexts: list = None) -> list:
+        contexts = contexts or [''] * len(texts)
+        results = [None] * len(texts)
+        fingerprints = [self._fingerprint(text, to_chinese) for text in texts]
+        batch, batch_contexts = [], []
+        for index, (text, context) in enumerate(zip(texts, contexts)):
+            reused, prepared = self._prepare(text, to_chinese, context, fingerprints[index])
+            if reused is not None:
+                results[index] = reused
+            elif prepared != context:
+                # 相似段落带有各自的参考译文，单独翻译
+                results[index] = self.inner.translate(text, to_chinese, prepared)
+            else:
+                batch.append(index)
+                batch_contexts.append(context)
+        if batch:
+            translations = self.inner.translate_batch([texts[index] for index in batch], to_chinese, batch_contexts)
+            for index, translation in zip(batch, translations):
+                results[index] = translation
+        self.memory.add_many(
+            (text, to_chinese, result, fingerprint) for text, result, fingerprint in zip(texts, results, fingerprints)
+        )
+        return results
+
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        fingerprint = self._fingerprint(text, to_chinese)
+        reused, context = self._prepare(text, to_chinese, context, fingerprint)
+        if reused is not None:
+            yield reused
+            return
+        parts = []
+        for delta in self.inner.translate_stream(text, to_chinese, context):
+            parts.append(delta)
+            yield delta
+        self.memory.add(text, to_chinese, ''.join(parts), fingerprint)
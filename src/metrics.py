@@ -0,0 +1,320 @@
+"""
+翻译调用的统计：每次请求的 token 用量、排队等待、网络耗时、首个输出耗时和重试次数
+
+InstrumentedTranslator 包在限流层之外，每次调用创建一个 CallInfo 放入 contextvars，
+限流层和各提供商在同一调用中向其中补充排队时间、重试次数和接口返回的 usage；
+调用结束后汇总到全局的 MetricsRegistry，可导出为 JSON 或 Prometheus 文本格式。
+"""
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from typing import Iterator
+from chunker import estimate_tokens
+from translator import BaseTranslator, TranslatorWrapper
+
+# 耗时直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0, float('inf'))
+
+class CallInfo:
+    """一次翻译调用的记录"""
+    __slots__ = ('provider', 'model', 'started', 'first_output', 'finished', 'queue_wait', 'backoff',
+                 'retries', 'input_tokens', 'output_tokens', 'usage_reported', 'error', 'cancelled')
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.started = time.perf_counter()
+        self.first_output = None
+        self.finished = None
+        self.queue_wait = 0.0
+        self.backoff = 0.0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.usage_reported = False
+        self.error = False
+        # 调用方提前关闭流式输出或取消异步任务
+        self.cancelled = False
+
+    @property
+    def latency(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def network_time(self) -> float:
+        """总耗时减去限流排队和重试退避的等待"""
+        return max(0.0, self.latency - self.queue_wait - self.backoff)
+
+    @property
+    def time_to_first_output(self):
+        if self.first_output is None:
+            return None
+        return self.first_output - self.started
+
+_current_call = contextvars.ContextVar('translation_call', default=None)
+
+def current_call():
+    """返回当前正在进行的翻译调用记录，不在统计范围内时返回 None"""
+    return _current_call.get()
+
+def record_usage(input_tokens: int, output_tokens: int) -> None:
+    """提供商在解析响应时调用，记录接口返回的实际 token 数"""
+    call = _current_call.get()
+    if call is not None:
+        call.input_tokens += input_tokens or 0
+        call.output_tokens += output_tokens or 0
+        call.usage_reported = True
+
+def record_queue_wait(seconds: float) -> None:
+    call = _current_call.get()
+    if call is not None:
+        call.queue_wait += seconds
+
+def record_retry(backoff: float) -> None:
+    call = _current_call.get()
+    if call is not None:
+        call.retries += 1
+        call.backoff += backoff
+
+class Histogram:
+    """固定桶的直方图，与 Prometheus 的 histogram 类型对应"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def quantile(self, q: float):
+        """按桶内线性插值估算分位数，结果限制在实际观测到的最小值和最大值之间；没有数据时返回 None"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and cumulative + count >= target:
+                upper = min(bound, self.max)
+                estimate = lower + (upper - lower) * (target - cumulative) / count
+                return min(max(estimate, self.min), self.max)
+            cumulative += count
+            lower = bound
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+        }
+
+class _Series:
+    """同一提供商和模型的累计统计"""
+    HISTOGRAMS = ('latency_seconds', 'queue_wait_seconds', 'network_seconds', 'time_to_first_output_seconds')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.estimated_calls = 0
+        self.cost = 0.0
+        self.histograms = {name: Histogram() for name in self.HISTOGRAMS}
+
+class MetricsRegistry:
+    """
+    汇总所有翻译调用
+    prices 为各提供商每百万 token 的价格：{'gemini': {'input': 0.1, 'output': 0.4}}
+    """
+    def __init__(self, prices: dict = None):
+        self.prices = prices or {}
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def record(self, call: CallInfo) -> None:
+        price = self.prices.get(call.provider, {})
+        with self._lock:
+            series = self._series.setdefault((call.provider, call.model), _Series())
+            series.calls += 1
+            series.errors += int(call.error)
+            series.cancelled += int(call.cancelled)
+            series.retries += call.retries
+            series.input_tokens += call.input_tokens
+            series.output_tokens += call.output_tokens
+            series.estimated_calls += int(not call.usage_reported)
+            series.cost += (call.input_tokens * price.get('input', 0.0)
+                            + call.output_tokens * price.get('output', 0.0)) / 1_000_000
+            series.histograms['latency_seconds'].observe(call.latency)
+            series.histograms['queue_wait_seconds'].observe(call.queue_wait)
+            series.histograms['network_seconds'].observe(call.network_time)
+            if call.time_to_first_output is not None:
+                series.histograms['time_to_first_output_seconds'].observe(call.time_to_first_output)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series = {}
+
+    def snapshot(self) -> list:
+        """每个提供商/模型一项的统计列表"""
+        with self._lock:
+            return [
+                {
+                    'provider': provider,
+                    'model': model,
+                    'calls': series.calls,
+                    'errors': series.errors,
+                    'cancelled': series.cancelled,
+                    'retries': series.retries,
+                    'input_tokens': series.input_tokens,
+                    'output_tokens': series.output_tokens,
+                    # 接口未返回 usage、按文本长度估算 token 的调用数
+                    'estimated_calls': series.estimated_calls,
+                    'cost': series.cost,
+                    **{name: histogram.to_dict() for name, histogram in series.histograms.items()},
+                }
+                for (provider, model), series in sorted(self._series.items())
+            ]
+
+    def to_json(self) -> str:
+        return json.dumps({'timestamp': time.time(), 'series': self.snapshot()}, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        with self._lock:
+            items = sorted(self._series.items())
+            lines = []
+            counters = (
+                ('calls', 'translate_paper_requests_total', '翻译请求数'),
+                ('errors', 'translate_paper_request_errors_total', '失败的翻译请求数'),
+                ('cancelled', 'translate_paper_requests_cancelled_total', '被调用方取消的翻译请求数'),
+                ('retries', 'translate_paper_retries_total', '重试次数'),
+                ('input_tokens', 'translate_paper_input_tokens_total', '输入 token 数'),
+                ('output_tokens', 'translate_paper_output_tokens_total', '输出 token 数'),
+                ('cost', 'translate_paper_cost_total', '估算费用'),
+            )
+            for attribute, metric, description in counters:
+                lines.append(f'# HELP {metric} {description}')
+                lines.append(f'# TYPE {metric} counter')
+                for (provider, model), series in items:
+                    lines.append(f'{metric}{{provider="{provider}",model="{model}"}} {getattr(series, attribute)}')
+            for name in _Series.HISTOGRAMS:
+                metric = f'translate_paper_{name}'
+                lines.append(f'# TYPE {metric} histogram')
+                for (provider, model), series in items:
+                    histogram = series.histograms[name]
+                    labels = f'provider="{provider}",model="{model}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+# 全局统计，所有翻译器共用
+registry = MetricsRegistry()
+
+class InstrumentedTranslator(TranslatorWrapper):
+    """记录每次调用的耗时、token 用量和重试次数；放在缓存之内，缓存命中不计入"""
+    def __init__(self, inner: BaseTranslator, metrics: MetricsRegistry = None):
+        super().__init__(inner)
+        self.metrics = metrics or registry
+
+    def _begin(self) -> CallInfo:
+        return CallInfo(getattr(self.inner, 'provider_name', ''), getattr(self.inner, 'model_name', ''))
+
+    def _finish(self, call: CallInfo, text: str, context: str, result: str = '') -> None:
+        call.finished = time.perf_counter()
+        if not call.usage_reported:
+            # 接口没有返回 usage 时按文本长度估算
+            call.input_tokens = estimate_tokens(text + context)
+            call.output_tokens = estimate_tokens(result)
+        self.metrics.record(call)
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        call = self._begin()
+        token = _current_call.set(call)
+        try:
+            result = self.inner.translate(text, to_chinese, context)
+            # 非流式接口的首个输出即完整结果
+            call.first_output = time.perf_counter()
+            self._finish(call, text, context, result)
+            return result
+        except Exception:
+            call.error = True
+            self._finish(call, text, context)
+            raise
+        finally:
+            _current_call.reset(token)
+
+    async def translate_async(self, text: str, to_chinese: bool, context: str = '') -> str:
+        call = self._begin()
+        token = _current_call.set(call)
+        try:
+            result = await self.inner.translate_async(text, to_chinese, context)
+            call.first_output = time.perf_counter()
+            self._finish(call, text, context, result)
+            return result
+        except asyncio.CancelledError:
+            call.cancelled = True
+            self._finish(call, text, context)
+            raise
+        except Exception:
+            call.error = True
+            self._finish(call, text, context)
+            raise
+        finally:
+            _current_call.reset(token)
+
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        call = self._begin()
+        parts = []
+        stream = self.inner.translate_stream(text, to_chinese, context)
+        try:
+            while True:
+                # 生成器可能在不同的上下文中被迭代，只在取下一段输出期间设置当前调用
+                token = _current_call.set(call)
+                try:
+                    delta = next(stream)
+                except StopIteration:
+                    break
+                finally:
+                    _current_call.reset(token)
+                if call.first_output is None:
+                    call.first_output = time.perf_counter()
+                parts.append(delta)
+                yield delta
+        except GeneratorExit:
+            # 调用方提前关闭时同时关闭上游的流，不再继续接收
+            call.cancelled = True
+            token = _current_call.set(call)
+            try:
+                stream.close()
+            finally:
+                _current_call.reset(token)
+            raise
+        except Exception:
+            call.error = True
+            raise
+        finally:
+            self._finish(call, text, context, ''.join(parts))
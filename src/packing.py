@@ -0,0 +1,99 @@
+"""
+短段落打包翻译：把图注、表格单元格、标题、参考文献条目等短段落合并成一个请求
+
+每个短段落单独请求时都要付出一次往返延迟和完整的提示词开销。打包时把若干段落编码为 JSON 字符串数组，
+提供商换用专门的打包提示词，要求模型返回同样长度的 JSON 数组，再按位置拆回各段；
+返回结果无法解析或条数不一致时逐段重新翻译。
+"""
+import json
+import logging
+from chunker import estimate_tokens
+from translator import BaseTranslator, PackedText, TranslatorWrapper
+
+def plan_requests(segments: list, segment_tokens: int, max_tokens: int, max_segments: int) -> list:
+    """
+    把一组段落安排成若干个请求，返回段落下标列表的列表
+    不超过 segment_tokens 的短段落按原顺序合并，每个请求合计不超过 max_tokens、最多 max_segments 段；
+    较长的段落单独成为一个请求
+    """
+    requests = []
+    current, current_tokens = [], 0
+    for index, segment in enumerate(segments):
+        tokens = estimate_tokens(segment)
+        if tokens > segment_tokens or max_segments <= 1:
+            requests.append([index])
+            continue
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_segments):
+            requests.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        requests.append(current)
+    return requests
+
+def merge_contexts(contexts: list) -> str:
+    """合并各段的参考信息，按行去重，使相同的术语表标题和条目只出现一次"""
+    lines, seen = [], set()
+    for context in contexts:
+        for line in (context or '').splitlines():
+            if line.strip() and line in seen:
+                continue
+            seen.add(line)
+            lines.append(line)
+    return '\n'.join(lines).strip()
+
+def pack_segments(texts: list) -> PackedText:
+    return PackedText(json.dumps(texts, ensure_ascii=False, indent=0), len(texts))
+
+def unpack_translations(response: str, texts: list):
+    """从模型输出中取出译文数组；无法解析、条数不一致或有段落被译为空时返回 None"""
+    start, end = response.find('['), response.rfind(']')
+    if start < 0 or end < start:
+        return None
+    try:
+        items = json.loads(response[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(items, list) or len(items) != len(texts):
+        return None
+    if not all(isinstance(item, str) for item in items):
+        return None
+    translations = [item.strip() for item in items]
+    if any(text.strip() and not translation for text, translation in zip(texts, translations)):
+        return None
+    return translations
+
+class PackingTranslator(TranslatorWrapper):
+    """
+    translate_batch 把多段文本打包成一个请求，放在缓存之内、统计之外：
+    缓存仍按单段查找和保存，统计中一次打包请求计为一次调用
+    """
+    def __init__(self, inner: BaseTranslator, max_tokens: int = 1500, max_segments: int = 40):
+        super().__init__(inner)
+        self.max_tokens = max_tokens
+        self.max_segments = max_segments
+
+    def _translate_each(self, texts: list, to_chinese: bool, contexts: list) -> list:
+        return [self.inner.translate(text, to_chinese, context) for text, context in zip(texts, contexts)]
+
+    def _translate_pack(self, texts: list, to_chinese: bool, contexts: list) -> list:
+        if len(texts) == 1:
+            return self._translate_each(texts, to_chinese, contexts)
+        # 打包说明在提示词模板中，参考信息里只有各段合并后的术语等
+        response = self.inner.translate(pack_segments(texts), to_chinese, merge_contexts(contexts))
+        translations = unpack_translations(response, texts)
+        if translations is None:
+            logging.warning(f"打包翻译的结果与 {len(texts)} 个段落对不上，改为逐段翻译")
+            return self._translate_each(texts, to_chinese, contexts)
+        return translations
+
+    def translate_batch(self, texts: list, to_chinese: bool, contexts: list = None) -> list:
+        contexts = contexts or [''] * len(texts)
+        results = []
+        # 调用方通常已按预算分好组，这里只在超出预算时再拆分
+        for group in plan_requests(texts, self.max_tokens, self.max_tokens, self.max_segments):
+            results.extend(self._translate_pack(
+                [texts[index] for index in group], to_chinese, [contexts[index] for index in group]
+            ))
+        return results
@@ -0,0 +1,162 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from config import Config
+from packing import plan_requests
+from scheduler import BATCH, Scheduler
+from translator import BaseTranslator
+
+def plan_page_requests(segments: list, packing: bool = None) -> list:
+    """按打包设置把一页的段落安排成若干个请求，返回段落下标列表的列表"""
+    settings = Config.load_settings()
+    if not (settings['packing_enabled'] if packing is None else packing):
+        return [[index] for index in range(len(segments))]
+    return plan_requests(segments, settings['packing_segment_tokens'], settings['packing_max_tokens'],
+                         settings['packing_max_segments'])
+
+def translate_group(translator: BaseTranslator, segments: list, to_chinese: bool) -> list:
+    """翻译一个请求中的段落：单段直接翻译，多段打包翻译"""
+    if len(segments) == 1:
+        return [translator.translate(segments[0], to_chinese)]
+    return translator.translate_batch(segments, to_chinese)
+
+def get_concurrency(translator: BaseTranslator) -> int:
+    """读取当前提供商允许的并发请求数"""
+    concurrency = Config.load_settings()['concurrency']
+    return max(1, int(concurrency.get(getattr(translator, 'provider_name', ''), 1)))
+
+class DocumentTranslator:
+    """
+    把整篇文档的段落分发到有界线程池中并发翻译，按页回调结果
+    给出 scheduler 时请求作为最低优先级的任务交给调度器执行，不再单独创建线程池
+    """
+    def __init__(self, translator: BaseTranslator, max_workers: int = None, packing: bool = None,
+                 scheduler: Scheduler = None):
+        self.translator = translator
+        self.max_workers = max_workers or get_concurrency(translator)
+        # None 表示按 packing_enabled 设置决定是否打包短段落
+        self.packing = packing
+        self.scheduler = scheduler
+        self._cancelled = threading.Event()
+        self._jobs = set()
+        self._jobs_lock = threading.Lock()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        with self._jobs_lock:
+            for job in self._jobs:
+                job.cancel()
+
+    def _submit(self, executor, segments: list, to_chinese: bool):
+        """提交一个请求，返回 Future"""
+        if self.scheduler is None:
+            return executor.submit(self._translate_group, segments, to_chinese)
+        job = self.scheduler.submit(lambda token: self._translate_group(segments, to_chinese), BATCH)
+        with self._jobs_lock:
+            self._jobs.add(job)
+        job.add_done_callback(self._discard_job)
+        return job.future
+
+    def _discard_job(self, job) -> None:
+        with self._jobs_lock:
+            self._jobs.discard(job)
+
+    def _translate_group(self, segments: list, to_chinese: bool) -> list:
+        if self._cancelled.is_set():
+            raise RuntimeError("翻译已取消")
+        return translate_group(self.translator, segments, to_chinese)
+
+    def translate_pages(self, pages: list, to_chinese: bool, on_progress=None, on_page_done=None) -> list:
+        """
+        pages 为每页的段落列表，返回每页的译文段落列表
+        on_progress(已完成页数, 总页数, 页码) 在每页全部段落完成时回调
+        on_page_done(页码, 译文段落列表) 在每页完成时回调，可用于边翻译边保存
+        """
+        results = [None] * len(pages)
+
+        def collect(page_index, segments, translations):
+            results[page_index] = translations
+            if on_page_done:
+                on_page_done(page_index, translations)
+
+        self.translate_page_stream(enumerate(pages), to_chinese, collect, on_progress, total=len(pages))
+        return results
+
+    def translate_page_stream(self, pages, to_chinese: bool, on_page_done, on_progress=None,
+                              total: int = None, max_pending_pages: int = None) -> int:
+        """
+        流式翻译：pages 为逐个产出 (页码, 段落列表) 的可迭代对象，可以是惰性生成器
+        同时在处理中的页面不超过 max_pending_pages（默认为并发数的两倍），同时进行的请求不超过并发数，
+        每页完成后调用 on_page_done(页码, 段落列表, 译文段落列表) 并释放该页，内存占用与文档页数无关
+        返回完成的页数
+        """
+        max_pending_pages = max_pending_pages or self.max_workers * 2
+        pages = iter(pages)
+        # 页码 -> [段落列表, 译文列表, 剩余段落数]
+        pending = {}
+        # 等待提交的请求 (页码, 段落下标列表)
+        waiting = deque()
+        futures = {}
+        done_pages = 0
+        exhausted = False
+
+        def finish_page(page_index):
+            nonlocal done_pages
+            segments, translations, _ = pending.pop(page_index)
+            done_pages += 1
+            on_page_done(page_index, segments, translations)
+            if on_progress:
+                on_progress(done_pages, total, page_index)
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers) if self.scheduler is None else None
+        try:
+            while True:
+                # 补充页面直到达到处理窗口上限
+                while not exhausted and len(pending) < max_pending_pages:
+                    if self._cancelled.is_set():
+                        raise RuntimeError("翻译已取消")
+                    try:
+                        page_index, segments = next(pages)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[page_index] = [segments, [None] * len(segments), len(segments)]
+                    if not segments:
+                        # 空白页直接视为完成
+                        finish_page(page_index)
+                        continue
+                    # 短段落打包成一个请求，其余段落各自一个请求
+                    for group in plan_page_requests(segments, self.packing):
+                        waiting.append((page_index, group))
+
+                while waiting and len(futures) < self.max_workers:
+                    page_index, group = waiting.popleft()
+                    segments = pending[page_index][0]
+                    future = self._submit(executor, [segments[index] for index in group], to_chinese)
+                    futures[future] = (page_index, group)
+
+                if not futures:
+                    break
+                completed, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in completed:
+                    page_index, group = futures.pop(future)
+                    if future.cancelled():
+                        raise RuntimeError("翻译已取消")
+                    entry = pending[page_index]
+                    for segment_index, translation in zip(group, future.result()):
+                        entry[1][segment_index] = translation
+                    entry[2] -= len(group)
+                    if entry[2] == 0:
+                        finish_page(page_index)
+        except Exception:
+            self.cancel()
+            for future in futures:
+                future.cancel()
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        logging.info(f"全文翻译完成，共 {done_pages} 页")
+        return done_pages
@@ -0,0 +1,93 @@
+import logging
+import threading
+from pipeline import plan_page_requests, translate_group
+from scheduler import INTERACTIVE, PREFETCH, Job, Scheduler
+from translator import BaseTranslator
+
+class Prefetcher:
+    """
+    在用户阅读当前页时，后台预先翻译后面几页；任务以预取优先级交给调度器执行
+    页面原文在任务中提取，界面线程不解析 PDF，也不占用文档的页面窗口；取结果时再与当前页的原文比较
+    """
+    def __init__(self, scheduler: Scheduler):
+        self.scheduler = scheduler
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _make_key(translator: BaseTranslator, document, page_index: int, to_chinese: bool) -> tuple:
+        return (getattr(translator, 'provider_name', ''), document.path, page_index, to_chinese)
+
+    @staticmethod
+    def _run(translator, document, page_index, to_chinese, token):
+        segments = document.peek_segments(page_index)
+        results = [None] * len(segments)
+        # 短段落打包翻译
+        for group in plan_page_requests(segments):
+            # 每个请求之间检查一次，被取消的页面不再继续消耗请求
+            token.check()
+            translations = translate_group(translator, [segments[index] for index in group], to_chinese)
+            for index, translation in zip(group, translations):
+                results[index] = translation
+        return segments, results
+
+    def schedule(self, translator: BaseTranslator, document, pages, to_chinese: bool, current_page: int = None) -> None:
+        """
+        预取 document 中 pages 列出的页面
+        除当前页外，不在本次窗口内的旧任务会被取消
+        """
+        keys = {self._make_key(translator, document, index, to_chinese): index for index in pages}
+        current_key = self._make_key(translator, document, current_page, to_chinese)
+        with self._lock:
+            for key in list(self._jobs):
+                if key not in keys and key != current_key:
+                    self._jobs.pop(key).cancel()
+            for key, index in keys.items():
+                job = self._jobs.get(key)
+                if job is not None and not job.cancelled:
+                    continue
+                logging.info(f"预取第 {index + 1} 页译文")
+                self._jobs[key] = self.scheduler.submit(
+                    lambda token, index=index: self._run(translator, document, index, to_chinese, token),
+                    PREFETCH, key=('page',) + key
+                )
+
+    def _job(self, translator: BaseTranslator, document, page_index: int, to_chinese: bool):
+        key = self._make_key(translator, document, page_index, to_chinese)
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is None or job.cancelled or job.future.cancelled():
+            return None
+        if job.future.done() and job.future.exception() is not None:
+            return None
+        return job
+
+    @staticmethod
+    def translations(result, segments: list):
+        """从预取结果中取出译文；预取时提取的原文与 segments 不一致时返回 None"""
+        prefetched_segments, translations = result
+        return translations if prefetched_segments == segments else None
+
+    def get(self, translator: BaseTranslator, document, page_index: int, to_chinese: bool, segments: list):
+        """返回已完成的预取结果，尚未完成、失败或原文不一致时返回 None"""
+        job = self._job(translator, document, page_index, to_chinese)
+        if job is None or not job.future.done():
+            return None
+        return self.translations(job.future.result(), segments)
+
+    def promote(self, translator: BaseTranslator, document, page_index: int, to_chinese: bool) -> Job:
+        """
+        用户要翻译的页面正在预取时，把该任务提升为交互优先级并返回，调用方等待其结果即可，不必重复请求；
+        结果中的原文需由调用方用 translations() 核对。没有可用的预取任务时返回 None
+        """
+        job = self._job(translator, document, page_index, to_chinese)
+        if job is None or job.future.done():
+            return None
+        return self.scheduler.promote(job, INTERACTIVE)
+
+    def cancel_all(self) -> None:
+        """丢弃所有预取任务，正在执行的任务在下一个请求前停止"""
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+            self._jobs.clear()
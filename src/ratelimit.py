@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Iterator
+from chunker import estimate_tokens
+from metrics import record_queue_wait, record_retry
+from translator import BaseTranslator, TranslatorWrapper
+
+# 可以安全重试的 HTTP 状态码：限流和服务端临时错误
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+def get_status_code(exc: Exception):
+    """从各提供商抛出的异常中取出 HTTP 状态码"""
+    response = getattr(exc, 'response', None)
+    if response is not None and getattr(response, 'status_code', None) is not None:
+        return response.status_code
+    # google.api_core 的异常把状态码放在 code 属性上
+    code = getattr(exc, 'code', None)
+    return code if isinstance(code, int) else None
+
+def get_retry_after(exc: Exception):
+    """读取 Retry-After 响应头（秒），没有时返回 None"""
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('Retry-After')
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+def is_retryable(exc: Exception) -> bool:
+    """判断失败是否是临时性的，翻译请求本身是幂等的，可以放心重试"""
+    # 只检查已经导入的 HTTP 库，未导入的库不可能抛出对应异常
+    requests = sys.modules.get('requests')
+    if requests and isinstance(exc, (requests.ConnectionError, requests.Timeout)):
+        return True
+    httpx = sys.modules.get('httpx')
+    if httpx and isinstance(exc, httpx.TransportError):
+        return True
+    return get_status_code(exc) in RETRYABLE_STATUS
+
+class TokenBucket:
+    """令牌桶：容量为每分钟预算，按固定速率补充"""
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """返回取出 amount 个令牌还需等待的秒数"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+class RateLimiter:
+    """
+    单个提供商的限流器，同时限制每分钟请求数和 token 数
+    收到 429 时整体暂停并降低速率，之后随成功请求逐步恢复
+    """
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self._lock = threading.Lock()
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._base_rates = [(bucket, bucket.rate) for bucket in (self.requests, self.tokens) if bucket]
+        self._scale = 1.0
+        self._paused_until = 0.0
+
+    def _reserve(self, tokens: int) -> float:
+        """尝试占用额度，成功返回 0，否则返回建议等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._paused_until - now
+            if wait > 0:
+                return wait
+            waits = [bucket.wait_time(amount, now) for bucket, amount in
+                     ((self.requests, 1), (self.tokens, tokens)) if bucket]
+            wait = max(waits, default=0.0)
+            if wait > 0:
+                return wait
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(tokens)
+            return 0.0
+
+    def acquire(self, tokens: int = 0) -> float:
+        """阻塞直到有可用额度，返回等待的总秒数"""
+        waited = 0.0
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens: int = 0) -> float:
+        waited = 0.0
+        while True:
+            wait = self._reserve(tokens)
+            if wait <= 0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _apply_scale(self) -> None:
+        for bucket, rate in self._base_rates:
+            bucket.rate = rate * self._scale
+
+    def on_throttled(self, retry_after: float = None) -> None:
+        """收到限流响应：按 Retry-After 暂停所有请求并把速率减半"""
+        with self._lock:
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._scale = max(0.1, self._scale * 0.5)
+            self._apply_scale()
+
+    def on_success(self) -> None:
+        with self._lock:
+            if self._scale < 1.0:
+                self._scale = min(1.0, self._scale + 0.05)
+                self._apply_scale()
+
+class RetryPolicy:
+    """带随机抖动的指数退避"""
+    def __init__(self, max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(backoff, retry_after or 0.0)
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider: str, requests_per_minute: float = 0, tokens_per_minute: float = 0) -> RateLimiter:
+    """同一提供商的所有翻译器共享一个限流器"""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return _limiters[provider]
+
+class RateLimitedTranslator(TranslatorWrapper):
+    """请求前按配额限流，临时性失败按指数退避重试"""
+    def __init__(self, inner: BaseTranslator, limiter: RateLimiter, retry_policy: RetryPolicy = None):
+        super().__init__(inner)
+        self.limiter = limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+
+    @staticmethod
+    def _cost(text: str, context: str) -> int:
+        # 输出长度与输入相当，按输入的两倍估算
+        return estimate_tokens(text + context) * 2
+
+    def _next_delay(self, exc: Exception, attempt: int):
+        """返回重试前需要等待的秒数，不可重试时返回 None"""
+        if attempt >= self.retry_policy.max_retries or not is_retryable(exc):
+            return None
+        retry_after = get_retry_after(exc)
+        if get_status_code(exc) == 429:
+            self.limiter.on_throttled(retry_after)
+        delay = self.retry_policy.delay(attempt, retry_after)
+        logging.warning(f"翻译请求失败（{exc}），{delay:.1f}秒后第 {attempt + 1} 次重试")
+        record_retry(delay)
+        return delay
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        attempt = 0
+        while True:
+            record_queue_wait(self.limiter.acquire(self._cost(text, context)))
+            try:
+                result = self.inner.translate(text, to_chinese, context)
+                self.limiter.on_success()
+                return result
+            except Exception as e:
+                delay = self._next_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        attempt = 0
+        while True:
+            record_queue_wait(self.limiter.acquire(self._cost(text, context)))
+            started = False
+            try:
+                for delta in self.inner.translate_stream(text, to_chinese, context):
+                    started = True
+                    yield delta
+                self.limiter.on_success()
+                return
+            except Exception as e:
+                # 已经输出部分内容后不能再重试，否则界面上会出现重复文本
+                delay = None if started else self._next_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    async def translate_async(self, text: str, to_chinese: bool, context: str = '') -> str:
+        attempt = 0
+        while True:
+            record_queue_wait(await self.limiter.acquire_async(self._cost(text, context)))
+            try:
+                result = await self.inner.translate_async(text, to_chinese, context)
+                self.limiter.on_success()
+                return result
+            except Exception as e:
+                delay = self._next_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
@@ -0,0 +1,188 @@
+"""
+界面中所有翻译任务的统一调度
+
+任务分为三个优先级：当前页的交互式翻译 > 后台预取 > 全文翻译。通用线程总是先取高优先级的任务，
+另有若干线程只处理交互式任务，全文翻译占满通用线程时当前页也不用排队。
+相同 key 的任务在完成前只执行一次，重复提交返回同一个任务，并按较高的优先级执行。
+每个任务带一个 CancelToken，排队中的任务取消后不再执行，执行中的任务在下一次检查时停止。
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+INTERACTIVE = 0
+PREFETCH = 1
+BATCH = 2
+PRIORITY_NAMES = ('interactive', 'prefetch', 'batch')
+
+class JobCancelled(RuntimeError):
+    pass
+
+class CancelToken:
+    """协作式取消标记，任务在每个请求之间调用 check()"""
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise JobCancelled("翻译已取消")
+
+class Job:
+    """一个调度任务；future 可用于 concurrent.futures.wait 或添加完成回调"""
+    def __init__(self, fn, priority: int, key=None):
+        self.fn = fn
+        self.priority = priority
+        self.key = key
+        self.token = CancelToken()
+        self.future = Future()
+        self.started = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self.token.cancelled
+
+    def cancel(self) -> None:
+        """取消任务：排队中的不再执行，执行中的在下一次检查时停止"""
+        self.token.cancel()
+        self.future.cancel()
+
+    def add_done_callback(self, callback) -> None:
+        """任务完成、失败或取消后在执行任务的线程中调用 callback(job)"""
+        self.future.add_done_callback(lambda _: callback(self))
+
+class Scheduler:
+    """
+    有界线程池加优先级队列
+    workers 个通用线程按优先级取任务，interactive_workers 个线程只取交互式任务；
+    limits 可限制某一优先级同时执行的任务数，如 {PREFETCH: 2}
+    """
+    def __init__(self, workers: int = 8, interactive_workers: int = 2, limits: dict = None):
+        self.limits = limits or {}
+        self._queues = [deque() for _ in PRIORITY_NAMES]
+        self._running = [0] * len(PRIORITY_NAMES)
+        # key -> 尚未完成的任务，用于去重
+        self._jobs = {}
+        self._active = set()
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._threads = [
+            threading.Thread(target=self._work, args=(False,), name=f'scheduler-{index}', daemon=True)
+            for index in range(max(1, workers))
+        ] + [
+            threading.Thread(target=self._work, args=(True,), name=f'scheduler-interactive-{index}', daemon=True)
+            for index in range(max(0, interactive_workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, priority: int = BATCH, key=None) -> Job:
+        """
+        提交任务 fn(token)，返回 Job
+        key 相同且尚未完成的任务已存在时直接返回该任务；新提交的优先级更高且任务还在排队时提升其优先级
+        """
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("调度器已关闭")
+            job = self._jobs.get(key) if key is not None else None
+            if job is not None and not job.cancelled:
+                self._raise_priority(job, priority)
+                return job
+            job = Job(fn, priority, key)
+            self._queues[priority].append(job)
+            if key is not None:
+                self._jobs[key] = job
+            self._condition.notify_all()
+            return job
+
+    def promote(self, job: Job, priority: int = INTERACTIVE) -> Job:
+        """提升排队中任务的优先级，已开始执行的任务不受影响"""
+        with self._condition:
+            self._raise_priority(job, priority)
+        return job
+
+    def _raise_priority(self, job: Job, priority: int) -> None:
+        if priority < job.priority and not job.started and job in self._queues[job.priority]:
+            self._queues[job.priority].remove(job)
+            job.priority = priority
+            self._queues[priority].append(job)
+            self._condition.notify_all()
+
+    def pending(self, priority: int = None) -> int:
+        """排队中的任务数"""
+        with self._condition:
+            queues = self._queues if priority is None else [self._queues[priority]]
+            return sum(1 for queue in queues for job in queue if not job.cancelled)
+
+    def cancel_all(self, priority: int = None) -> None:
+        """取消某一优先级（默认全部）的排队中和执行中的任务"""
+        with self._condition:
+            for job in self._active:
+                if priority is None or job.priority == priority:
+                    job.cancel()
+            for index, queue in enumerate(self._queues):
+                if priority is None or index == priority:
+                    for job in queue:
+                        job.cancel()
+                    queue.clear()
+
+    def shutdown(self) -> None:
+        """取消所有任务并让工作线程退出，不等待执行中的请求返回"""
+        self.cancel_all()
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+
+    def _take(self, interactive_only: bool):
+        for priority, queue in enumerate(self._queues):
+            if interactive_only and priority != INTERACTIVE:
+                break
+            limit = self.limits.get(priority)
+            if limit is not None and self._running[priority] >= limit:
+                continue
+            while queue:
+                job = queue.popleft()
+                if job.cancelled:
+                    self._forget(job)
+                    continue
+                return job
+        return None
+
+    def _forget(self, job: Job) -> None:
+        if job.key is not None and self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+
+    def _work(self, interactive_only: bool) -> None:
+        while True:
+            with self._condition:
+                job = None
+                while not self._shutdown:
+                    job = self._take(interactive_only)
+                    if job is not None:
+                        break
+                    self._condition.wait()
+                if job is None:
+                    return
+                job.started = True
+                priority = job.priority
+                self._running[priority] += 1
+                self._active.add(job)
+            try:
+                if job.future.set_running_or_notify_cancel():
+                    try:
+                        job.future.set_result(job.fn(job.token))
+                    except BaseException as e:
+                        # 错误由提交方在 future 中处理和记录
+                        job.future.set_exception(e)
+            finally:
+                with self._condition:
+                    self._running[priority] -= 1
+                    self._active.discard(job)
+                    self._forget(job)
+                    self._condition.notify_all()
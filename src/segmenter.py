@@ -0,0 +1,22 @@
+# 段落之间的分隔符，拆分和重新拼接时保持一致
+SEGMENT_SEPARATOR = '\n\n'
+
+def join_block_lines(text: str) -> str:
+    """把块内被排版折断的行重新拼成一段"""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return ''
+    result = lines[0]
+    for line in lines[1:]:
+        if result.endswith('-') and result[-2:-1].isalpha() and line[:1].islower():
+            # 英文断词连字符：去掉连字符直接拼接
+            result = result[:-1] + line
+        elif result[-1:].isascii() and line[:1].isascii():
+            result += ' ' + line
+        else:
+            # 中文等不以空格分词的文字直接拼接
+            result += line
+    return result
+
+def join_segments(segments: list) -> str:
+    return SEGMENT_SEPARATOR.join(segments)
@@ -0,0 +1,235 @@
+"""
+本地翻译服务：多个客户端共用同一份缓存，相同的并发请求只向上游发送一次
+
+用法:
+    python src/server.py --provider gemini --port 8765
+    python src/server.py --stub              # 使用本地假翻译器，离线测试用
+
+接口:
+    POST /translate  {"text": "...", "to_chinese": true, "context": "", "provider": "gemini"}
+                     -> {"translation": "..."}
+    GET  /health     -> {"status": "ok", "providers": [...], "stats": {...}}
+    GET  /metrics    -> Prometheus 文本格式的上游调用统计
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cache import CachedTranslator, normalize_text
+from config import Config
+from factory import create_translator, get_shared_cache, memory_stats
+from metrics import InstrumentedTranslator, registry as metrics_registry
+from ratelimit import get_status_code
+from translator import BaseTranslator
+
+class UnknownProviderError(ValueError):
+    """请求的提供商没有在服务端配置"""
+
+class SingleFlight:
+    """同一个键同时只执行一次，其余调用方等待并共享结果"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: str, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = {'event': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+                leader = True
+                self.executed += 1
+            else:
+                leader = False
+                self.shared += 1
+        if not leader:
+            call['event'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+        try:
+            call['result'] = fn()
+            return call['result']
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call['event'].set()
+
+class StubTranslator(BaseTranslator):
+    """离线测试用的假翻译器：等待固定时间后返回带标记的原文"""
+    provider_name = 'stub'
+    model_name = 'stub'
+
+    def __init__(self, delay: float = 0.5):
+        self.delay = delay
+        self.calls = 0
+
+    def prompt_template(self, to_chinese: bool) -> str:
+        return '{text}'
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        self.calls += 1
+        time.sleep(self.delay)
+        return f"[{'中' if to_chinese else 'EN'}] {text}"
+
+class TranslationService:
+    def __init__(self, translators: dict):
+        self.translators = translators
+        self.default_provider = next(iter(translators))
+        self.single_flight = SingleFlight()
+
+    def translate(self, text: str, to_chinese: bool, context: str = '', provider: str = None) -> str:
+        provider = provider or self.default_provider
+        if provider not in self.translators:
+            raise UnknownProviderError(f"服务端未配置提供商: {provider}")
+        translator = self.translators[provider]
+        raw = json.dumps([provider, to_chinese, normalize_text(context), normalize_text(text)], ensure_ascii=False)
+        key = hashlib.sha256(raw.encode('utf-8')).hexdigest()
+        return self.single_flight.do(key, lambda: translator.translate(text, to_chinese, context))
+
+    def stats(self) -> dict:
+        stats = {'upstream_calls': self.single_flight.executed, 'coalesced': self.single_flight.shared}
+        cache = getattr(next(iter(self.translators.values())), 'cache', None)
+        if cache is not None:
+            stats['cache'] = cache.stats()
+        if memory_stats.lookups:
+            stats['memory'] = memory_stats.to_dict()
+        return stats
+
+def parse_request(body: bytes) -> dict:
+    """解析并检查 /translate 的请求体，字段缺失或类型不对时抛出 ValueError"""
+    request = json.loads(body)
+    if not isinstance(request, dict):
+        raise ValueError('请求体必须是 JSON 对象')
+    if not isinstance(request.get('text'), str):
+        raise ValueError('text 必须是字符串')
+    if not isinstance(request.get('context', ''), str):
+        raise ValueError('context 必须是字符串')
+    if not isinstance(request.get('to_chinese', True), bool):
+        raise ValueError('to_chinese 必须是 true 或 false')
+    provider = request.get('provider')
+    if provider is not None and not isinstance(provider, str):
+        raise ValueError('provider 必须是字符串')
+    return {
+        'text': request['text'],
+        'to_chinese': request.get('to_chinese', True),
+        'context': request.get('context', ''),
+        'provider': provider,
+    }
+
+class TranslationRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    service = None
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, status: int, text: str) -> None:
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_text(200, metrics_registry.to_prometheus())
+            return
+        if self.path != '/health':
+            self._send_json(404, {'error': 'not found'})
+            return
+        self._send_json(200, {
+            'status': 'ok',
+            'providers': list(self.service.translators),
+            'stats': self.service.stats(),
+        })
+
+    def do_POST(self):
+        if self.path != '/translate':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            request = parse_request(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError as e:
+            self._send_json(400, {'error': f'请求格式错误: {e}'})
+            return
+        try:
+            translation = self.service.translate(
+                request['text'], request['to_chinese'], request['context'], request['provider']
+            )
+            self._send_json(200, {'translation': translation})
+        except UnknownProviderError as e:
+            self._send_json(400, {'error': str(e)})
+        except Exception as e:
+            # 把上游的限流等状态码透传给客户端，方便客户端按同样的规则重试
+            status = get_status_code(e)
+            self._send_json(status if status and status >= 400 else 502, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+class TranslationHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # 默认监听队列只有 5，多个客户端同时连接时会被拒绝后重试，造成秒级延迟
+    request_queue_size = 128
+
+def create_server(service: TranslationService, host: str = '127.0.0.1', port: int = 8765) -> TranslationHTTPServer:
+    handler = type('Handler', (TranslationRequestHandler,), {'service': service})
+    return TranslationHTTPServer((host, port), handler)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本地翻译服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--provider', choices=['gemini', 'zhipu'], action='append',
+                        help='要提供的上游提供商，可重复指定；默认使用所有已配置密钥的提供商')
+    parser.add_argument('--stub', action='store_true', help='使用本地假翻译器代替真实 API')
+    parser.add_argument('--stub-delay', type=float, default=0.5, help='假翻译器每次调用的耗时（秒）')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.stub:
+        # 与真实提供商一样放在缓存之内统计，/metrics 只记录未命中缓存的调用
+        translator = InstrumentedTranslator(StubTranslator(args.stub_delay), metrics_registry)
+        cache = get_shared_cache()
+        translators = {'stub': CachedTranslator(translator, cache) if cache is not None else translator}
+    else:
+        gemini_key, zhipu_key = Config.load_api_keys()
+        keys = {
+            'gemini': os.environ.get('GEMINI_API_KEY', gemini_key),
+            'zhipu': os.environ.get('ZHIPU_API_KEY', zhipu_key),
+        }
+        providers = args.provider or [name for name, key in keys.items() if key]
+        translators = {name: create_translator(name, keys[name]) for name in providers if keys[name]}
+        if not translators:
+            raise SystemExit("未配置任何API密钥，可使用 --stub 离线运行")
+
+    server = create_server(TranslationService(translators), args.host, args.port)
+    logging.info(f"翻译服务已启动: http://{args.host}:{server.server_address[1]}，提供商: {', '.join(translators)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,73 +1,493 @@
+import asyncio
 import logging
-import google.generativeai as genai
-import requests
+import threading
 import json
 from abc import ABC, abstractmethod
+from typing import Iterator
 
-class BaseTranslator(ABC):
-    @abstractmethod
-    def translate(self, text: str, to_chinese: bool) -> str:
-        pass
-
-class GeminiTranslator(BaseTranslator):
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
-    
-    def translate(self, text: str, to_chinese: bool) -> str:
-        if to_chinese:
-            prompt = f"""
+GEMINI_PROMPT_TO_CHINESE = """
             Translate the following English text to Chinese. Requirements:
             1. Keep technical terms accurate
             2. Make the translation natural and fluent
             3. Only return the translated text without any explanation
-            
+
             Text to translate:
             {text}
             """
-        else:
-            prompt = f"""
+
+GEMINI_PROMPT_TO_ENGLISH = """
             Translate the following Chinese text to English. Requirements:
             1. Keep technical terms accurate
             2. Make the translation professional and natural
             3. Only return the translated text without any explanation
-            
+
             Text to translate:
             {text}
             """
-            
-        chat = self.model.start_chat(history=[])
-        response = chat.send_message(prompt)
+
+ZHIPU_PROMPT_TO_CHINESE = "Translate this English text to Chinese, keep it accurate and natural: {text}"
+ZHIPU_PROMPT_TO_ENGLISH = "Translate this Chinese text to English, keep it accurate and professional: {text}"
+
+# 打包翻译的提示词，{text} 为 JSON 字符串数组，{count} 为其中的段数
+GEMINI_PACKING_PROMPT_TO_CHINESE = """
+            Translate each English string in the following JSON array to Chinese. Requirements:
+            1. The array contains {count} independent segments, translate every string separately
+            2. Return only a JSON array of exactly {count} translated strings in the same order, not wrapped in a code block
+            3. Do not merge, split, drop or reorder segments
+            4. Keep technical terms accurate and make the translation natural and fluent
+
+            JSON array to translate:
+            {text}
+            """
+
+GEMINI_PACKING_PROMPT_TO_ENGLISH = """
+            Translate each Chinese string in the following JSON array to English. Requirements:
+            1. The array contains {count} independent segments, translate every string separately
+            2. Return only a JSON array of exactly {count} translated strings in the same order, not wrapped in a code block
+            3. Do not merge, split, drop or reorder segments
+            4. Keep technical terms accurate and make the translation professional and natural
+
+            JSON array to translate:
+            {text}
+            """
+
+ZHIPU_PACKING_PROMPT_TO_CHINESE = (
+    "Translate each English string in this JSON array of {count} independent segments to Chinese, "
+    "keep it accurate and natural. Return only a JSON array of exactly {count} translated strings in the same order, "
+    "without merging, splitting, dropping or reordering segments and without a code block: {text}"
+)
+ZHIPU_PACKING_PROMPT_TO_ENGLISH = (
+    "Translate each Chinese string in this JSON array of {count} independent segments to English, "
+    "keep it accurate and professional. Return only a JSON array of exactly {count} translated strings in the same "
+    "order, without merging, splitting, dropping or reordering segments and without a code block: {text}"
+)
+
+# 没有专用模板的翻译器使用的打包提示词
+PACKING_PROMPT = """The text to translate is a JSON array of {count} independent segments.
+Translate every string in the array separately and return only a JSON array of exactly {count} translated strings in the same order.
+Do not merge, split, drop or reorder segments, and do not wrap the array in a code block.
+
+{text}"""
+
+# 附加在提示词前的参考信息，用于分块衔接、术语等，只供模型参考，不需要翻译
+CONTEXT_PROMPT = """Reference context (use it only to keep terminology and style consistent; do not translate or output it):
+{context}
+
+"""
+
+class PackedText(str):
+    """
+    打包翻译的原文：多段文本编码成的 JSON 字符串数组，count 为段数
+    各层包装按普通文本原样传递，由提供商在生成提示词时换用打包模板
+    """
+    def __new__(cls, text: str, count: int):
+        packed = super().__new__(cls, text)
+        packed.count = count
+        return packed
+
+class BaseTranslator(ABC):
+    @abstractmethod
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        pass
+
+    def packing_template(self, to_chinese: bool) -> str:
+        """返回打包翻译的提示词模板，{text} 为 JSON 字符串数组，{count} 为段数"""
+        return PACKING_PROMPT
+
+    def build_prompt(self, text: str, to_chinese: bool, context: str = '') -> str:
+        """用提示词模板生成完整提示词，有参考信息时放在最前面；打包的原文使用打包模板"""
+        if isinstance(text, PackedText):
+            prompt = self.packing_template(to_chinese).format(text=text, count=text.count)
+        else:
+            prompt = self.prompt_template(to_chinese).format(text=text)
+        if context:
+            prompt = CONTEXT_PROMPT.format(context=context) + prompt
+        return prompt
+
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        """以增量文本片段的形式返回译文，默认一次性返回完整结果"""
+        yield self.translate(text, to_chinese, context)
+
+    def check_connection(self) -> None:
+        """发送一个最小请求检查密钥和网络是否可用，失败时抛出异常"""
+        self.translate("Hello", False)
+
+    def translate_batch(self, texts: list, to_chinese: bool, contexts: list = None) -> list:
+        """
+        翻译多段相互独立的短文本，contexts 为各段的参考信息，返回与输入顺序一致的译文列表
+        默认逐段调用 translate；PackingTranslator 会把它们合并成一个请求
+        """
+        contexts = contexts or [''] * len(texts)
+        return [self.translate(text, to_chinese, context) for text, context in zip(texts, contexts)]
+
+    async def translate_async(self, text: str, to_chinese: bool, context: str = '') -> str:
+        """异步翻译，默认在线程池中执行同步接口"""
+        return await asyncio.to_thread(self.translate, text, to_chinese, context)
+
+    async def translate_many(self, texts: list, to_chinese: bool, max_concurrency: int = 8) -> list:
+        """
+        在同一个事件循环中并发翻译多段文本，最多同时进行 max_concurrency 个请求，结果与输入顺序一致
+        结束时关闭在本事件循环中创建的异步连接
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run(text):
+            async with semaphore:
+                return await self.translate_async(text, to_chinese)
+
+        try:
+            return await asyncio.gather(*(run(text) for text in texts))
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        """关闭异步接口的连接，默认没有需要关闭的资源"""
+
+def record_usage(input_tokens, output_tokens) -> None:
+    """把接口返回的 token 用量记入当前调用的统计"""
+    # metrics 依赖本模块，在调用时再导入
+    import metrics
+    metrics.record_usage(input_tokens, output_tokens)
+
+class TranslatorWrapper(BaseTranslator):
+    """包装另一个翻译器，未覆盖的属性和方法都转发给内部翻译器"""
+    def __init__(self, inner: BaseTranslator):
+        self.inner = inner
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        return self.inner.translate(text, to_chinese, context)
+
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        return self.inner.translate_stream(text, to_chinese, context)
+
+    async def translate_async(self, text: str, to_chinese: bool, context: str = '') -> str:
+        return await self.inner.translate_async(text, to_chinese, context)
+
+    def translate_batch(self, texts: list, to_chinese: bool, contexts: list = None) -> list:
+        return self.inner.translate_batch(texts, to_chinese, contexts)
+
+    def check_connection(self) -> None:
+        # 直接检查最内层的提供商，不经过缓存
+        self.inner.check_connection()
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
+
+    def __getattr__(self, name):
+        # 只有在常规查找失败时才会调用，避免在 inner 尚未设置时无限递归
+        if name == 'inner':
+            raise AttributeError(name)
+        return getattr(self.inner, name)
+
+# Candidate.FinishReason.MAX_TOKENS
+MAX_TOKENS_FINISH_REASON = 2
+
+_gemini_lock = threading.Lock()
+_gemini_configured = None
+
+def configure_gemini(api_key: str, base_url: str = None):
+    """
+    genai.configure 是进程级设置，只在密钥或接口地址变化时重新配置，返回 genai 模块
+    指定 base_url 时改用 REST 接口访问该地址（兼容的代理或本地模拟服务）
+    """
+    # SDK 导入较慢，推迟到第一次使用 Gemini 时
+    import google.generativeai as genai
+    global _gemini_configured
+    with _gemini_lock:
+        if _gemini_configured != (api_key, base_url):
+            if base_url:
+                genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': base_url})
+            else:
+                genai.configure(api_key=api_key)
+            _gemini_configured = (api_key, base_url)
+    return genai
+
+class GeminiTranslator(BaseTranslator):
+    provider_name = 'gemini'
+
+    def __init__(self, api_key: str, generation_config: dict = None, base_url: str = None):
+        self.api_key = api_key
+        self.model_name = 'gemini-2.0-flash'
+        self.generation_config = generation_config or None
+        self.base_url = base_url or None
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """翻译是无状态的单次请求，所有线程共用同一个模型对象直接调用 generate_content"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    genai = configure_gemini(self.api_key, self.base_url)
+                    self._model = genai.GenerativeModel(self.model_name, generation_config=self.generation_config)
+        return self._model
+
+    def check_connection(self) -> None:
+        """发送一个最小请求检查密钥和网络是否可用，失败时抛出异常"""
+        self.model.generate_content("Hello")
+
+    def prompt_template(self, to_chinese: bool) -> str:
+        """返回翻译提示词模板，{text} 为待翻译文本"""
+        return GEMINI_PROMPT_TO_CHINESE if to_chinese else GEMINI_PROMPT_TO_ENGLISH
+
+    def packing_template(self, to_chinese: bool) -> str:
+        return GEMINI_PACKING_PROMPT_TO_CHINESE if to_chinese else GEMINI_PACKING_PROMPT_TO_ENGLISH
+
+    @staticmethod
+    def _check_truncated(response) -> None:
+        if response.candidates and response.candidates[0].finish_reason == MAX_TOKENS_FINISH_REASON:
+            logging.warning("Gemini 输出达到 max_output_tokens 上限，译文可能被截断")
+
+    @staticmethod
+    def _record_usage(response) -> None:
+        # 流式响应的 usage_metadata 在迭代结束后才是完整的
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None and usage.prompt_token_count:
+            record_usage(usage.prompt_token_count, usage.candidates_token_count)
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        prompt = self.build_prompt(text, to_chinese, context)
+        response = self.model.generate_content(prompt)
+        self._check_truncated(response)
+        self._record_usage(response)
+        return response.text.strip()
+
+    async def translate_async(self, text: str, to_chinese: bool, context: str = '') -> str:
+        prompt = self.build_prompt(text, to_chinese, context)
+        if self.base_url:
+            # 指定接口地址时 SDK 使用 REST 传输，其异步接口不可用，在线程池中执行同步请求
+            response = await asyncio.to_thread(self.model.generate_content, prompt)
+        else:
+            response = await self.model.generate_content_async(prompt)
+        self._check_truncated(response)
+        self._record_usage(response)
         return response.text.strip()
 
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        prompt = self.build_prompt(text, to_chinese, context)
+        response = self.model.generate_content(prompt, stream=True)
+        started = False
+        for chunk in response:
+            delta = chunk.text
+            if not started:
+                # 与非流式接口一致，去掉开头的空白
+                delta = delta.lstrip()
+                started = bool(delta)
+            if delta:
+                yield delta
+        self._check_truncated(response)
+        self._record_usage(response)
+
+ZHIPU_BASE_URL = "https://open.bigmodel.cn/api/paas/v4"
+
 class ZhipuAITranslator(BaseTranslator):
-    def __init__(self, api_key: str):
+    provider_name = 'zhipu'
+
+    def __init__(self, api_key: str, pool_size: int = 16, connect_timeout: float = 10, read_timeout: float = 120,
+                 base_url: str = None):
         self.api_key = api_key
-        self.url = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
-        
-    def translate(self, text: str, to_chinese: bool) -> str:
-        headers = {
+        self.model_name = 'glm-4-flash'
+        self.url = f"{(base_url or ZHIPU_BASE_URL).rstrip('/')}/chat/completions"
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
-        
-        if to_chinese:
-            prompt = f"Translate this English text to Chinese, keep it accurate and natural: {text}"
-        else:
-            prompt = f"Translate this Chinese text to English, keep it accurate and professional: {text}"
-            
+        self._session = None
+        self._session_lock = threading.Lock()
+        # 异步客户端与事件循环绑定，在首次异步调用时按当前循环创建
+        self._async_client = None
+        self._async_loop = None
+
+    @property
+    def session(self):
+        """
+        复用长连接，避免每次请求都重新经过代理建立 TLS 连接
+        pool_maxsize 决定同一主机可同时保持的连接数，应不小于并发翻译数
+        """
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update(self.headers)
+                    self._session = session
+        return self._session
+
+    def prompt_template(self, to_chinese: bool) -> str:
+        """返回翻译提示词模板，{text} 为待翻译文本"""
+        return ZHIPU_PROMPT_TO_CHINESE if to_chinese else ZHIPU_PROMPT_TO_ENGLISH
+
+    def packing_template(self, to_chinese: bool) -> str:
+        return ZHIPU_PACKING_PROMPT_TO_CHINESE if to_chinese else ZHIPU_PACKING_PROMPT_TO_ENGLISH
+
+    def _build_request(self, text: str, to_chinese: bool, stream: bool, context: str = '') -> dict:
+        prompt = self.build_prompt(text, to_chinese, context)
+
         data = {
-            "model": "glm-4-flash",
+            "model": self.model_name,
             "messages": [{"role": "user", "content": prompt}],
-            "stream": False
+            "stream": stream
         }
-        
+        return data
+
+    @staticmethod
+    def _record_usage(result: dict) -> None:
+        usage = result.get('usage')
+        if usage:
+            record_usage(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+
+    def _parse_result(self, result: dict) -> str:
+        self._record_usage(result)
+        choice = result['choices'][0]
+        if choice.get('finish_reason') == 'length':
+            logging.warning("智谱AI输出达到长度上限，译文可能被截断")
+        return choice['message']['content'].strip()
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        data = self._build_request(text, to_chinese, stream=False, context=context)
+
         try:
-            response = requests.post(self.url, headers=headers, json=data)
+            response = self.session.post(self.url, json=data, timeout=self.timeout)
             response.raise_for_status()
-            result = response.json()
-            return result['choices'][0]['message']['content'].strip()
+            return self._parse_result(response.json())
         except Exception as e:
             logging.error(f"智谱AI翻译错误: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+    def _get_async_client(self):
+        import httpx
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._discard_async_client()
+            connect_timeout, read_timeout = self.timeout
+            self._async_client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    async def translate_async(self, text: str, to_chinese: bool, context: str = '') -> str:
+        data = self._build_request(text, to_chinese, stream=False, context=context)
+
+        try:
+            response = await self._get_async_client().post(self.url, json=data)
+            response.raise_for_status()
+            return self._parse_result(response.json())
+        except Exception as e:
+            logging.error(f"智谱AI翻译错误: {str(e)}")
+            raise
+
+    def _discard_async_client(self) -> None:
+        """
+        换到新的事件循环时处理旧的异步客户端：旧循环仍在运行时在其中关闭；
+        旧循环已经结束时其连接无法再使用或等待关闭，只能丢弃
+        """
+        client, loop = self._async_client, self._async_loop
+        self._async_client = None
+        self._async_loop = None
+        if client is None:
+            return
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            logging.debug("智谱AI异步客户端所在的事件循环已结束，丢弃其连接")
+
+    async def aclose(self) -> None:
+        """关闭异步客户端的连接；客户端属于其他事件循环时交给该循环关闭"""
+        if self._async_client is None:
+            return
+        if self._async_loop is asyncio.get_running_loop():
+            client = self._async_client
+            self._async_client = None
+            self._async_loop = None
+            await client.aclose()
+        else:
+            self._discard_async_client()
+
+    def translate_stream(self, text: str, to_chinese: bool, context: str = '') -> Iterator[str]:
+        data = self._build_request(text, to_chinese, stream=True, context=context)
+
+        try:
+            with self.session.post(self.url, json=data, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                # SSE 响应通常不声明字符集，需手动指定以免中文乱码
+                response.encoding = 'utf-8'
+                started = False
+                # 服务端以 SSE 格式返回：每行 "data: {...}"，以 "data: [DONE]" 结束
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    payload = line[len('data:'):].strip()
+                    if payload == '[DONE]':
+                        break
+                    chunk = json.loads(payload)
+                    # 最后一个数据块附带整个请求的 usage
+                    self._record_usage(chunk)
+                    if not chunk.get('choices'):
+                        continue
+                    choice = chunk['choices'][0]
+                    if choice.get('finish_reason') == 'length':
+                        logging.warning("智谱AI输出达到长度上限，译文可能被截断")
+                    delta = choice['delta'].get('content') or ''
+                    if not started:
+                        delta = delta.lstrip()
+                        started = bool(delta)
+                    if delta:
+                        yield delta
+        except Exception as e:
+            logging.error(f"智谱AI流式翻译错误: {str(e)}")
+            raise
+
+class RemoteTranslator(BaseTranslator):
+    """通过本地翻译服务（src/server.py）翻译，多个客户端共享服务端的缓存"""
+    provider_name = 'remote'
+
+    def __init__(self, url: str, upstream: str = None, timeout: float = 300):
+        self.url = url.rstrip('/')
+        # 服务端使用的上游提供商，留空时使用服务端默认值
+        self.model_name = upstream or ''
+        self.upstream = upstream
+        self.timeout = timeout
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    session = requests.Session()
+                    # 翻译服务在本机或局域网内，不走 main.py 中设置的代理
+                    session.trust_env = False
+                    self._session = session
+        return self._session
+
+    def prompt_template(self, to_chinese: bool) -> str:
+        # 提示词由服务端决定，这里只用于区分缓存键
+        return '{text}'
+
+    def check_connection(self) -> None:
+        response = self.session.get(f'{self.url}/health', timeout=10)
+        response.raise_for_status()
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        data = {"text": text, "to_chinese": to_chinese, "context": context}
+        if self.upstream:
+            data["provider"] = self.upstream
+        try:
+            response = self.session.post(f'{self.url}/translate', json=data, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()['translation']
+        except Exception as e:
+            logging.error(f"翻译服务请求错误: {str(e)}")
+            raise
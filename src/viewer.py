@@ -0,0 +1,510 @@
+"""
+全文对照视图和增量文本统计
+
+整篇译文放进 QTextEdit 时每次 setText 都要重新排版几 MB 文本，几百页的文档会卡住界面。
+BilingualView 按段落一行，原文和译文在同一行左右并排绘制，滚动天然同步；
+模型在滚动到底部时才从 ResultStore 按批读取后续页面，视图只绘制可见的行。
+未翻译的页面先显示一行占位，由后台线程提取原文后再替换，界面线程不解析 PDF。
+IncrementalTextStats 在文本变化时只重新统计改动所在的段落，不再对整个文本重新分词。
+"""
+import logging
+import threading
+from collections import deque
+from PyQt6.QtCore import (QAbstractListModel, QModelIndex, QObject, QPersistentModelIndex, QPoint, QRect, QSize, Qt,
+                          pyqtSignal)
+from PyQt6.QtGui import QColor, QFontMetrics
+from PyQt6.QtWidgets import (QDialog, QHBoxLayout, QLabel, QListView, QPushButton, QStyle,
+                             QStyledItemDelegate, QVBoxLayout)
+
+# 每次从结果文件读取的页数
+FETCH_PAGES = 20
+
+# 跳转到某页时优先提取其前后的页数
+PRIORITY_PAGES = 3
+
+# 原文提取完成前占位行显示的文字
+EXTRACTING_TEXT = '正在读取原文…'
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+class IncrementalTextStats(QObject):
+    """
+    跟踪 QTextDocument 的单词数和字符数
+    每个段落的单词数缓存在 QTextBlock 的 userState 中，编辑时只重新统计改动涉及的段落
+    """
+    changed = pyqtSignal()
+
+    def __init__(self, document, parent=None):
+        super().__init__(parent)
+        self.document = document
+        self.words = 0
+        self.chars = 0
+        self._block_count = document.blockCount()
+        document.contentsChange.connect(self._on_contents_change)
+        self.recount()
+
+    def recount(self) -> None:
+        """按段落缓存的单词数重新求和，只对还没有缓存的段落分词"""
+        total = 0
+        block = self.document.begin()
+        while block.isValid():
+            if block.userState() < 0:
+                block.setUserState(count_words(block.text()))
+            total += block.userState()
+            block = block.next()
+        self.words = total
+        self.chars = self.document.characterCount() - 1
+        self._block_count = self.document.blockCount()
+        self.changed.emit()
+
+    def _on_contents_change(self, position: int, removed: int, added: int) -> None:
+        first = self.document.findBlock(position)
+        last = self.document.findBlock(position + added)
+        if not last.isValid():
+            last = self.document.lastBlock()
+        delta = 0
+        block = first
+        while block.isValid():
+            words = count_words(block.text())
+            delta += words - max(block.userState(), 0)
+            block.setUserState(words)
+            if block == last:
+                break
+            block = block.next()
+        if self.document.blockCount() != self._block_count or first != last:
+            # 段落被合并或拆分时，被删除段落的单词数无从得知，改为对各段缓存值重新求和
+            self.recount()
+            return
+        self.words += delta
+        self.chars = self.document.characterCount() - 1
+        self.changed.emit()
+
+class PageExtractor(QObject):
+    """在后台线程中按请求顺序提取页面原文，提取完成后在界面线程中发出 extracted(页码, 段落列表)"""
+    extracted = pyqtSignal(int, object)
+
+    def __init__(self, document, parent=None):
+        super().__init__(parent)
+        self.document = document
+        self._queue = deque()
+        self._queued = set()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='viewer-extract', daemon=True)
+        self._thread.start()
+
+    def request(self, pages) -> None:
+        with self._condition:
+            for page in pages:
+                if page not in self._queued:
+                    self._queued.add(page)
+                    self._queue.append(page)
+            self._condition.notify()
+
+    def prioritize(self, pages) -> None:
+        """把已在排队的页面移到队首，按 pages 的顺序提取"""
+        with self._condition:
+            for page in reversed([page for page in pages if page in self._queued]):
+                self._queue.remove(page)
+                self._queue.appendleft(page)
+
+    def discard(self, page: int) -> None:
+        with self._condition:
+            if page in self._queued:
+                self._queued.discard(page)
+                self._queue.remove(page)
+
+    def stop(self) -> None:
+        """停止提取并等待正在提取的页面完成，之后可以安全地关闭文档"""
+        with self._condition:
+            self._stopped = True
+            self._queue.clear()
+            self._queued.clear()
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                page = self._queue.popleft()
+                self._queued.discard(page)
+            try:
+                segments = self.document.peek_segments(page)
+            except Exception as e:
+                logging.error(f"读取第 {page + 1} 页原文失败: {str(e)}")
+                continue
+            with self._condition:
+                if self._stopped:
+                    return
+                self.extracted.emit(page, segments)
+
+class BilingualModel(QAbstractListModel):
+    """
+    全文对照的数据模型，每行是一个段落
+    页面按 FETCH_PAGES 一批惰性读取：已翻译的页面一次查询从 ResultStore 取出，
+    未翻译的页面先放一行占位，原文由 PageExtractor 在后台提取后替换；统计数据随读取和更新增量累加
+    """
+    SourceRole = Qt.ItemDataRole.UserRole + 1
+    TranslationRole = Qt.ItemDataRole.UserRole + 2
+    PageRole = Qt.ItemDataRole.UserRole + 3
+    SegmentRole = Qt.ItemDataRole.UserRole + 4
+
+    def __init__(self, document, to_chinese: bool, parent=None):
+        super().__init__(parent)
+        self.document = document
+        self.to_chinese = to_chinese
+        self._rows = []
+        # 页码 -> (首行, 行数)
+        self._page_rows = {}
+        self.loaded_pages = 0
+        self._translated = set()
+        # 等待后台提取原文的页面
+        self._extracting = set()
+        self.source_words = 0
+        self.translation_chars = 0
+        self.extractor = PageExtractor(document, self)
+        self.extractor.extracted.connect(self._on_extracted)
+
+    def shutdown(self) -> None:
+        self.extractor.stop()
+
+    @property
+    def translated_pages(self) -> int:
+        return len(self._translated)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        page, segment, source, translation = self._rows[index.row()]
+        if role in (Qt.ItemDataRole.DisplayRole, self.SourceRole):
+            return source
+        if role == self.TranslationRole:
+            return translation
+        if role == self.PageRole:
+            return page
+        if role == self.SegmentRole:
+            return segment
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and self.loaded_pages < self.document.page_count
+
+    def fetchMore(self, parent=QModelIndex()) -> None:
+        if parent.isValid():
+            return
+        start = self.loaded_pages
+        stop = min(self.document.page_count, start + FETCH_PAGES)
+        stored = self.document.results.get_pages(start, stop, self.to_chinese)
+        rows = []
+        for page in range(start, stop):
+            if page in stored:
+                segments, translations = stored[page]
+                self._translated.add(page)
+                page_rows = self._make_rows(page, segments, translations)
+            else:
+                self._extracting.add(page)
+                page_rows = [(page, 0, EXTRACTING_TEXT, '')]
+            self._page_rows[page] = (len(self._rows) + len(rows), len(page_rows))
+            rows.extend(page_rows)
+        self.loaded_pages = stop
+        self.extractor.request([page for page in range(start, stop) if page in self._extracting])
+        if not rows:
+            return
+        self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    def _make_rows(self, page: int, segments: list, translations: list) -> list:
+        rows = []
+        for index, (source, translation) in enumerate(zip(segments, translations)):
+            rows.append((page, index, source, translation))
+            self.source_words += count_words(source)
+            self.translation_chars += len(translation)
+        return rows
+
+    def prioritize(self, page: int) -> None:
+        """优先提取 page 及其前后几页的原文"""
+        self.extractor.prioritize(
+            [page] + [other for offset in range(1, PRIORITY_PAGES + 1) for other in (page + offset, page - offset)]
+        )
+
+    def _on_extracted(self, page: int, segments: list) -> None:
+        if page not in self._extracting:
+            return
+        self._replace_placeholder(page, self._make_rows(page, segments, [''] * len(segments)))
+
+    def _replace_placeholder(self, page: int, rows: list) -> None:
+        """用该页的段落替换占位行，并顺移后面各页的行号"""
+        self._extracting.discard(page)
+        first, _ = self._page_rows[page]
+        if rows:
+            self._rows[first] = rows[0]
+            self.dataChanged.emit(self.index(first), self.index(first))
+            if len(rows) > 1:
+                self.beginInsertRows(QModelIndex(), first + 1, first + len(rows) - 1)
+                self._rows[first + 1:first + 1] = rows[1:]
+                self._shift_pages(page, len(rows) - 1)
+                self._page_rows[page] = (first, len(rows))
+                self.endInsertRows()
+        else:
+            # 没有文本的页面不占行
+            self.beginRemoveRows(QModelIndex(), first, first)
+            del self._rows[first]
+            self._shift_pages(page, -1)
+            self._page_rows[page] = (first, 0)
+            self.endRemoveRows()
+
+    def _shift_pages(self, page: int, delta: int) -> None:
+        for other in range(page + 1, self.loaded_pages):
+            first, count = self._page_rows[other]
+            self._page_rows[other] = (first + delta, count)
+
+    def update_page(self, page: int) -> None:
+        """全文翻译完成一页后刷新该页的译文；尚未读取到的页面以后读取时自然是最新结果"""
+        if page not in self._page_rows:
+            return
+        if page in self._extracting:
+            # 原文还没提取出来，直接使用结果中的原文和译文
+            stored = self.document.results.get_pages(page, page + 1, self.to_chinese).get(page)
+            if stored is not None:
+                self.extractor.discard(page)
+                self._translated.add(page)
+                self._replace_placeholder(page, self._make_rows(page, *stored))
+            return
+        first, count = self._page_rows[page]
+        translations = self.document.results.get_page(
+            page, self.to_chinese, [self._rows[first + index][2] for index in range(count)]
+        )
+        if translations is None:
+            return
+        self._translated.add(page)
+        for index, translation in enumerate(translations):
+            row_page, segment, source, old = self._rows[first + index]
+            self.translation_chars += len(translation) - len(old)
+            self._rows[first + index] = (row_page, segment, source, translation)
+        if count:
+            self.dataChanged.emit(self.index(first), self.index(first + count - 1))
+
+    def first_row(self, page: int):
+        if page not in self._page_rows:
+            return None
+        return self._page_rows[page][0]
+
+class BilingualDelegate(QStyledItemDelegate):
+    """把一行绘制为左右两栏：左边原文，右边译文；页面的第一段上方加页码标题"""
+    MARGIN = 8
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        # 行号 -> (宽度, 高度)，视图宽度变化时失效
+        self._heights = {}
+
+    def forget(self, first: int = None, last: int = None) -> None:
+        if first is None:
+            self._heights.clear()
+            return
+        for row in range(first, last + 1):
+            self._heights.pop(row, None)
+
+    def forget_from(self, first: int) -> None:
+        """插入或删除行后，其后各行的行号都变了"""
+        for row in [row for row in self._heights if row >= first]:
+            del self._heights[row]
+
+    def _column_width(self, width: int) -> int:
+        return max(1, (width - 3 * self.MARGIN) // 2)
+
+    def _has_header(self, index) -> bool:
+        return index.data(BilingualModel.SegmentRole) == 0
+
+    def sizeHint(self, option, index) -> QSize:
+        width = self.view.viewport().width()
+        cached = self._heights.get(index.row())
+        if cached and cached[0] == width:
+            return QSize(width, cached[1])
+        metrics = QFontMetrics(option.font)
+        column = self._column_width(width)
+        flags = int(Qt.TextFlag.TextWordWrap)
+        height = max(
+            metrics.boundingRect(QRect(0, 0, column, 1 << 20), flags, index.data(BilingualModel.SourceRole)).height(),
+            metrics.boundingRect(QRect(0, 0, column, 1 << 20), flags,
+                                 index.data(BilingualModel.TranslationRole) or '未翻译').height(),
+        )
+        height += 2 * self.MARGIN
+        if self._has_header(index):
+            height += metrics.height() + self.MARGIN
+        self._heights[index.row()] = (width, height)
+        return QSize(width, height)
+
+    def paint(self, painter, option, index) -> None:
+        painter.save()
+        rect = option.rect
+        selected = bool(option.state & QStyle.StateFlag.State_Selected)
+        if selected:
+            painter.fillRect(rect, option.palette.highlight())
+        text_color = option.palette.highlightedText().color() if selected else option.palette.text().color()
+        top = rect.top() + self.MARGIN
+        if self._has_header(index):
+            header_height = option.fontMetrics.height()
+            painter.setPen(QColor('#888888'))
+            painter.drawText(QRect(rect.left() + self.MARGIN, top, rect.width() - 2 * self.MARGIN, header_height),
+                             int(Qt.AlignmentFlag.AlignLeft), f'第 {index.data(BilingualModel.PageRole) + 1} 页')
+            painter.drawLine(rect.left() + self.MARGIN, top + header_height + self.MARGIN // 2,
+                             rect.right() - self.MARGIN, top + header_height + self.MARGIN // 2)
+            top += header_height + self.MARGIN
+        column = self._column_width(rect.width())
+        height = rect.bottom() - top - self.MARGIN
+        flags = int(Qt.TextFlag.TextWordWrap)
+        painter.setPen(text_color)
+        painter.drawText(QRect(rect.left() + self.MARGIN, top, column, height), flags,
+                         index.data(BilingualModel.SourceRole))
+        translation = index.data(BilingualModel.TranslationRole)
+        if not translation:
+            painter.setPen(QColor('#aaaaaa'))
+        painter.drawText(QRect(rect.left() + 2 * self.MARGIN + column, top, column, height), flags,
+                         translation or '未翻译')
+        painter.restore()
+
+class BilingualView(QListView):
+    """只布局和绘制可见范围附近的行，按像素平滑滚动"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # 跳转的目标段落：分批布局推进和上方插入行都会改变其位置，在用户自己滚动之前保持在顶部
+        self._target = None
+        self.delegate = BilingualDelegate(self)
+        self.setItemDelegate(self.delegate)
+        self.setUniformItemSizes(False)
+        self.setWordWrap(True)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        # 分批布局，大量行也不会一次性阻塞界面
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(100)
+        self.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.verticalScrollBar().actionTriggered.connect(self._release_target)
+
+    def scroll_to_row(self, row: int) -> None:
+        """把 row 滚动到顶部，之后布局变化时保持该段落在顶部"""
+        self._target = QPersistentModelIndex(self.model().index(row, 0))
+        self._follow_target()
+
+    def _hold_top(self, parent, first: int, last: int) -> None:
+        top = self.indexAt(QPoint(0, 0))
+        if self._target is None and top.isValid() and first <= top.row():
+            self._target = QPersistentModelIndex(top)
+
+    def _release_target(self, *args) -> None:
+        self._target = None
+
+    def _follow_target(self) -> None:
+        if self._target is None:
+            return
+        if not self._target.isValid():
+            self._target = None
+            return
+        self.scrollTo(self.model().index(self._target.row(), 0), QListView.ScrollHint.PositionAtTop)
+
+    def updateGeometries(self) -> None:
+        super().updateGeometries()
+        self._follow_target()
+
+    def wheelEvent(self, event) -> None:
+        # 用户自己滚动后不再跟随跳转的目标
+        self._release_target()
+        super().wheelEvent(event)
+
+    def keyPressEvent(self, event) -> None:
+        self._release_target()
+        super().keyPressEvent(event)
+
+    def setModel(self, model) -> None:
+        super().setModel(model)
+        self.delegate.forget()
+        model.dataChanged.connect(lambda first, last: self.delegate.forget(first.row(), last.row()))
+        model.modelReset.connect(self.delegate.forget)
+        model.rowsInserted.connect(lambda parent, first, last: self.delegate.forget_from(first))
+        model.rowsRemoved.connect(lambda parent, first, last: self.delegate.forget_from(first))
+        # 上方的页面替换占位行时，保持当前看到的段落不动
+        model.rowsAboutToBeInserted.connect(self._hold_top)
+        model.rowsAboutToBeRemoved.connect(self._hold_top)
+
+    def resizeEvent(self, event) -> None:
+        if event.size().width() != event.oldSize().width():
+            self.delegate.forget()
+        super().resizeEvent(event)
+
+class DocumentViewer(QDialog):
+    """全文对照窗口，双击段落跳转到主窗口的对应页面"""
+    page_activated = pyqtSignal(int)
+
+    def __init__(self, document, to_chinese: bool, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('全文对照')
+        self.resize(1100, 800)
+        self.model = BilingualModel(document, to_chinese, self)
+
+        layout = QVBoxLayout(self)
+        header_layout = QHBoxLayout()
+        header_layout.addWidget(QLabel('原文'))
+        header_layout.addWidget(QLabel('中文译文' if to_chinese else 'English translation'))
+        layout.addLayout(header_layout)
+
+        self.view = BilingualView(self)
+        self.view.setModel(self.model)
+        self.view.doubleClicked.connect(
+            lambda index: self.page_activated.emit(index.data(BilingualModel.PageRole))
+        )
+        layout.addWidget(self.view)
+
+        bottom_layout = QHBoxLayout()
+        self.stats_label = QLabel()
+        bottom_layout.addWidget(self.stats_label)
+        bottom_layout.addStretch()
+        close_button = QPushButton('关闭')
+        close_button.clicked.connect(self.accept)
+        bottom_layout.addWidget(close_button)
+        layout.addLayout(bottom_layout)
+
+        self.model.rowsInserted.connect(self.update_stats)
+        self.model.rowsRemoved.connect(self.update_stats)
+        self.model.dataChanged.connect(self.update_stats)
+
+        if self.model.canFetchMore():
+            self.model.fetchMore()
+        self.update_stats()
+
+    def update_stats(self, *args) -> None:
+        model = self.model
+        self.stats_label.setText(
+            f'已读取 {model.loaded_pages}/{model.document.page_count} 页 | 已翻译 {model.translated_pages} 页 | '
+            f'原文单词数: {model.source_words} | 译文字符数: {model.translation_chars}'
+        )
+
+    def update_page(self, page: int) -> None:
+        self.model.update_page(page)
+
+    def shutdown(self) -> None:
+        """停止后台提取，关闭文档前调用"""
+        self.model.shutdown()
+
+    def scroll_to_page(self, page: int) -> None:
+        """
+        读取到该页为止并滚动过去；读取只查询译文结果，未翻译页面的原文在后台提取，
+        该页及其前后几页优先
+        """
+        while self.model.first_row(page) is None and self.model.canFetchMore():
+            self.model.fetchMore()
+        self.model.prioritize(page)
+        row = self.model.first_row(page)
+        if row is not None:
+            self.view.scroll_to_row(row)
@@ -0,0 +1,58 @@
+import itertools
+import pytest
+import cache
+from cache import TranslationCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    """每次取时间都递增，访问顺序不受时钟精度影响"""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(cache.time, 'time', lambda: float(next(ticks)))
+
+def open_cache(tmp_path, **limits):
+    return TranslationCache(str(tmp_path / 'cache.sqlite3'), **limits)
+
+def test_evicts_least_recently_used_by_entries(tmp_path, clock):
+    store = open_cache(tmp_path, max_entries=3)
+    for key in 'abc':
+        store.put(key, key.upper())
+    # 命中的 a 变为最近使用，写入 d 时淘汰 b
+    assert store.get('a') == 'A'
+    store.put('d', 'D')
+    assert store.get('b') is None
+    assert [store.get(key) for key in 'acd'] == ['A', 'C', 'D']
+    stats = store.stats()
+    assert stats['entries'] == 3
+    assert stats['evictions'] == 1
+    store.close()
+
+def test_evicts_by_bytes(tmp_path, clock):
+    # 每条 1 字节的键加 99 字节的值
+    store = open_cache(tmp_path, max_bytes=350)
+    for key in 'abcd':
+        store.put(key, 'x' * 99)
+    stats = store.stats()
+    assert stats['bytes'] <= 350
+    assert stats['entries'] == 3
+    assert store.get('a') is None
+    assert store.get('d') is not None
+    store.close()
+
+def test_replacing_a_key_keeps_totals(tmp_path, clock):
+    store = open_cache(tmp_path, max_entries=10)
+    store.put('a', 'x' * 10)
+    store.put('a', 'x' * 20)
+    stats = store.stats()
+    assert stats['entries'] == 1
+    assert stats['bytes'] == 21
+    store.close()
+
+def test_totals_survive_reopen(tmp_path, clock):
+    store = open_cache(tmp_path)
+    store.put('a', 'A')
+    store.get('a')
+    store.close()
+    reopened = open_cache(tmp_path)
+    assert reopened.stats()['entries'] == 1
+    assert reopened.get('a') == 'A'
+    reopened.close()
@@ -0,0 +1,78 @@
+import threading
+from chunker import ChunkedTranslator, _tail, estimate_tokens, split_into_chunks
+from translator import BaseTranslator
+
+class EchoTranslator(BaseTranslator):
+    """原样返回文本并记下每次请求的参考信息"""
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        with self._lock:
+            self.calls.append((text, context))
+        return text
+
+def sentence(index: int) -> str:
+    return f'Sentence number {index} describes the model and its training data.'
+
+def paragraph(start: int, count: int) -> str:
+    return ' '.join(sentence(index) for index in range(start, start + count))
+
+def test_short_paragraphs_are_merged_within_budget():
+    text = '\n\n'.join(paragraph(index * 3, 3) for index in range(6))
+    chunks = split_into_chunks(text, 120)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 120 for chunk, _ in chunks)
+    assert all(separator == 'paragraph' for _, separator in chunks)
+    assert '\n\n'.join(chunk for chunk, _ in chunks) == text
+
+def test_long_paragraph_is_split_on_sentence_boundaries():
+    text = paragraph(0, 20)
+    chunks = split_into_chunks(text, 60)
+    assert chunks[0][1] == 'paragraph'
+    assert all(separator == 'sentence' for _, separator in chunks[1:])
+    assert all(chunk.endswith('.') for chunk, _ in chunks)
+    assert ' '.join(chunk for chunk, _ in chunks) == text
+
+def test_overlong_sentence_is_cut_by_characters():
+    text = 'x' * 1000
+    chunks = split_into_chunks(text, 50)
+    assert all(estimate_tokens(chunk) <= 50 for chunk, _ in chunks)
+    assert ''.join(chunk.replace(' ', '') for chunk, _ in chunks) == text
+
+def test_tail_starts_at_a_sentence():
+    text = paragraph(0, 5)
+    tail = _tail(text, 100)
+    assert len(tail) <= 100
+    assert tail.startswith('Sentence number')
+    assert _tail(text, 0) == ''
+
+def test_translate_reassembles_chunks_in_order():
+    text = '\n\n'.join(paragraph(index * 8, 8) for index in range(4))
+    inner = EchoTranslator()
+    translator = ChunkedTranslator(inner, max_tokens=60, overlap_chars=80)
+    assert translator.translate(text, False) == text
+    assert len(inner.calls) > 4
+
+def test_each_chunk_gets_the_previous_chunk_tail_as_context():
+    text = paragraph(0, 20)
+    inner = EchoTranslator()
+    translator = ChunkedTranslator(inner, max_tokens=60, overlap_chars=80, max_workers=1)
+    translator.translate(text, False, 'glossary')
+    chunks = [chunk for chunk, _ in split_into_chunks(text, 60)]
+    contexts = dict(inner.calls)
+    assert contexts[chunks[0]] == 'glossary'
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert contexts[chunk].startswith('glossary\n\n')
+        assert previous.endswith(contexts[chunk][len('glossary\n\n'):])
+
+def test_stream_matches_translate():
+    text = '\n\n'.join(paragraph(index * 8, 8) for index in range(3))
+    translator = ChunkedTranslator(EchoTranslator(), max_tokens=60)
+    assert ''.join(translator.translate_stream(text, False)) == translator.translate(text, False)
+
+def test_text_within_budget_is_not_split():
+    inner = EchoTranslator()
+    ChunkedTranslator(inner, max_tokens=1000).translate(paragraph(0, 3), False, 'ctx')
+    assert inner.calls == [(paragraph(0, 3), 'ctx')]
@@ -0,0 +1,65 @@
+import threading
+import pytest
+import failover
+from failover import CircuitBreaker, FailoverTranslator
+from translator import BaseTranslator
+
+class FakeTranslator(BaseTranslator):
+    def __init__(self, name: str, result: str = None, error: Exception = None, delay: float = 0.0):
+        self.provider_name = name
+        self.result = result if result is not None else name
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+        self.release = threading.Event()
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        self.calls += 1
+        if self.delay:
+            self.release.wait(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+def test_breaker_opens_after_threshold_and_half_opens(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(failover.time, 'monotonic', lambda: now[0])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] += 30
+    # 冷却后只放行一次试探请求
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
+
+def test_fails_over_to_next_provider():
+    primary = FakeTranslator('gemini', error=RuntimeError('down'))
+    backup = FakeTranslator('zhipu')
+    translator = FailoverTranslator([primary, backup], failure_threshold=2)
+    assert translator.translate('text', True) == 'zhipu'
+    assert translator.translate('text', True) == 'zhipu'
+    # 连续失败两次后主提供商被熔断，不再尝试
+    assert translator.translate('text', True) == 'zhipu'
+    assert primary.calls == 2
+
+def test_raises_last_error_when_all_fail():
+    translator = FailoverTranslator([
+        FakeTranslator('gemini', error=RuntimeError('first')),
+        FakeTranslator('zhipu', error=RuntimeError('second')),
+    ])
+    with pytest.raises(RuntimeError, match='second'):
+        translator.translate('text', True)
+
+def test_slow_primary_is_hedged():
+    primary = FakeTranslator('gemini', delay=5.0)
+    backup = FakeTranslator('zhipu')
+    translator = FailoverTranslator([primary, backup], min_hedge_delay=0.05, default_hedge_delay=0.05)
+    try:
+        assert translator.translate('text', True) == 'zhipu'
+        assert backup.calls == 1
+    finally:
+        primary.release.set()
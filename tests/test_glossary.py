@@ -0,0 +1,75 @@
+from glossary import AhoCorasick, Glossary, with_document_glossary
+from translator import BaseTranslator
+
+def make_glossary(terms: dict) -> Glossary:
+    glossary = Glossary()
+    glossary.set_terms(terms)
+    return glossary
+
+def test_automaton_finds_overlapping_patterns():
+    found = sorted(AhoCorasick(['he', 'she', 'hers']).find('ushers'))
+    assert found == [(4, 'he'), (4, 'she'), (6, 'hers')]
+
+def test_matches_whole_words_only():
+    glossary = make_glossary({'GAN': '生成对抗网络'})
+    assert glossary.match('We train a GAN on images.', True) == [('GAN', '生成对抗网络')]
+    assert glossary.match('The organ was scanned.', True) == []
+    assert glossary.match('GANs and GANx differ.', True) == [('GAN', '生成对抗网络')]
+    assert glossary.match('ganglia', True) == []
+
+def test_matches_plurals_case_insensitively():
+    glossary = make_glossary({'transformer': 'Transformer 模型'})
+    assert glossary.match('Transformers replaced RNNs.', True) == [('transformer', 'Transformer 模型')]
+    assert glossary.match('A TRANSFORMER.', True) == [('transformer', 'Transformer 模型')]
+    # 只允许以 s 结尾的复数，不匹配其他后缀
+    assert glossary.match('transformerless designs', True) == []
+
+def test_longer_terms_win_and_keep_text_order():
+    glossary = make_glossary({'attention': '注意力', 'multi-head attention': '多头注意力', 'encoder': '编码器'})
+    matches = glossary.match('The encoder applies multi-head attention.', True)
+    assert matches == [('encoder', '编码器'), ('multi-head attention', '多头注意力')]
+
+def test_reverse_direction_matches_chinese_terms():
+    glossary = make_glossary({'attention': '注意力'})
+    assert glossary.match('自注意力机制', False) == [('注意力', 'attention')]
+
+def test_user_terms_override_auto_terms():
+    glossary = make_glossary({'loss': '损失'})
+    glossary.add_auto_terms({'loss': '丢失', 'gradient': '梯度'})
+    assert glossary.entries() == {'loss': '损失', 'gradient': '梯度'}
+
+def test_fingerprint_changes_with_matched_entries():
+    glossary = make_glossary({'encoder': '编码器'})
+    text = 'The encoder is shared.'
+    before = glossary.fingerprint(text, True)
+    assert before
+    assert glossary.fingerprint('No terms here.', True) == ''
+    glossary.set_terms({'encoder': '编码模块'})
+    assert glossary.fingerprint(text, True) != before
+
+class TermTranslator(BaseTranslator):
+    def __init__(self):
+        self.calls = 0
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        self.calls += 1
+        return '\n'.join(f'译{line}' for line in text.splitlines())
+
+def test_document_glossary_reads_each_page_once():
+    consumed = []
+
+    def pages():
+        for index in range(10):
+            consumed.append(index)
+            yield index, ['Graph Neural Network models use Graph Neural Network layers in a Graph Neural Network.']
+
+    glossary = Glossary()
+    translator = TermTranslator()
+    stream = with_document_glossary(pages(), glossary, translator, True, sample_pages=3)
+    assert next(stream)[0] == 0
+    # 术语在读入前 3 页后翻译，其余页面尚未提取
+    assert consumed == [0, 1, 2]
+    assert translator.calls == 1
+    assert 'Graph Neural Network' in glossary.entries()
+    assert [page for page, _ in stream] == list(range(1, 10))
+    assert consumed == list(range(10))
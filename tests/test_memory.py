@@ -0,0 +1,86 @@
+import random
+import pytest
+from memory import MAX_FUZZY_SIMILARITY, MemoryStats, MemoryTranslator, TranslationMemory
+from translator import BaseTranslator
+
+WORDS = [f'word{index}' for index in range(2000)]
+
+class RecordingTranslator(BaseTranslator):
+    def __init__(self):
+        self.calls = []
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        self.calls.append((text, context))
+        return f'译文 {len(self.calls)}'
+
+@pytest.fixture
+def memory(tmp_path):
+    store = TranslationMemory(str(tmp_path / 'memory.sqlite3'), threshold=0.7)
+    yield store
+    store.close()
+
+def paragraph(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+def edit_one_word(rng: random.Random, text: str) -> str:
+    words = text.split()
+    position = rng.randrange(len(words))
+    words[position] = 'changed'
+    return ' '.join(words)
+
+def test_identical_text_is_an_exact_hit(memory):
+    text = 'The proposed model improves accuracy on every benchmark we tried.'
+    memory.add(text, True, '译文')
+    similarity, source, translation, exact = memory.lookup('  ' + text + '\n', True)
+    assert exact
+    assert similarity == 1.0
+    assert translation == '译文'
+
+def test_edited_long_paragraphs_are_never_exact(memory):
+    rng = random.Random(7)
+    texts = [paragraph(rng, 300) for _ in range(50)]
+    memory.add_many((text, True, '旧译文') for text in texts)
+    for text in texts:
+        match = memory.lookup(edit_one_word(rng, text), True)
+        # 一个词的改动常常不改变签名，仍然只能作为参考
+        assert match is not None
+        similarity, source, _, exact = match
+        assert not exact
+        assert similarity <= MAX_FUZZY_SIMILARITY
+        assert source == text
+
+def test_opposite_direction_does_not_hide_candidates(tmp_path):
+    memory = TranslationMemory(str(tmp_path / 'memory.sqlite3'), threshold=0.7, max_candidates=1)
+    rng = random.Random(3)
+    text = paragraph(rng, 120)
+    memory.add(text, False, 'translation')
+    memory.add(edit_one_word(rng, text), False, 'another')
+    memory.add(text, True, '译文')
+    match = memory.lookup(edit_one_word(rng, text), True)
+    assert match is not None
+    assert match[2] == '译文'
+    memory.close()
+
+def test_glossary_fingerprint_separates_exact_hits(memory):
+    text = 'The transformer uses multi-head attention in every encoder layer.'
+    memory.add(text, True, '旧译文', 'old')
+    assert memory.lookup(text, True, 'old')[3]
+    assert memory.lookup(text, True, 'new') is None
+
+def test_translator_reuses_exact_and_references_fuzzy(memory):
+    rng = random.Random(11)
+    text = paragraph(rng, 200)
+    inner = RecordingTranslator()
+    stats = MemoryStats()
+    translator = MemoryTranslator(inner, memory, stats)
+    first = translator.translate(text, True)
+    assert translator.translate(text, True) == first
+    assert len(inner.calls) == 1
+
+    edited = edit_one_word(rng, text)
+    assert translator.translate(edited, True) != first
+    assert len(inner.calls) == 2
+    assert first in inner.calls[-1][1]
+    counts = stats.to_dict()
+    assert counts['exact_hits'] == 1
+    assert counts['fuzzy_hits'] == 1
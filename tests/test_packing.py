@@ -0,0 +1,60 @@
+import json
+from packing import PackingTranslator, merge_contexts, pack_segments, plan_requests, unpack_translations
+from translator import BaseTranslator, PackedText
+
+class PackTranslator(BaseTranslator):
+    """打包请求返回 response(items)，单段请求返回带标记的原文"""
+    def __init__(self, response=None):
+        self.response = response or (lambda items: json.dumps([f'译{item}' for item in items], ensure_ascii=False))
+        self.packed_calls = []
+        self.single_calls = []
+
+    def translate(self, text: str, to_chinese: bool, context: str = '') -> str:
+        if isinstance(text, PackedText):
+            self.packed_calls.append((text.count, context))
+            return self.response(json.loads(text))
+        self.single_calls.append(text)
+        return f'单{text}'
+
+def test_unpack_accepts_surrounding_text():
+    texts = ['Figure 1', 'Table 2']
+    assert unpack_translations('Here:\n["图 1", " 表 2 "]\nDone', texts) == ['图 1', '表 2']
+
+def test_unpack_rejects_misaligned_results():
+    texts = ['a', 'b', 'c']
+    assert unpack_translations('["甲", "乙"]', texts) is None
+    assert unpack_translations('["甲", "乙", "丙", "丁"]', texts) is None
+    assert unpack_translations('not json', texts) is None
+    assert unpack_translations('["甲", 2, "丙"]', texts) is None
+    assert unpack_translations('["甲", "", "丙"]', texts) is None
+    assert unpack_translations('{"a": 1}', texts) is None
+
+def test_pack_segments_round_trips():
+    texts = ['Figure "1"', '[12] Smith et al.']
+    packed = pack_segments(texts)
+    assert isinstance(packed, PackedText)
+    assert packed.count == 2
+    assert json.loads(packed) == texts
+
+def test_plan_keeps_long_segments_alone():
+    segments = ['short'] * 3 + ['long ' * 200] + ['short'] * 2
+    # 长段落单独请求，前后的短段落仍然合并为一个请求
+    assert plan_requests(segments, 80, 1500, 40) == [[3], [0, 1, 2, 4, 5]]
+    assert plan_requests(['short'] * 5, 80, 1500, 2) == [[0, 1], [2, 3], [4]]
+
+def test_merge_contexts_deduplicates_lines():
+    assert merge_contexts(['Terms:\n- a -> 甲', 'Terms:\n- b -> 乙', '']) == 'Terms:\n- a -> 甲\n- b -> 乙'
+
+def test_packed_batch_is_one_request():
+    inner = PackTranslator()
+    translator = PackingTranslator(inner)
+    assert translator.translate_batch(['a', 'b', 'c'], True) == ['译a', '译b', '译c']
+    assert [count for count, _ in inner.packed_calls] == [3]
+    assert inner.single_calls == []
+
+def test_misaligned_pack_falls_back_to_single_requests():
+    inner = PackTranslator(lambda items: json.dumps(['译' + ''.join(items)], ensure_ascii=False))
+    translator = PackingTranslator(inner)
+    assert translator.translate_batch(['a', 'b', 'c'], True) == ['单a', '单b', '单c']
+    assert len(inner.packed_calls) == 1
+    assert inner.single_calls == ['a', 'b', 'c']
@@ -0,0 +1,117 @@
+import threading
+import time
+import pytest
+from scheduler import BATCH, INTERACTIVE, PREFETCH, JobCancelled, Scheduler
+
+TIMEOUT = 5
+
+@pytest.fixture
+def scheduler():
+    schedulers = []
+
+    def create(*args, **kwargs):
+        instance = Scheduler(*args, **kwargs)
+        schedulers.append(instance)
+        return instance
+
+    yield create
+    for instance in schedulers:
+        instance.shutdown()
+
+def blocker(scheduler, priority=BATCH):
+    """提交一个占住线程的任务，返回 (任务, 已开始事件, 放行事件)"""
+    started, release = threading.Event(), threading.Event()
+
+    def run(token):
+        started.set()
+        release.wait(TIMEOUT)
+
+    job = scheduler.submit(run, priority)
+    assert started.wait(TIMEOUT)
+    return job, release
+
+def test_runs_higher_priority_first(scheduler):
+    pool = scheduler(workers=1, interactive_workers=0)
+    _, release = blocker(pool)
+    order = []
+    jobs = [pool.submit(lambda token, name=name: order.append(name), priority)
+            for name, priority in (('batch', BATCH), ('prefetch', PREFETCH), ('interactive', INTERACTIVE))]
+    release.set()
+    for job in jobs:
+        job.future.result(TIMEOUT)
+    assert order == ['interactive', 'prefetch', 'batch']
+
+def test_interactive_workers_bypass_busy_pool(scheduler):
+    pool = scheduler(workers=1, interactive_workers=1)
+    _, release = blocker(pool)
+    try:
+        assert pool.submit(lambda token: 'done', INTERACTIVE).future.result(TIMEOUT) == 'done'
+        batch = pool.submit(lambda token: 'batch', BATCH)
+        time.sleep(0.05)
+        # 只处理交互式任务的线程不会执行全文翻译
+        assert not batch.future.done()
+    finally:
+        release.set()
+    assert batch.future.result(TIMEOUT) == 'batch'
+
+def test_cancelled_queued_job_never_runs(scheduler):
+    pool = scheduler(workers=1, interactive_workers=0)
+    _, release = blocker(pool)
+    ran = threading.Event()
+    job = pool.submit(lambda token: ran.set(), BATCH)
+    job.cancel()
+    assert pool.pending() == 0
+    release.set()
+    after = pool.submit(lambda token: 'next', BATCH)
+    assert after.future.result(TIMEOUT) == 'next'
+    assert job.future.cancelled()
+    assert not ran.is_set()
+
+def test_running_job_stops_at_next_check(scheduler):
+    pool = scheduler(workers=1, interactive_workers=0)
+    started = threading.Event()
+
+    def run(token):
+        started.set()
+        while True:
+            token.check()
+            time.sleep(0.01)
+
+    job = pool.submit(run, INTERACTIVE)
+    assert started.wait(TIMEOUT)
+    pool.cancel_all(INTERACTIVE)
+    assert isinstance(job.future.exception(TIMEOUT), JobCancelled)
+    # 任务在下一次检查时退出，线程可以继续执行其他任务
+    assert pool.submit(lambda token: 'next', BATCH).future.result(TIMEOUT) == 'next'
+
+def test_same_key_is_shared_and_promoted(scheduler):
+    pool = scheduler(workers=1, interactive_workers=0)
+    _, release = blocker(pool)
+    order = []
+    prefetch = pool.submit(lambda token: order.append('page'), PREFETCH, key='page-3')
+    other = pool.submit(lambda token: order.append('other'), PREFETCH)
+    assert pool.submit(lambda token: order.append('again'), INTERACTIVE, key='page-3') is prefetch
+    assert prefetch.priority == INTERACTIVE
+    release.set()
+    prefetch.future.result(TIMEOUT)
+    other.future.result(TIMEOUT)
+    assert order == ['page', 'other']
+
+def test_priority_limit(scheduler):
+    pool = scheduler(workers=3, interactive_workers=0, limits={PREFETCH: 1})
+    running, peak = 0, 0
+    lock = threading.Lock()
+
+    def run(token):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+
+    jobs = [pool.submit(run, PREFETCH) for _ in range(5)]
+    for job in jobs:
+        job.future.result(TIMEOUT)
+    assert peak == 1